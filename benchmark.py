@@ -0,0 +1,179 @@
+"""
+Benchmarks for the hot paths of featurization, estimation and evaluation.
+
+Every benchmark runs on fixed-seed synthetic logs at several scales (number
+of events) and records the best wall time over a few repetitions and the
+peak memory allocated (measured with tracemalloc in a separate run, so that
+it does not slow down the timed ones).
+
+Usage:
+    python benchmark.py --scales 1000 10000 100000 --output baseline.json
+    python benchmark.py --compare baseline.json --threshold 0.2
+    python benchmark.py --large --only create_dataframe
+
+--large adds the LARGE_SCALES (up to 10^7 events, which need tens of GB of
+memory and hours) to the scales.
+
+In compare mode, benchmarks slower than the baseline by more than the
+threshold are flagged and the exit code is 1.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from itertools import islice
+
+import numpy as np
+
+import config
+import metrics
+import util
+from synthetic import SyntheticLogGenerator
+from estimators import mtr
+from wrangling.DatapointBuilder import DatapointBuilder
+from wrangling.DatasetFactory import DatasetFactory
+
+DEFAULT_SCALES = [10**3, 10**4, 10**5]
+LARGE_SCALES = [10**6, 10**7]
+SEED = 100
+
+
+def synthetic_logs(n_events, seed=SEED):
+    """
+    Input: number of events and seed.
+    Output: list of n_events log dictionaries (see synthetic.py).
+    """
+    return list(islice(SyntheticLogGenerator.for_events(n_events, seed=seed).iter_logs(), n_events))
+
+
+def benchmarks(n_events):
+    """
+    Output: dictionary of benchmark name to a (setup, run) pair. setup
+    builds fresh inputs (untimed) and run(inputs) is the timed call.
+    """
+    logs = synthetic_logs(n_events)
+
+    def factory():
+        factory_ = DatasetFactory(builder_constructor=DatapointBuilder)
+        factory_.add_logs(logs)
+        return factory_
+
+    def builders():
+        return factory().make_builders()
+
+    df = factory().create_dataframe_with_all_data_sequence()
+    X, y, previous_recall_score = util.split_features_and_targets(df)
+
+    def infer_retention_rate(builders_):
+        for builder in builders_:
+            builder.infer_retention_rate()
+
+    def fitted(estimator_constructor):
+        estimator = estimator_constructor()
+        estimator.fit(X, y, X['delta'])
+        return estimator
+
+    folds = np.array_split(np.random.default_rng(SEED).permutation(len(X)), 10)
+    y_pred = np.clip(fitted(mtr.SWPMTREstimator).predict(X, X['delta']), 0.000001, 0.999999)
+
+    cases = {
+        'DatasetFactory.add_logs': (lambda: DatasetFactory(builder_constructor=DatapointBuilder), lambda factory_: factory_.add_logs(logs)),
+        'DatasetFactory.make_builders': (factory, lambda factory_: factory_.make_builders()),
+        'DatasetFactory.create_dataframe_with_all_data_sequence': (factory, lambda factory_: factory_.create_dataframe_with_all_data_sequence()),
+        'DatapointBuilder.infer_retention_rate': (builders, infer_retention_rate),
+        'LombEvaluation.from_CV': (lambda: None, lambda _: metrics.LombEvaluation.from_CV(
+            'benchmark',
+            [y.values[fold] for fold in folds],
+            [y_pred[fold] for fold in folds],
+            [previous_recall_score.values[fold] for fold in folds],
+            [X['delta'].values[fold] for fold in folds])),
+    }
+    for estimator_constructor in mtr.all_estimators:
+        name = estimator_constructor().get_name() + ('+delta' if not estimator_constructor().drop_delta_in_X else '')
+        cases[f'MTRLinearRegression.fit[{name}]'] = (estimator_constructor, lambda estimator: estimator.fit(X, y, X['delta']))
+        cases[f'MTRLinearRegression.predict[{name}]'] = (
+            lambda constructor=estimator_constructor: fitted(constructor),
+            lambda estimator: estimator.predict(X, X['delta']))
+    return cases
+
+
+def measure(setup, run, repeat=3):
+    seconds = float('inf')
+    for _ in range(repeat):
+        inputs = setup()
+        start = time.perf_counter()
+        run(inputs)
+        seconds = min(seconds, time.perf_counter() - start)
+
+    inputs = setup()
+    tracemalloc.start()
+    run(inputs)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': seconds, 'peak_memory_bytes': peak_memory}
+
+
+def run_all(scales=DEFAULT_SCALES, repeat=3, only=None):
+    results = {}
+    for n_events in scales:
+        for name, (setup, run) in benchmarks(n_events).items():
+            if only and only not in name:
+                continue
+            key = f'{name}@{n_events}'
+            results[key] = measure(setup, run, repeat)
+            print(f"{key}: {results[key]['seconds']:.4f}s, {results[key]['peak_memory_bytes'] / 2**20:.1f} MiB")
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scales': list(scales),
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=0.2):
+    """
+    Output: list of (benchmark, baseline seconds, current seconds) for the
+    benchmarks slower than the baseline by more than `threshold` (a fraction).
+    """
+    slowdowns = []
+    for key, result in current['results'].items():
+        if key not in baseline['results']:
+            continue
+        before, after = baseline['results'][key]['seconds'], result['seconds']
+        if after > before * (1 + threshold):
+            slowdowns.append((key, before, after))
+    return slowdowns
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES, help='numbers of events')
+    parser.add_argument('--large', action='store_true', help=f'also run the scales {LARGE_SCALES}')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', help='only run benchmarks whose name contains this string')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown, as a fraction')
+    args = parser.parse_args(argv)
+
+    config.DEBUG = False
+    scales = sorted(set(args.scales + (LARGE_SCALES if args.large else [])))
+    current = run_all(scales, args.repeat, args.only)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(current, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        slowdowns = compare(baseline, current, args.threshold)
+        for key, before, after in slowdowns:
+            print(f"SLOWER {key}: {before:.4f}s -> {after:.4f}s ({after / before - 1:+.0%})")
+        return 1 if slowdowns else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,27 @@
+import json
+
+import benchmark
+
+
+def results(**seconds):
+    return {'results': {key: {'seconds': value, 'peak_memory_bytes': 0} for key, value in seconds.items()}}
+
+
+def test_compare_flags_the_slowdowns_above_the_threshold():
+    baseline = results(fast=1.0, slow=1.0, removed=1.0)
+    current = results(fast=1.1, slow=1.3, added=5.0)
+    assert benchmark.compare(baseline, current, threshold=0.2) == [('slow', 1.0, 1.3)]
+    assert benchmark.compare(baseline, current, threshold=0.05) == [('fast', 1.0, 1.1), ('slow', 1.0, 1.3)]
+
+
+def test_main_exits_with_1_on_a_regression(tmp_path):
+    output, baseline = tmp_path / 'current.json', tmp_path / 'baseline.json'
+    argv = ['--scales', '1000', '--repeat', '1', '--only', 'LombEvaluation']
+    assert benchmark.main(argv + ['--output', str(output)]) == 0
+    current = json.loads(output.read_text())
+    assert list(current['results']) == ['LombEvaluation.from_CV@1000']
+
+    baseline.write_text(json.dumps(results(**{'LombEvaluation.from_CV@1000': 1e-9})))
+    assert benchmark.main(argv + ['--compare', str(baseline)]) == 1
+    baseline.write_text(json.dumps(results(**{'LombEvaluation.from_CV@1000': 1e9})))
+    assert benchmark.main(argv + ['--compare', str(baseline)]) == 0
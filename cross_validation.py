@@ -0,0 +1,123 @@
+"""
+Cross-validation engine for the Lomb and Duolingo evaluations.
+
+The KFold splits are computed once up front and every (estimator, seed, fold)
+combination runs as an independent job on a process pool. The data is
+published once to shared memory (see shared.py) and attached by each worker
+when it starts, so jobs only carry a couple of integers. Folds are collected
+in the same order as the serial notebook loops, so the evaluations are
+identical for a given list of seeds.
+"""
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+from sklearn.model_selection import KFold
+
+import metrics
+import shared
+from duolingo import DUOLINGO_DATASETS
+
+# Predictions are clipped before scoring, as in the notebooks.
+Y_PRED_BOUNDS = (0.000001, 0.999999)
+
+
+@dataclass
+class CVResult:
+    estimator_name: str
+    y_trues: list
+    y_preds: list
+    previous_recall_scores: list
+    deltas: list
+
+    def to_lomb_evaluation(self):
+        return metrics.LombEvaluation.from_CV(self.estimator_name,
+                                              self.y_trues,
+                                              self.y_preds,
+                                              self.previous_recall_scores,
+                                              self.deltas)
+
+    def to_duolingo_evaluation(self, dataset='unknown'):
+        return metrics.DuolingoEvaluation.from_CV(self.estimator_name,
+                                                  self.y_trues,
+                                                  self.y_preds,
+                                                  dataset=dataset)
+
+
+def kfold_indices(n_samples, folds, seeds):
+    """
+    Input: number of samples, number of folds and the seeds to shuffle with.
+    Output: list of (train_index, test_index) pairs, seed by seed, in the
+    order KFold yields them.
+    """
+    indices = []
+    placeholder = np.empty((n_samples, 1))
+    for seed in seeds:
+        kf = KFold(n_splits=folds, shuffle=True, random_state=seed)
+        indices += list(kf.split(placeholder))
+    return indices
+
+
+def cross_validate(X, y, delta, estimator_constructors, folds=5, seeds=(100, 101),
+                   previous_recall_score=None, n_jobs=None) -> List[CVResult]:
+    """
+    Runs every (estimator, seed, fold) combination, in parallel when n_jobs != 1.
+    Input: X, y, delta, a list of estimator constructors, the number of folds,
+    the seeds, optionally the previous recall score, and the number of worker
+    processes (all cores by default).
+    Output: one CVResult per estimator constructor.
+    """
+    splits = kfold_indices(len(X), folds, seeds)
+    jobs = [(i, j) for i in range(len(estimator_constructors)) for j in range(len(splits))]
+    # Workers attach to one shared copy of the data instead of unpickling their own
+    state = {'X': X, 'y': y, 'delta': delta, 'estimator_constructors': estimator_constructors, 'splits': splits}
+    outputs = shared.pool_map(_fit_predict, jobs, state, n_jobs, published=['X', 'y', 'delta'])
+
+    y_values     = np.asarray(y)
+    delta_values = np.asarray(delta)
+    previous_recall_score_values = None if previous_recall_score is None else np.asarray(previous_recall_score)
+
+    results = []
+    for i in range(len(estimator_constructors)):
+        result = CVResult(estimator_name=None, y_trues=[], y_preds=[], previous_recall_scores=[], deltas=[])
+        for (estimator_index, split_index), (name, y_pred) in zip(jobs, outputs):
+            if estimator_index != i:
+                continue
+            _, test_index = splits[split_index]
+            result.estimator_name = name
+            result.y_trues.append(y_values[test_index])
+            result.y_preds.append(y_pred)
+            result.deltas.append(delta_values[test_index])
+            if previous_recall_score_values is not None:
+                result.previous_recall_scores.append(previous_recall_score_values[test_index])
+        results.append(result)
+    return results
+
+
+def cross_validate_lomb_dataset(X, y, previous_recall_score, folds, seeds, estimator_constructor, n_jobs=None):
+    result, = cross_validate(X, y, X['delta'], [estimator_constructor], folds, seeds,
+                             previous_recall_score=previous_recall_score, n_jobs=n_jobs)
+    return result.to_lomb_evaluation()
+
+
+def cross_validate_duolingo_dataset(X, y, folds, seeds, estimator_constructor, dataset='all', n_jobs=None):
+    if dataset not in DUOLINGO_DATASETS:
+        raise Exception(f"dataset must be one of {list(DUOLINGO_DATASETS)}")
+    columns = DUOLINGO_DATASETS[dataset]
+    X_subset = X if columns is None else X[columns]
+    result, = cross_validate(X_subset, y, X['delta'], [estimator_constructor], folds, seeds, n_jobs=n_jobs)
+    return result.to_duolingo_evaluation(dataset=dataset)
+
+
+def _fit_predict(job):
+    estimator_index, split_index = job
+    state = shared.worker_state()
+    X, y, delta = state['X'], state['y'], state['delta']
+    train_index, test_index = state['splits'][split_index]
+
+    estimator = state['estimator_constructors'][estimator_index]()
+    estimator.fit(X.iloc[train_index], y.iloc[train_index], delta.iloc[train_index])
+
+    y_pred = estimator.predict(X.iloc[test_index], delta.iloc[test_index])
+    y_pred = np.clip(y_pred, *Y_PRED_BOUNDS)
+    return estimator.get_name(), np.asarray(y_pred)
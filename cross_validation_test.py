@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import KFold
+
+import cross_validation
+import metrics
+from estimators import linear, mtr
+from estimators.mtr_test import make_dataset
+
+
+def serial_lomb_evaluation(X, y, previous_recall_score, folds, seeds, estimator_constructor):
+    # The loop the notebooks use
+    y_trues, y_preds, previous_recall_scores, deltas = [], [], [], []
+    for seed in seeds:
+        kf = KFold(n_splits=folds, shuffle=True, random_state=seed)
+        for train_index, test_index in kf.split(X):
+            estimator = estimator_constructor()
+            estimator.fit(X.iloc[train_index], y.iloc[train_index], X['delta'].iloc[train_index])
+            y_pred = estimator.predict(X.iloc[test_index], X['delta'].iloc[test_index])
+            y_trues.append(y.iloc[test_index])
+            y_preds.append(np.clip(y_pred, 0.000001, 0.999999))
+            previous_recall_scores.append(previous_recall_score.iloc[test_index])
+            deltas.append(X['delta'].iloc[test_index])
+    return metrics.LombEvaluation.from_CV(estimator.get_name(), y_trues, y_preds, previous_recall_scores, deltas)
+
+
+def test_cross_validate_lomb_dataset():
+    X, y, _ = make_dataset()
+    previous_recall_score = pd.Series(np.random.default_rng(1).uniform(0, 1, len(y)))
+
+    for estimator_constructor in [linear.LinearRegressionEstimator, mtr.SWPMTREstimator]:
+        expected = serial_lomb_evaluation(X, y, previous_recall_score, 3, [100, 101], estimator_constructor)
+        for n_jobs in [1, 2]:
+            evaluation = cross_validation.cross_validate_lomb_dataset(
+                X, y, previous_recall_score, 3, [100, 101], estimator_constructor, n_jobs=n_jobs)
+            assert evaluation == expected
+
+
+def test_cross_validate_several_estimators():
+    X, y, delta = make_dataset()
+    results = cross_validation.cross_validate(X, y, delta, mtr.all_estimators, folds=3, seeds=[100], n_jobs=2)
+
+    assert [result.estimator_name for result in results] == [constructor().get_name() for constructor in mtr.all_estimators]
+    for result in results:
+        assert len(result.y_preds) == 3
+        assert sum(map(len, result.y_trues)) == len(X)
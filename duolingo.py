@@ -0,0 +1,129 @@
+"""
+Typed, cached loader for the Duolingo learning_traces dataset.
+
+The csv is parsed once with an explicit schema (narrow types for the counts,
+categorical ids, and float64 for p_recall, the target) and stored as a columnar cache: one .npy file per column
+next to the csv, plus a small json file with the schema version, the
+categories of each categorical column and the size / modification time of
+the csv it was built from. Later loads only read the .npy files of the
+requested columns.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+DUOLINGO_FILENAME = 'learning_traces.13m.csv'
+CACHE_VERSION = 2
+
+# Feature subsets of the Duolingo dataset (None means every column).
+DUOLINGO_DATASETS = {
+    'only-history': ['history_seen', 'history_correct'],
+    'only-session': ['session_seen', 'session_correct'],
+    'only-delta': ['delta'],
+    'without-delta': ['session_seen', 'session_correct', 'history_seen', 'history_correct'],
+    'all': None,
+}
+
+DUOLINGO_SCHEMA = {
+    'p_recall': 'float64',
+    'timestamp': 'int64',
+    'delta': 'int32',
+    'user_id': 'category',
+    'learning_language': 'category',
+    'ui_language': 'category',
+    'lexeme_id': 'category',
+    'lexeme_string': 'category',
+    'history_seen': 'int32',
+    'history_correct': 'int32',
+    'session_seen': 'int16',
+    'session_correct': 'int16',
+}
+
+# Columns the notebooks drop before fitting.
+NON_FEATURE_COLUMNS = ['p_recall', 'timestamp', 'user_id', 'learning_language', 'ui_language', 'lexeme_id', 'lexeme_string']
+
+
+def load_duolingo_dataset(filename=DUOLINGO_FILENAME, dataset='all'):
+    """
+    Input: filename of the csv and one of the feature subsets of DuolingoEvaluation
+    ('all', 'only-delta', 'only-history', 'only-session', 'without-delta').
+    Output: X, y. X holds the subset's features plus delta, which the
+    estimators always need, e.g. for cross_validation.cross_validate_duolingo_dataset.
+    """
+    if dataset not in DUOLINGO_DATASETS:
+        raise Exception(f"dataset must be one of {list(DUOLINGO_DATASETS)}")
+    features = DUOLINGO_DATASETS[dataset]
+    if features is None:
+        features = [column for column in DUOLINGO_SCHEMA if column not in NON_FEATURE_COLUMNS]
+    columns = list(dict.fromkeys(['delta', *features]))
+
+    df = load_learning_traces(filename, columns=columns + ['p_recall'])
+    return df[columns], df['p_recall']
+
+
+def load_learning_traces(filename=DUOLINGO_FILENAME, columns=None):
+    """
+    Input: filename of the csv and the columns to load (all by default).
+    Output: DataFrame. The columnar cache is built on the first call.
+    """
+    columns = list(DUOLINGO_SCHEMA) if columns is None else list(columns)
+    unknown = set(columns) - set(DUOLINGO_SCHEMA)
+    if unknown:
+        raise ValueError(f"Unknown columns: {sorted(unknown)}")
+
+    cache_directory = filename + '.cache'
+    metadata = _read_cache_metadata(filename, cache_directory)
+    if metadata is None:
+        metadata = _build_cache(filename, cache_directory)
+
+    data = {}
+    for column in columns:
+        values = np.load(os.path.join(cache_directory, column + '.npy'))
+        if column in metadata['categories']:
+            values = pd.Categorical.from_codes(values, categories=metadata['categories'][column])
+        data[column] = values
+    return pd.DataFrame(data, columns=columns)
+
+
+def _build_cache(filename, cache_directory):
+    df = pd.read_csv(filename, usecols=list(DUOLINGO_SCHEMA), dtype=DUOLINGO_SCHEMA)
+    os.makedirs(cache_directory, exist_ok=True)
+
+    categories = {}
+    for column, dtype in DUOLINGO_SCHEMA.items():
+        values = df[column]
+        if dtype == 'category':
+            categories[column] = [str(category) for category in values.cat.categories]
+            values = values.cat.codes
+        np.save(os.path.join(cache_directory, column + '.npy'), values.to_numpy())
+
+    metadata = {
+        'version': CACHE_VERSION,
+        'schema': DUOLINGO_SCHEMA,
+        'source': _source_signature(filename),
+        'categories': categories,
+    }
+    # Written last, so an interrupted build is rebuilt on the next load
+    with open(os.path.join(cache_directory, 'metadata.json'), 'w') as file:
+        json.dump(metadata, file)
+    return metadata
+
+
+def _read_cache_metadata(filename, cache_directory):
+    try:
+        with open(os.path.join(cache_directory, 'metadata.json')) as file:
+            metadata = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if metadata.get('version') != CACHE_VERSION \
+            or metadata.get('schema') != DUOLINGO_SCHEMA \
+            or metadata.get('source') != _source_signature(filename):
+        return None
+    return metadata
+
+
+def _source_signature(filename):
+    stat = os.stat(filename)
+    return [stat.st_size, stat.st_mtime_ns]
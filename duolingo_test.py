@@ -0,0 +1,32 @@
+import pandas as pd
+
+import duolingo
+
+csv = """p_recall,timestamp,delta,user_id,learning_language,ui_language,lexeme_id,lexeme_string,history_seen,history_correct,session_seen,session_correct
+1.0,1362076081,27649635,u:FO,de,en,76390c1350a8dac31186187e2fe1e178,lernt/lernen<vblex><pri><p3><sg>,6,4,2,2
+0.5,1362076081,27649635,u:FO,de,en,7dfd7086f3671685e2cf1c1da72796d7,die/die<det><def><f><sg><nom>,4,4,2,1
+1.0,1362082044,27650119,u:dDwF,es,en,35a54c25a2cda8127343f6a82e6f6b7d,de/de<pr>,5,4,1,1
+"""
+
+
+def test_load_duolingo_dataset(tmp_path):
+    filename = str(tmp_path / 'learning_traces.csv')
+    with open(filename, 'w') as file:
+        file.write(csv)
+    expected = pd.read_csv(filename)
+
+    for _ in range(2):  # Build the cache, then read from it
+        df = duolingo.load_learning_traces(filename)
+        assert list(df.columns) == list(duolingo.DUOLINGO_SCHEMA)
+        assert df['user_id'].dtype == 'category'
+        assert df['session_seen'].dtype == 'int16'
+        assert df['p_recall'].dtype == 'float64'
+        for column in expected.columns:
+            assert (df[column].astype(expected[column].dtype) == expected[column]).all()
+
+    X, y = duolingo.load_duolingo_dataset(filename, dataset='only-history')
+    assert list(X.columns) == ['delta', 'history_seen', 'history_correct']
+    assert (y == expected['p_recall']).all()
+
+    X, _ = duolingo.load_duolingo_dataset(filename, dataset='all')
+    assert list(X.columns) == ['delta', 'history_seen', 'history_correct', 'session_seen', 'session_correct']
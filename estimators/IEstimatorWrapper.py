@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
 
+from estimators import persistence
+
 
 class IEstimatorWrapper(ABC):
     """
@@ -8,6 +10,13 @@ class IEstimatorWrapper(ABC):
     reloading the estimator to / from a file.
     """
 
+    # Estimator classes by name, used to reload a file without knowing its class upfront.
+    _registry = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        IEstimatorWrapper._registry[cls.__name__] = cls
+
     def __init__(self, **kwargs):
         pass
 
@@ -27,3 +36,70 @@ class IEstimatorWrapper(ABC):
         Fits scalers and estimator to X, delta and y.
         """
         pass
+
+    def save(self, filename):
+        """
+        Input: filename.
+        Output: None.
+        Persists the fitted estimator as a small versioned binary file (see
+        estimators.persistence).
+        """
+        parameters, arrays, feature_names = self._get_state()
+        persistence.save(filename, type(self).__name__, parameters, arrays, feature_names)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Input: filename written by save.
+        Output: the fitted estimator. Its arrays are memory mapped from the file.
+        Can be called on IEstimatorWrapper itself to load any estimator.
+        """
+        header, arrays = persistence.load(filename)
+        estimator_class = IEstimatorWrapper._registry.get(header['estimator'])
+        if estimator_class is None or not issubclass(estimator_class, cls):
+            raise ValueError(f"{filename} holds a {header['estimator']}, not a {cls.__name__}.")
+        return estimator_class._from_state(header['parameters'], arrays, header['feature_names'])
+
+    def _get_state(self):
+        """
+        Output: JSON-serialisable parameters, a dictionary of 1-D arrays and
+        the feature names (or None) describing the fitted estimator.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support persistence.")
+
+    @classmethod
+    def _from_state(cls, parameters, arrays, feature_names):
+        raise NotImplementedError(f"{cls.__name__} does not support persistence.")
+
+    @staticmethod
+    def _join_states(estimators):
+        """
+        State of estimators made of other estimators.
+        Input: list of fitted estimators.
+        Output: JSON-serialisable parameters and a dictionary of 1-D arrays
+        holding the states of all of them.
+        """
+        parameters, arrays = [], {}
+        for i, estimator in enumerate(estimators):
+            estimator_parameters, estimator_arrays, feature_names = estimator._get_state()
+            parameters.append({
+                'estimator': type(estimator).__name__,
+                'parameters': estimator_parameters,
+                'feature_names': None if feature_names is None else [str(name) for name in feature_names],
+            })
+            arrays.update({f'{i}.{name}': array for name, array in estimator_arrays.items()})
+        return parameters, arrays
+
+    @staticmethod
+    def _split_states(parameters, arrays):
+        """
+        Input: parameters and arrays returned by _join_states.
+        Output: list of the estimators.
+        """
+        estimators = []
+        for i, state in enumerate(parameters):
+            prefix = f'{i}.'
+            estimator_arrays = {name[len(prefix):]: array for name, array in arrays.items() if name.startswith(prefix)}
+            estimator_class = IEstimatorWrapper._registry[state['estimator']]
+            estimators.append(estimator_class._from_state(state['parameters'], estimator_arrays, state['feature_names']))
+        return estimators
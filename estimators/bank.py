@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+import shared
+from estimators.IEstimatorWrapper import IEstimatorWrapper
+from estimators.mtr import MTRLinearRegression
+
+
+class UserModelBank(IEstimatorWrapper):
+    """
+    One estimator per user, fitted in parallel from a single built dataset.
+
+    Rows are grouped by user through a stable argsort of the user codes, so
+    workers only receive index ranges into X, y and delta, which are
+    published once to shared memory (see shared.py). Users
+    with fewer than `min_rows` rows, as well as users unseen at fit time, are
+    served by a global model fitted on every row.
+
+    When the estimators are MTRLinearRegression, predict routes each row to
+    its user's coefficients (with the scaler folded in) in a single
+    vectorised pass. Other estimators predict once per user.
+
+    save stores the state of every estimator, so it needs estimators which
+    support persistence. A loaded bank predicts, but has no
+    estimator_constructor to be fitted again with.
+    """
+
+    def __init__(self, estimator_constructor, min_rows=100, n_jobs=None, **kwargs):
+        super().__init__(**kwargs)
+        self.estimator_constructor = estimator_constructor
+        self.min_rows = min_rows
+        self.n_jobs = n_jobs
+        self.global_estimator = None
+        self.estimators = {}
+        self.users = pd.Index([])
+        self.coef = None
+
+    def fit(self, X, y, delta, users=None, **kwargs):
+        """
+        Input: X, y, delta (assumed to not be scaled) and the user of each
+        row, e.g. df['user'].
+        Output: None.
+        """
+        self.global_estimator = self.estimator_constructor()
+        self.global_estimator.fit(X, y, delta)
+
+        self.estimators = {}
+        if users is not None:
+            codes, uniques = pd.factorize(np.asarray(users))
+            order = np.argsort(codes, kind='stable')
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(uniques)))])
+            jobs = [(offsets[i], offsets[i+1]) for i in range(len(uniques)) if offsets[i+1] - offsets[i] >= self.min_rows]
+            state = {'X': X, 'y': y, 'delta': delta, 'order': order, 'estimator_constructor': self.estimator_constructor}
+            fitted = shared.pool_map(_fit, jobs, state, self.n_jobs, published=['X', 'y', 'delta'])
+
+            for (start, _), estimator in zip(jobs, fitted):
+                self.estimators[uniques[codes[order[start]]]] = estimator
+
+        self.users = pd.Index(list(self.estimators))
+        self.coef = self.__coefficient_matrix()
+
+    def predict(self, X, delta, users=None, **kwargs):
+        """
+        Input: X, delta (assumed to not be scaled) and the user of each row.
+        Output: y_pred, predicted with each row's user model.
+        """
+        rows = self.__rows(users, len(X))
+        if self.coef is not None:
+            X_ = np.asarray(self.global_estimator._design_matrix(X), dtype=float)
+            coef = self.coef[rows]
+            mu = np.einsum('ij,ij->i', X_, coef[:, :-1]) + coef[:, -1]
+            return self.global_estimator.memory_trace_functional_form.calculate_retention_rate(mu, np.asarray(delta))
+
+        y_pred = np.empty(len(X))
+        for row in np.unique(rows):
+            index = np.flatnonzero(rows == row)
+            estimator = self.global_estimator if row == len(self.users) else self.estimators[self.users[row]]
+            y_pred[index] = estimator.predict(X.iloc[index], delta.iloc[index])
+        return y_pred
+
+    def get_name(self):
+        return self.global_estimator.get_name() + " (per user)"
+
+    def _get_state(self):
+        # The global estimator first, then one per user
+        estimators, arrays = self._join_states([self.global_estimator] + list(self.estimators.values()))
+        parameters = {'min_rows': self.min_rows, 'users': self.users.tolist(), 'estimators': estimators}
+        return parameters, arrays, estimators[0]['feature_names']
+
+    @classmethod
+    def _from_state(cls, parameters, arrays, feature_names):
+        self = cls(None, min_rows=parameters['min_rows'])
+        self.global_estimator, *estimators = cls._split_states(parameters['estimators'], arrays)
+        self.estimators = dict(zip(parameters['users'], estimators))
+        self.users = pd.Index(parameters['users'])
+        self.coef = self.__coefficient_matrix()
+        return self
+
+    def __rows(self, users, n):
+        """
+        Maps each user to its row in the bank. Unknown users (and all rows when
+        no users are given) map to the global model, which is the last row.
+        """
+        if users is None:
+            return np.full(n, len(self.users))
+        rows = self.users.get_indexer(np.asarray(users))
+        rows[rows == -1] = len(self.users)
+        return rows
+
+    def __coefficient_matrix(self):
+        """
+        Output: one row of unscaled coefficients (intercept last) per user
+        followed by the global model's, or None if the estimators are not
+        linear in mu.
+        """
+        estimators = list(self.estimators.values()) + [self.global_estimator]
+        if not all(isinstance(estimator, MTRLinearRegression) for estimator in estimators):
+            return None
+        return np.array([np.append(*estimator.unscaled_coefficients()) for estimator in estimators])
+
+
+def _fit(job):
+    start, end = job
+    state = shared.worker_state()
+    index = state['order'][start:end]
+    estimator = state['estimator_constructor']()
+    estimator.fit(state['X'].iloc[index], state['y'].iloc[index], state['delta'].iloc[index])
+    return estimator
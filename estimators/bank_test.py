@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from estimators import linear, mtr
+from estimators.bank import UserModelBank
+from estimators.mtr_test import make_dataset
+
+
+def test_UserModelBank():
+    X, y, delta = make_dataset(n=1000)
+    users = pd.Series(np.where(np.arange(len(X)) % 10 == 0, 'rare', np.where(np.arange(len(X)) % 2, 'odd', 'even')))
+
+    for estimator_constructor in [mtr.SWPMTREstimator, linear.LinearRegressionEstimator]:
+        bank = UserModelBank(estimator_constructor, min_rows=200, n_jobs=2)
+        bank.fit(X, y, delta, users=users)
+        assert set(bank.estimators) == {'odd', 'even'}
+
+        y_pred = bank.predict(X, delta, users=users)
+        for user in ['odd', 'even']:
+            index = users == user
+            estimator = estimator_constructor()
+            estimator.fit(X[index], y[index], delta[index])
+            assert np.allclose(y_pred[index], estimator.predict(X[index], delta[index]))
+
+        # Users under the row threshold and unknown users fall back to the global model
+        global_estimator = estimator_constructor()
+        global_estimator.fit(X, y, delta)
+        for user in ['rare', 'unknown']:
+            index = (users == 'rare').values
+            assert np.allclose(bank.predict(X[index], delta[index], users=[user] * index.sum()),
+                               global_estimator.predict(X[index], delta[index]))
+
+
+def test_UserModelBank_save_and_load(tmp_path):
+    X, y, delta = make_dataset(n=1000)
+    users = pd.Series(np.where(np.arange(len(X)) % 2, 'odd', 'even'))
+
+    for estimator_constructor in [mtr.SWPMTREstimator, linear.LinearRegressionEstimator]:
+        bank = UserModelBank(estimator_constructor, min_rows=200, n_jobs=1)
+        bank.fit(X, y, delta, users=users)
+        filename = tmp_path / 'bank.bin'
+        bank.save(filename)
+
+        loaded = UserModelBank.load(filename)
+        assert loaded.get_name() == bank.get_name()
+        assert set(loaded.estimators) == {'odd', 'even'}
+        for users_ in [users, ['unknown'] * len(X)]:
+            assert np.allclose(loaded.predict(X, delta, users=users_), bank.predict(X, delta, users=users_))
@@ -2,7 +2,11 @@ from sklearn.linear_model import LinearRegression, LogisticRegression
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import MinMaxScaler
 
+import numpy as np
+
+from estimators import persistence
 from estimators.IEstimatorWrapper import IEstimatorWrapper
+from wrangling.schema import expand_missing
 
 
 class LogisticRegressionEstimator(IEstimatorWrapper):
@@ -16,14 +20,27 @@ class LogisticRegressionEstimator(IEstimatorWrapper):
             ('scale', MinMaxScaler()),
             ('estimator', LogisticRegression(class_weight='balanced', max_iter=1000))
         ])
-        self.model.fit(X, y > 0.5)
+        self.model.fit(expand_missing(X), y > 0.5)
 
     def predict(self, X, delta, **kwargs):
-        return self.model.predict_proba(X)[:, 1]
+        return self.model.predict_proba(expand_missing(X))[:, 1]
 
     def get_name(self):
         return "Logistic Regression"
 
+    def _get_state(self):
+        return _pipeline_state(self.model)
+
+    @classmethod
+    def _from_state(cls, parameters, arrays, feature_names):
+        estimator = LogisticRegression(class_weight='balanced', max_iter=1000)
+        estimator.coef_ = arrays['coef'].reshape(1, -1)
+        estimator.intercept_ = arrays['intercept']
+        estimator.classes_ = np.array([False, True])
+        self = cls()
+        self.model = _pipeline_from_state(estimator, arrays, feature_names)
+        return self
+
 
 class LinearRegressionEstimator(IEstimatorWrapper):
 
@@ -36,14 +53,44 @@ class LinearRegressionEstimator(IEstimatorWrapper):
             ('scale', MinMaxScaler()),
             ('estimator', LinearRegression())
         ])
-        self.model.fit(X, y)
+        self.model.fit(expand_missing(X), y)
 
     def predict(self, X, delta, **kwargs):
-        return self.model.predict(X)
+        return self.model.predict(expand_missing(X))
 
     def get_name(self):
         return "Linear Regression"
 
+    def _get_state(self):
+        return _pipeline_state(self.model)
+
+    @classmethod
+    def _from_state(cls, parameters, arrays, feature_names):
+        estimator = LinearRegression()
+        estimator.coef_ = arrays['coef']
+        estimator.intercept_ = float(arrays['intercept'][0])
+        self = cls()
+        self.model = _pipeline_from_state(estimator, arrays, feature_names)
+        return self
+
+def _pipeline_state(model):
+    scaler, estimator = model.named_steps['scale'], model.named_steps['estimator']
+    arrays = {
+        **persistence.scaler_to_arrays(scaler),
+        'coef': estimator.coef_,
+        'intercept': np.ravel(estimator.intercept_),
+    }
+    return {}, arrays, getattr(scaler, 'feature_names_in_', None)
+
+
+def _pipeline_from_state(estimator, arrays, feature_names):
+    estimator.n_features_in_ = len(arrays['coef'])
+    return Pipeline([
+        ('scale', persistence.scaler_from_arrays(arrays, feature_names)),
+        ('estimator', estimator)
+    ])
+
+
 all_estimators = [
     LinearRegressionEstimator,
     LogisticRegressionEstimator
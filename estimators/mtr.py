@@ -1,12 +1,18 @@
 from abc import ABC, abstractmethod
-from typing import Callable
+from collections import defaultdict
+from functools import partial
+from typing import Callable, List
 
 import numpy as np
 from sklearn.linear_model import LinearRegression, HuberRegressor, ElasticNetCV, RidgeCV, LassoCV
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import MinMaxScaler
 
+from estimators import persistence
 from estimators.IEstimatorWrapper import IEstimatorWrapper
+from estimators.sufficient_statistics import LeastSquaresStatistics
+from lib import min_max_scale
+from wrangling.schema import expand_missing
 
 
 class IMemoryTraceFunctionalForm(ABC):
@@ -134,6 +140,13 @@ class SimplifiedWickelgren(IMemoryTraceFunctionalForm):
         return "SWP"
 
 
+# Functional forms by id, as stored in persisted estimators.
+FUNCTIONAL_FORMS = {
+    functional_form.get_name(): functional_form
+    for functional_form in [ExponentialSqrt, Exponential, Hyperbolic, HyperbolicSqrt, HLR, SimplifiedWickelgren]
+}
+
+
 class MTRLinearRegression(IEstimatorWrapper):
 
     def __init__(self,
@@ -147,47 +160,111 @@ class MTRLinearRegression(IEstimatorWrapper):
     def fit(self, X, y, delta, **kwargs):
         # Calculate mu
         mu = self.memory_trace_functional_form.calculate_mu(y, delta)
-
-        assert np.isfinite(X).values.all()
-        assert not np.isnan(X).values.all()
-        assert np.isfinite(mu).values.all()
-        assert not np.isnan(mu).values.all()
+        X = self._design_matrix(X)
+        _assert_finite(X, mu)
 
         # Fit model
         self.model = Pipeline([
             ('scale', MinMaxScaler()),
             ('estimator', LinearRegression())
         ])
-
-        if self.drop_delta_in_X:
-            self.model.fit(X.drop(['delta', ], axis=1), mu, **kwargs)
-        else:
-            self.model.fit(X, mu, **kwargs)
+        self.model.fit(X, mu, **kwargs)
+
+    def fit_from_chunks(self, chunks):
+        """
+        Out-of-core alternative to fit.
+        Input: an iterable of (X, y, delta) chunks. Assumed to not be scaled.
+        Output: None.
+        Only one chunk is held in memory at a time.
+        """
+        statistics = LeastSquaresStatistics()
+        for X, y, delta in chunks:
+            statistics.merge(self.sufficient_statistics(X, y, delta))
+        self.fit_from_statistics(statistics)
+
+    def sufficient_statistics(self, X, y, delta) -> LeastSquaresStatistics:
+        """
+        Input: X, y, delta of one chunk. Assumed to not be scaled.
+        Output: the chunk's least squares statistics on mu. Statistics of
+        different chunks (e.g. computed in different processes) can be
+        merged before calling fit_from_statistics.
+        """
+        mu = self.memory_trace_functional_form.calculate_mu(y, delta)
+        X = self._design_matrix(X)
+        _assert_finite(X, mu)
+        return LeastSquaresStatistics().update(X, mu)
+
+    def fit_from_statistics(self, statistics: LeastSquaresStatistics):
+        """
+        Fits the scaler and estimator from merged sufficient statistics.
+        Matches fit on the concatenated chunks to within floating point tolerance.
+        """
+        coef, intercept = statistics.solve()
+        scaler = _fitted_scaler(statistics.data_min, statistics.data_max, statistics.feature_names, statistics.n)
+        self.model = _fitted_pipeline(scaler, coef[0], intercept[0])
 
     def predict(self, X, delta, **kwargs):
         mu = self.predict_mu(X)
         return self.memory_trace_functional_form.calculate_retention_rate(mu, delta)
 
     def predict_mu(self, X):
-        if self.drop_delta_in_X:
-            mu = self.model.predict(X.drop(['delta', ], axis=1), )
-        else:
-            mu = self.model.predict(X)
+        mu = self.model.predict(self._design_matrix(X))
         return mu.reshape(len(mu))
 
+    def unscaled_coefficients(self):
+        """
+        Output: coef and intercept of mu as a linear function of the
+        unscaled design matrix, i.e. with the MinMaxScaler folded in.
+        """
+        scaler, estimator = self.model.named_steps['scale'], self.model.named_steps['estimator']
+        coef = np.ravel(estimator.coef_)
+        return coef * scaler.scale_, float(estimator.intercept_ + coef @ scaler.min_)
+
+    def _get_state(self):
+        scaler, estimator = self.model.named_steps['scale'], self.model.named_steps['estimator']
+        parameters = {
+            'functional_form': self.memory_trace_functional_form.get_name(),
+            'drop_delta_in_X': self.drop_delta_in_X,
+        }
+        arrays = {
+            **persistence.scaler_to_arrays(scaler),
+            'coef': estimator.coef_,
+            'intercept': [estimator.intercept_],
+        }
+        return parameters, arrays, getattr(scaler, 'feature_names_in_', None)
+
+    @classmethod
+    def _from_state(cls, parameters, arrays, feature_names):
+        self = cls(memory_trace_functional_form=FUNCTIONAL_FORMS[parameters['functional_form']],
+                   drop_delta_in_X=parameters['drop_delta_in_X'])
+        scaler = persistence.scaler_from_arrays(arrays, feature_names)
+        self.model = _fitted_pipeline(scaler, arrays['coef'], arrays['intercept'][0])
+        return self
+
+    def _design_matrix(self, X):
+        """
+        Returns the columns of X the regression is fitted on. Nullable
+        columns (see wrangling.schema) are expanded into values and
+        indicators of the missing values.
+        """
+        X = expand_missing(X)
+        if self.drop_delta_in_X:
+            return X.drop(['delta', ], axis=1)
+        return X
+
     def get_name(self):
         form_name = self.memory_trace_functional_form.get_name()
         if form_name == "HLR":
             return "HLR"
         return 'MTR-'+form_name
 
-ExpMTREstimator = lambda: MTRLinearRegression(memory_trace_functional_form=Exponential)
-ESqMTREstimator = lambda: MTRLinearRegression(memory_trace_functional_form=ExponentialSqrt)
-HypMTREstimator = lambda: MTRLinearRegression(memory_trace_functional_form=Hyperbolic)
-HSqMTREstimator = lambda: MTRLinearRegression(memory_trace_functional_form=HyperbolicSqrt)
-SWPMTREstimator = lambda: MTRLinearRegression(memory_trace_functional_form=SimplifiedWickelgren)
-HLRMTREstimator = lambda: MTRLinearRegression(memory_trace_functional_form=HLR)
-HLRWithDeltaMTREstimator = lambda: MTRLinearRegression(memory_trace_functional_form=HLR, drop_delta_in_X=False)
+ExpMTREstimator = partial(MTRLinearRegression, memory_trace_functional_form=Exponential)
+ESqMTREstimator = partial(MTRLinearRegression, memory_trace_functional_form=ExponentialSqrt)
+HypMTREstimator = partial(MTRLinearRegression, memory_trace_functional_form=Hyperbolic)
+HSqMTREstimator = partial(MTRLinearRegression, memory_trace_functional_form=HyperbolicSqrt)
+SWPMTREstimator = partial(MTRLinearRegression, memory_trace_functional_form=SimplifiedWickelgren)
+HLRMTREstimator = partial(MTRLinearRegression, memory_trace_functional_form=HLR)
+HLRWithDeltaMTREstimator = partial(MTRLinearRegression, memory_trace_functional_form=HLR, drop_delta_in_X=False)
 
 all_estimators = [
     HLRMTREstimator,
@@ -198,3 +275,76 @@ all_estimators = [
     HSqMTREstimator,
     SWPMTREstimator
 ]
+
+
+def fit_all_functional_forms(X, y, delta, estimator_constructors=all_estimators) -> List[MTRLinearRegression]:
+    """
+    Fits several MTR estimators in one shared solve.
+    The estimators only differ in the mu target, so the ones sharing a
+    design matrix (same `drop_delta_in_X`) get a single MinMaxScaler and a
+    single multi-output least squares fit with one mu column per
+    functional form.
+
+    Input: X, y, delta (assumed to not be scaled) and the estimator
+    constructors to fit, all_estimators by default.
+    Output: list of fitted MTRLinearRegression, in the order of the constructors.
+    """
+    estimators = [estimator_constructor() for estimator_constructor in estimator_constructors]
+    groups = defaultdict(list)
+    for estimator in estimators:
+        if not isinstance(estimator, MTRLinearRegression):
+            raise TypeError(f"Expected an MTRLinearRegression but received {type(estimator)}")
+        groups[estimator.drop_delta_in_X].append(estimator)
+
+    for group in groups.values():
+        X_ = group[0]._design_matrix(X)
+        mu = np.column_stack([estimator.memory_trace_functional_form.calculate_mu(y, delta) for estimator in group])
+        _assert_finite(X_, mu)
+
+        scaler = MinMaxScaler().fit(X_)
+        regression = LinearRegression().fit(scaler.transform(X_), mu)
+        for i, estimator in enumerate(group):
+            estimator.model = _fitted_pipeline(scaler, regression.coef_[i], regression.intercept_[i])
+
+    return estimators
+
+
+def _fitted_pipeline(scaler, coef, intercept):
+    """
+    Assembles the same pipeline MTRLinearRegression.fit produces out of an
+    already fitted scaler and the regression coefficients.
+    """
+    estimator = LinearRegression()
+    estimator.coef_ = np.asarray(coef, dtype=float)
+    estimator.intercept_ = float(intercept)
+    estimator.n_features_in_ = len(estimator.coef_)
+    return Pipeline([
+        ('scale', scaler),
+        ('estimator', estimator)
+    ])
+
+
+def _fitted_scaler(data_min, data_max, feature_names=None, n_samples_seen=None):
+    """
+    Assembles a MinMaxScaler as if it had been fitted on data with the
+    given per-feature min and max.
+    """
+    scaler = MinMaxScaler()
+    scaler.data_min_ = np.asarray(data_min, dtype=float)
+    scaler.data_max_ = np.asarray(data_max, dtype=float)
+    scaler.data_range_ = scaler.data_max_ - scaler.data_min_
+    scaler.scale_ = min_max_scale(scaler.data_min_, scaler.data_max_)
+    scaler.min_ = -scaler.data_min_ * scaler.scale_
+    scaler.n_features_in_ = len(scaler.data_min_)
+    scaler.n_samples_seen_ = n_samples_seen
+    if feature_names is not None:
+        scaler.feature_names_in_ = np.asarray(feature_names, dtype=object)
+    return scaler
+
+
+def _assert_finite(X, mu):
+    X, mu = np.asarray(X, dtype=float), np.asarray(mu, dtype=float)
+    assert np.isfinite(X).all()
+    assert not np.isnan(X).all()
+    assert np.isfinite(mu).all()
+    assert not np.isnan(mu).all()
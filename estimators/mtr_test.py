@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from estimators import mtr
+
+
+def make_dataset(n=500, seed=0):
+    random = np.random.default_rng(seed)
+    delta = random.uniform(60, 30 * 24 * 60 * 60, n)
+    X = pd.DataFrame({
+        'delta': delta,
+        'REVISION__ALL_amount': random.integers(0, 20, n),
+        'TEXT__ALL_seconds': random.uniform(0, 1e6, n),
+        'ALL_amount': random.integers(1, 50, n),
+    })
+    y = pd.Series(np.clip(np.power(1 + delta / (24 * 60 * 60), -0.5) + random.normal(0, 0.1, n), 0.01, 0.99))
+    return X, y, X['delta']
+
+
+def test_fit_all_functional_forms():
+    X, y, delta = make_dataset()
+    fitted = mtr.fit_all_functional_forms(X, y, delta)
+
+    assert len(fitted) == len(mtr.all_estimators)
+    for estimator_constructor, shared_fit in zip(mtr.all_estimators, fitted):
+        estimator = estimator_constructor()
+        estimator.fit(X, y, delta)
+        assert shared_fit.get_name() == estimator.get_name()
+        assert np.allclose(shared_fit.predict_mu(X), estimator.predict_mu(X))
+        assert np.allclose(shared_fit.predict(X, delta), estimator.predict(X, delta), equal_nan=True)
+
+
+def test_fit_from_chunks():
+    X, y, delta = make_dataset(n=1000)
+    X['constant'] = 1.
+
+    for estimator_constructor in mtr.all_estimators:
+        estimator = estimator_constructor()
+        estimator.fit(X, y, delta)
+
+        chunked = estimator_constructor()
+        chunks = [(X.iloc[i:i+128], y.iloc[i:i+128], delta.iloc[i:i+128]) for i in range(0, len(X), 128)]
+        chunked.fit_from_chunks(chunks)
+        assert np.allclose(chunked.predict_mu(X), estimator.predict_mu(X))
+
+        # Statistics computed on separate shards can be merged before solving
+        shards = [chunked.sufficient_statistics(X_, y_, delta_) for X_, y_, delta_ in chunks]
+        merged = estimator_constructor()
+        merged.fit_from_statistics(sum(shards[1:], shards[0]))
+        assert np.allclose(merged.predict_mu(X), estimator.predict_mu(X))
@@ -0,0 +1,155 @@
+from copy import copy
+
+import numpy as np
+
+from estimators import persistence
+from estimators.IEstimatorWrapper import IEstimatorWrapper
+from estimators.mtr import MTRLinearRegression, _fitted_pipeline
+from estimators.sufficient_statistics import LeastSquaresStatistics
+from lib import min_max_scale
+
+
+class OnlineMTRBank:
+    """
+    Per-user copies of a fitted global MTRLinearRegression which are updated
+    online from each user's newest datapoints, without batch retraining.
+
+    The update is a normalised least mean squares step on mu, over the
+    global model's scaled features, preconditioned by the inverse second
+    moment matrix of the global training data, which stays fixed. Unlike
+    recursive least squares, no gain matrix is updated, so an update costs
+    O(features²) per datapoint while the per-user state is only the
+    coefficient vector (features + intercept, float32). Users that were never
+    updated take no memory at all and predict with the global model.
+
+    save and load persist the global model, the preconditioner and the
+    coefficients of every user (see estimators.persistence).
+    """
+
+    def __init__(self,
+                 global_model: MTRLinearRegression,
+                 statistics: LeastSquaresStatistics,
+                 learning_rate=0.2,
+                 ridge=1e-3):
+        """
+        Input: the fitted global model, the sufficient statistics of its
+        training data (see MTRLinearRegression.sufficient_statistics), the
+        step size in (0, 1] and a ridge term regularising the preconditioner.
+        """
+        self.global_model = global_model
+        self.learning_rate = learning_rate
+        self.scaler = global_model.model.named_steps['scale']
+        estimator = global_model.model.named_steps['estimator']
+        self.global_coef = np.append(estimator.coef_, estimator.intercept_).astype(np.float32)
+        self.preconditioner = self.__preconditioner(statistics, ridge)
+
+        self.users_to_rows = {}
+        self.coefs = np.empty((0, len(self.global_coef)), dtype=np.float32)
+
+    def update(self, user, X, y, delta):
+        """
+        Adjusts the user's model to the given datapoints, in order.
+        Input: user, X, y, delta. Assumed to not be scaled.
+        Output: None.
+        """
+        Z = self.__augmented_features(X)
+        mu = np.asarray(self.global_model.memory_trace_functional_form.calculate_mu(y, delta), dtype=float)
+
+        row = self.__row(user)
+        coef = self.coefs[row].astype(float)
+        for z, target in zip(Z, mu):
+            gain = self.preconditioner @ z
+            error = target - z @ coef
+            coef += self.learning_rate * error * gain / (1. + self.learning_rate * (z @ gain))
+        self.coefs[row] = coef
+
+    def predict(self, user, X, delta):
+        mu = self.predict_mu(user, X)
+        return self.global_model.memory_trace_functional_form.calculate_retention_rate(mu, delta)
+
+    def predict_mu(self, user, X):
+        return self.__augmented_features(X) @ self.coef(user)
+
+    def coef(self, user):
+        """
+        Output: the user's coefficients in the scaled feature space, with
+        the intercept last.
+        """
+        if user not in self.users_to_rows:
+            return self.global_coef
+        return self.coefs[self.users_to_rows[user]]
+
+    def to_estimator(self, user) -> MTRLinearRegression:
+        """
+        Output: a standalone MTRLinearRegression with the user's current coefficients.
+        """
+        estimator = copy(self.global_model)
+        coef = self.coef(user).astype(float)
+        estimator.model = _fitted_pipeline(self.scaler, coef[:-1], coef[-1])
+        return estimator
+
+    def save(self, filename):
+        """
+        Input: filename.
+        Output: None.
+        """
+        estimators, arrays = IEstimatorWrapper._join_states([self.global_model])
+        parameters = {'learning_rate': self.learning_rate, 'users': list(self.users_to_rows), 'estimators': estimators}
+        arrays = {**arrays, 'preconditioner': self.preconditioner, 'coefs': self.coefs[:len(self.users_to_rows)]}
+        persistence.save(filename, type(self).__name__, parameters, arrays)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Input: filename written by save.
+        Output: the bank, with the users' coefficients copied to memory so
+        that they can be updated.
+        """
+        header, arrays = persistence.load(filename)
+        if header['estimator'] != cls.__name__:
+            raise ValueError(f"{filename} holds a {header['estimator']}, not a {cls.__name__}.")
+        parameters = header['parameters']
+        self = cls.__new__(cls)
+        self.global_model, = IEstimatorWrapper._split_states(parameters['estimators'], arrays)
+        self.learning_rate = parameters['learning_rate']
+        self.scaler = self.global_model.model.named_steps['scale']
+        estimator = self.global_model.model.named_steps['estimator']
+        self.global_coef = np.append(estimator.coef_, estimator.intercept_).astype(np.float32)
+        n = len(self.global_coef)
+        self.preconditioner = np.array(arrays['preconditioner']).reshape(n, n)
+        self.users_to_rows = {user: row for row, user in enumerate(parameters['users'])}
+        self.coefs = np.array(arrays['coefs'], dtype=np.float32).reshape(len(self.users_to_rows), n)
+        return self
+
+    def __len__(self):
+        return len(self.users_to_rows)
+
+    def __row(self, user):
+        if user in self.users_to_rows:
+            return self.users_to_rows[user]
+        row = len(self.users_to_rows)
+        if row == len(self.coefs):
+            # Grow geometrically so that adding users is amortised O(1)
+            coefs = np.empty((max(16, 2 * len(self.coefs)), self.coefs.shape[1]), dtype=np.float32)
+            coefs[:row] = self.coefs
+            self.coefs = coefs
+        self.coefs[row] = self.global_coef
+        self.users_to_rows[user] = row
+        return row
+
+    def __augmented_features(self, X):
+        X_scaled = self.scaler.transform(self.global_model._design_matrix(X))
+        return np.hstack([X_scaled, np.ones((len(X_scaled), 1))])
+
+    @staticmethod
+    def __preconditioner(statistics, ridge):
+        # Second moment matrix E[zzᵀ] of the scaled features augmented with a 1
+        scale = min_max_scale(statistics.data_min, statistics.data_max)
+        mean = (statistics.mean_x - statistics.data_min) * scale
+        covariance = statistics.comoment_xx * np.outer(scale, scale) / statistics.n
+        n_features = len(mean)
+        second_moment = np.empty((n_features + 1, n_features + 1))
+        second_moment[:n_features, :n_features] = covariance + np.outer(mean, mean)
+        second_moment[:n_features, -1] = second_moment[-1, :n_features] = mean
+        second_moment[-1, -1] = 1.
+        return np.linalg.inv(second_moment + ridge * np.eye(n_features + 1))
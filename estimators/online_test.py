@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from estimators import mtr
+from estimators.mtr_test import make_dataset
+from estimators.online import OnlineMTRBank
+
+
+def test_OnlineMTRBank():
+    X, y, delta = make_dataset(n=2000)
+    global_model = mtr.SWPMTREstimator()
+    global_model.fit(X, y, delta)
+    bank = OnlineMTRBank(global_model, global_model.sufficient_statistics(X, y, delta))
+
+    # Users that were never updated use the global model
+    assert np.allclose(bank.predict('unknown', X, delta), global_model.predict(X, delta))
+    assert len(bank) == 0
+
+    # A user who remembers a lot better than average
+    X_user, _, delta_user = make_dataset(n=200, seed=1)
+    y_user = pd.Series(np.clip(global_model.predict(X_user, delta_user) + 0.2, 0.1, 0.9))
+    mu_user = global_model.memory_trace_functional_form.calculate_mu(y_user, delta_user)
+
+    def error(user):
+        return np.mean(np.abs(bank.predict_mu(user, X_user.iloc[150:]) - mu_user.iloc[150:]))
+
+    error_before = error('user')
+    for session in range(0, 150, 10):
+        bank.update('user', X_user.iloc[session:session+10], y_user.iloc[session:session+10], delta_user.iloc[session:session+10])
+    assert error('user') < error_before
+    assert len(bank) == 1
+
+    estimator = bank.to_estimator('user')
+    assert np.allclose(estimator.predict_mu(X_user), bank.predict_mu('user', X_user), atol=1e-4)
+
+
+def test_OnlineMTRBank_save_and_load(tmp_path):
+    X, y, delta = make_dataset(n=2000)
+    global_model = mtr.SWPMTREstimator()
+    global_model.fit(X, y, delta)
+    bank = OnlineMTRBank(global_model, global_model.sufficient_statistics(X, y, delta))
+    bank.update('user', X.iloc[:20], y.iloc[:20], delta.iloc[:20])
+    filename = tmp_path / 'bank.bin'
+    bank.save(filename)
+
+    loaded = OnlineMTRBank.load(filename)
+    assert len(loaded) == 1
+    for user in ['user', 'unknown']:
+        assert np.allclose(loaded.predict(user, X, delta), bank.predict(user, X, delta))
+    # Loaded banks keep learning like the original
+    for bank_ in [bank, loaded]:
+        bank_.update('user', X.iloc[20:40], y.iloc[20:40], delta.iloc[20:40])
+    assert np.allclose(loaded.coef('user'), bank.coef('user'))
@@ -0,0 +1,97 @@
+"""
+Small versioned binary artifact for fitted estimators.
+
+Layout:
+    8 bytes   magic, b'MTRMODEL'
+    4 bytes   format version (little-endian uint32)
+    4 bytes   header length (little-endian uint32)
+    n bytes   JSON header, padded with spaces to a multiple of 8 bytes
+    rest      float64 arrays back to back
+
+The header holds the estimator class, its scalar parameters (e.g. the
+functional form id), the feature schema, and the offset and length of
+every array. Arrays are loaded through a read-only memory map, so loading a
+model only reads the header and the pages that prediction actually touches.
+"""
+import json
+import struct
+
+import numpy as np
+from sklearn.preprocessing import MinMaxScaler
+
+MAGIC = b'MTRMODEL'
+FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct('<8sII')
+
+
+def save(filename, estimator, parameters: dict, arrays: dict, feature_names=None):
+    """
+    Input: filename, estimator class name, JSON-serialisable parameters, a
+    dictionary of 1-D float arrays and optionally the feature names.
+    Output: None.
+    """
+    arrays = {name: np.ascontiguousarray(array, dtype='<f8').ravel() for name, array in arrays.items()}
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = [offset, len(array)]
+        offset += len(array)
+
+    header = json.dumps({
+        'estimator': estimator,
+        'parameters': parameters,
+        'feature_names': None if feature_names is None else [str(name) for name in feature_names],
+        'arrays': layout,
+    }).encode('utf-8')
+    header += b' ' * (-(_PREAMBLE.size + len(header)) % 8)
+
+    with open(filename, 'wb') as file:
+        file.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        file.write(header)
+        for array in arrays.values():
+            file.write(array.tobytes())
+
+
+def load(filename):
+    """
+    Input: filename of an artifact written by save.
+    Output: the header dictionary and a dictionary of read-only, memory
+    mapped arrays.
+    """
+    with open(filename, 'rb') as file:
+        magic, version, header_length = _PREAMBLE.unpack(file.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{filename} is not an estimator file.")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"{filename} has format version {version}, but only up to {FORMAT_VERSION} is supported.")
+        header = json.loads(file.read(header_length))
+
+    total_length = sum(length for _, length in header['arrays'].values())
+    data = np.memmap(filename, dtype='<f8', mode='r', offset=_PREAMBLE.size + header_length, shape=(total_length,)) \
+        if total_length else np.empty(0)
+    arrays = {name: data[offset:offset + length] for name, (offset, length) in header['arrays'].items()}
+    return header, arrays
+
+
+def scaler_to_arrays(scaler: MinMaxScaler):
+    return {
+        'data_min': scaler.data_min_,
+        'data_max': scaler.data_max_,
+        'scale': scaler.scale_,
+        'min': scaler.min_,
+    }
+
+
+def scaler_from_arrays(arrays, feature_names=None) -> MinMaxScaler:
+    """
+    Assembles a fitted MinMaxScaler around the stored arrays, without copying them.
+    """
+    scaler = MinMaxScaler()
+    scaler.data_min_ = arrays['data_min']
+    scaler.data_max_ = arrays['data_max']
+    scaler.data_range_ = scaler.data_max_ - scaler.data_min_
+    scaler.scale_ = arrays['scale']
+    scaler.min_ = arrays['min']
+    scaler.n_features_in_ = len(scaler.scale_)
+    if feature_names is not None:
+        scaler.feature_names_in_ = np.asarray(feature_names, dtype=object)
+    return scaler
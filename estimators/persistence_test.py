@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from estimators import linear, mtr
+from estimators.IEstimatorWrapper import IEstimatorWrapper
+from estimators.mtr_test import make_dataset
+
+
+def test_save_and_load(tmp_path):
+    X, y, delta = make_dataset()
+
+    for estimator_constructor in mtr.all_estimators + linear.all_estimators:
+        estimator = estimator_constructor()
+        estimator.fit(X, y, delta)
+        filename = tmp_path / 'estimator.bin'
+        estimator.save(filename)
+
+        for loader in [type(estimator), IEstimatorWrapper]:
+            loaded = loader.load(filename)
+            assert type(loaded) is type(estimator)
+            assert loaded.get_name() == estimator.get_name()
+            assert np.allclose(loaded.predict(X, delta), estimator.predict(X, delta), equal_nan=True)
+
+    # Files cannot be reloaded as an unrelated estimator
+    with pytest.raises(ValueError):
+        mtr.MTRLinearRegression.load(filename)
@@ -0,0 +1,107 @@
+from typing import List
+
+import numpy as np
+
+from lib import min_max_scale
+
+
+class LeastSquaresStatistics:
+    """
+    Sufficient statistics of an ordinary least squares problem with an
+    intercept and min-max scaled features: the number of rows, per-feature
+    min/max, the feature and target means, and the co-moment matrices
+    (X - mean)ᵀ(X - mean) and (X - mean)ᵀ(y - mean).
+
+    Co-moments are used instead of raw XᵀX and Xᵀy because the `*_seconds`
+    features are in the order of 1e7 and their squares lose precision.
+    Statistics of different chunks, shards or processes are merged with the
+    pairwise update of Chan et al., so the result does not depend on how
+    the data was split.
+    """
+
+    def __init__(self, feature_names: List[str] = None):
+        self.feature_names = feature_names
+        self.n = 0
+        self.data_min = None
+        self.data_max = None
+        self.mean_x = None
+        self.mean_y = None
+        self.comoment_xx = None
+        self.comoment_xy = None
+
+    def update(self, X, y):
+        """
+        Accumulates a chunk.
+        Input: X (n × features), y (n or n × targets).
+        Output: self
+        """
+        if self.feature_names is None and hasattr(X, 'columns'):
+            self.feature_names = list(X.columns)
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if y.ndim == 1:
+            y = y.reshape(-1, 1)
+        if not len(X):
+            return self
+
+        chunk = LeastSquaresStatistics(self.feature_names)
+        chunk.n = len(X)
+        chunk.data_min = X.min(axis=0)
+        chunk.data_max = X.max(axis=0)
+        chunk.mean_x = X.mean(axis=0)
+        chunk.mean_y = y.mean(axis=0)
+        X_centered = X - chunk.mean_x
+        chunk.comoment_xx = X_centered.T @ X_centered
+        chunk.comoment_xy = X_centered.T @ (y - chunk.mean_y)
+        return self.merge(chunk)
+
+    def merge(self, other: 'LeastSquaresStatistics'):
+        """
+        Merges the statistics of another chunk into these ones.
+        Output: self
+        """
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.feature_names = self.feature_names or other.feature_names
+            self.n = other.n
+            self.data_min, self.data_max = other.data_min.copy(), other.data_max.copy()
+            self.mean_x, self.mean_y = other.mean_x.copy(), other.mean_y.copy()
+            self.comoment_xx, self.comoment_xy = other.comoment_xx.copy(), other.comoment_xy.copy()
+            return self
+        if self.feature_names and other.feature_names and list(self.feature_names) != list(other.feature_names):
+            raise ValueError("Cannot merge statistics computed over different features.")
+
+        n = self.n + other.n
+        d_x = other.mean_x - self.mean_x
+        d_y = other.mean_y - self.mean_y
+        weight = self.n * other.n / n
+
+        self.comoment_xx += other.comoment_xx + weight * np.outer(d_x, d_x)
+        self.comoment_xy += other.comoment_xy + weight * np.outer(d_x, d_y)
+        self.mean_x += d_x * other.n / n
+        self.mean_y += d_y * other.n / n
+        self.data_min = np.minimum(self.data_min, other.data_min)
+        self.data_max = np.maximum(self.data_max, other.data_max)
+        self.n = n
+        return self
+
+    def __add__(self, other):
+        return LeastSquaresStatistics(self.feature_names).merge(self).merge(other)
+
+    def solve(self):
+        """
+        Solves the least squares problem on min-max scaled features, like
+        Pipeline([MinMaxScaler(), LinearRegression()]) would.
+        Output: coef (targets × features) and intercept (targets) in the
+        scaled feature space.
+        """
+        if self.n == 0:
+            raise Exception("Need at least one chunk of data to solve!")
+        scale = min_max_scale(self.data_min, self.data_max)
+        comoment_xx = self.comoment_xx * np.outer(scale, scale)
+        comoment_xy = self.comoment_xy * scale.reshape(-1, 1)
+        coef, *_ = np.linalg.lstsq(comoment_xx, comoment_xy, rcond=None)
+        mean_x_scaled = (self.mean_x - self.data_min) * scale
+        intercept = self.mean_y - mean_x_scaled @ coef
+        return coef.T, intercept
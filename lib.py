@@ -1,7 +1,19 @@
+import numpy as np
+
 import config
 
 
 def debug(message):
     if not config.DEBUG:
         return
-    print(message)
\ No newline at end of file
+    print(message)
+
+
+def min_max_scale(data_min, data_max):
+    """
+    MinMaxScaler's scale_ for the default (0, 1) feature range, with
+    constant features left unscaled.
+    """
+    data_range = np.asarray(data_max, dtype=float) - np.asarray(data_min, dtype=float)
+    data_range[data_range < 10 * np.finfo(data_range.dtype).eps] = 1.
+    return 1. / data_range
@@ -7,6 +7,8 @@ from sklearn.metrics import mean_squared_error, mean_absolute_error, balanced_ac
 from sklearn.preprocessing import MinMaxScaler
 from sigfig import round
 
+from lib import min_max_scale
+
 
 class IEvaluation(ABC):
 
@@ -32,17 +34,14 @@ class LombEvaluation(IEvaluation):
 
     @classmethod
     def from_CV(cls, estimator_name, y_trues, y_preds, y_previous=None, deltas=None):
-        def confidence_interval(metric, *args):
-            vals = [metric(*args_) for args_ in zip(y_trues, y_preds, *args)]
-            return statistics.mean(vals), 1.96 * statistics.stdev(vals)
-
+        vals = fold_metrics(y_trues, y_preds, y_previous, deltas)
         return cls(
             estimator_name=estimator_name,
-            mae=confidence_interval(mean_absolute_error),
-            mse=confidence_interval(mean_squared_error),
-            wmse_tau=confidence_interval(wmse_tau, y_previous),
-            wmse_tau_delta=confidence_interval(wmse_tau_delta, y_previous, deltas),
-            wmse_delta=confidence_interval(wmse_delta, deltas),
+            mae=_confidence_interval(vals['mae']),
+            mse=_confidence_interval(vals['mse']),
+            wmse_tau=_confidence_interval(vals.get('wmse_tau')),
+            wmse_tau_delta=_confidence_interval(vals.get('wmse_tau_delta')),
+            wmse_delta=_confidence_interval(vals.get('wmse_delta')),
             classification_report=""
         )
 
@@ -60,16 +59,13 @@ class DuolingoEvaluation(IEvaluation):
 
     @classmethod
     def from_CV(cls, estimator_name, y_trues, y_preds, dataset='unknown'):
-        def confidence_interval(metric, *args):
-            vals = [metric(*args_, *args) for args_ in zip(y_trues, y_preds)]
-            return statistics.mean(vals), 1.96 * statistics.stdev(vals)
-
+        vals = fold_metrics(y_trues, y_preds)
         return cls(
             estimator_name=estimator_name,
             dataset=dataset,
-            mae=confidence_interval(mean_absolute_error),
-            mmae=confidence_interval(mean_absolute_error_y_less_than, 0.5),
-            weighted_binary_accuracy=confidence_interval(balanced_accuracy_score_from_float),
+            mae=_confidence_interval(vals['mae']),
+            mmae=_confidence_interval(vals['mmae']),
+            weighted_binary_accuracy=_confidence_interval(vals['balanced_accuracy']),
         )
 
     def to_latex_tabular_row(self):
@@ -90,6 +86,61 @@ class DuolingoEvaluation(IEvaluation):
         return f"{self.estimator_name} & { subset_symbols[self.dataset] } & {format(self.mae, just_mean=True)} & {format(self.mmae, just_mean=True)} & {format(self.weighted_binary_accuracy, just_mean=True)} \\\\"
 
 
+def fold_metrics(y_trues, y_preds, y_previous=None, deltas=None):
+    """
+    Computes every metric of LombEvaluation and DuolingoEvaluation for all
+    folds at once. The folds are stacked into flat arrays and each metric is
+    a segmented sum over them, so the errors, tau and the scaled delta are
+    only computed once per row.
+
+    Input: lists with one array per fold of y_true, y_pred and optionally
+    the previous recall score and delta.
+    Output: dictionary of metric name to an array with one value per fold:
+    mae, mse, mmae (MAE where y_true < 0.5), balanced_accuracy and, when
+    y_previous / deltas are given, wmse_tau, wmse_delta and wmse_tau_delta.
+    """
+    lengths = np.array([len(y_true) for y_true in y_trues])
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    fold_sum = lambda x: np.add.reduceat(np.asarray(x, dtype=float), starts)
+
+    y_true = _stack(y_trues)
+    y_pred = _stack(y_preds)
+    squared_error = np.square(y_true - y_pred)
+    absolute_error = np.abs(y_true - y_pred)
+
+    below = y_true < 0.5
+    positive, predicted_positive = y_true > 0.5, y_pred > 0.5
+    positives = fold_sum(positive)
+    negatives = lengths - positives
+    with np.errstate(invalid='ignore', divide='ignore'):
+        recalls = np.stack([fold_sum(positive & predicted_positive) / positives,
+                            fold_sum(~positive & ~predicted_positive) / negatives])
+        # Like sklearn, only average over the classes present in y_true
+        balanced_accuracy = np.nanmean(recalls, axis=0)
+        mmae = fold_sum(absolute_error * below) / fold_sum(below)
+
+    vals = {
+        'mae': fold_sum(absolute_error) / lengths,
+        'mse': fold_sum(squared_error) / lengths,
+        'mmae': mmae,
+        'balanced_accuracy': balanced_accuracy,
+    }
+
+    if y_previous is not None:
+        tau_squared = np.square(_stack(y_previous) - y_true)
+        vals['wmse_tau'] = fold_sum(tau_squared * squared_error) / lengths
+    if deltas is not None:
+        delta = _stack(deltas)
+        delta_min = np.minimum.reduceat(delta, starts)
+        delta_scale = min_max_scale(delta_min, np.maximum.reduceat(delta, starts))
+        fold = np.repeat(np.arange(len(lengths)), lengths)
+        delta_scaled_squared = np.square((delta - delta_min[fold]) * delta_scale[fold])
+        vals['wmse_delta'] = fold_sum(delta_scaled_squared * squared_error) / lengths
+        if y_previous is not None:
+            vals['wmse_tau_delta'] = fold_sum(tau_squared * delta_scaled_squared * squared_error) / lengths
+    return vals
+
+
 def wmse(y_true, y_pred, w):
     product = np.multiply(w, np.abs(y_true - y_pred))
     product_squared = np.power(product, 2)
@@ -113,12 +164,41 @@ def wmse_delta(y_true, y_pred, delta):
 
 
 def masked_mse(y_true, y_pred, previous_recall_score):
-    vals = []
-    for i in range(0, 10):
-        epsilon = float(i) / 10.
-        mask = np.abs(y_true - previous_recall_score) > epsilon
-        vals.append(mean_squared_error(y_true[mask], y_pred[mask]))
-    return vals
+    thresholds = [float(i) / 10. for i in range(0, 10)]
+    _, mse, _ = masked_error_curve(y_true, y_pred, previous_recall_score, thresholds)
+    return mse.tolist()
+
+
+def masked_error_curve(y_true, y_pred, previous_recall_score, thresholds=100):
+    """
+    MSE and MAE over the rows where |y_true - previous_recall_score| > epsilon,
+    for every epsilon in thresholds. The rows are sorted once by change in
+    recall score and every threshold is answered from suffix sums of the
+    squared and absolute errors, so the curve costs about one sort however
+    many thresholds are asked for.
+
+    Input: y_true, y_pred, previous_recall_score and either the thresholds
+    or how many evenly spaced thresholds in [0, 1) to use.
+    Output: thresholds, mse, mae. Thresholds above every change in recall
+    score have nan errors.
+    """
+    if np.isscalar(thresholds):
+        thresholds = np.arange(thresholds) / thresholds
+    thresholds = np.asarray(thresholds, dtype=float)
+    y_true, y_pred = np.asarray(y_true, dtype=float), np.asarray(y_pred, dtype=float)
+
+    change = np.abs(y_true - np.asarray(previous_recall_score, dtype=float))
+    order = np.argsort(change, kind='stable')
+    error = (y_true - y_pred)[order]
+    suffix_squared_error = np.append(np.cumsum(np.square(error)[::-1])[::-1], 0.)
+    suffix_absolute_error = np.append(np.cumsum(np.abs(error)[::-1])[::-1], 0.)
+
+    start = np.searchsorted(change[order], thresholds, side='right')
+    counts = len(error) - start
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mse = suffix_squared_error[start] / counts
+        mae = suffix_absolute_error[start] / counts
+    return thresholds, mse, mae
 
 
 def mean_absolute_error_y_less_than(y_true, y_pred, upper_bound):
@@ -136,6 +216,17 @@ def _1D_scaler(x):
     return x_scaled[:, 0].reshape(len(x))
 
 
+def _stack(arrays):
+    return np.concatenate([np.asarray(array, dtype=float).reshape(-1) for array in arrays])
+
+
+def _confidence_interval(vals):
+    if vals is None:
+        return None
+    vals = vals.tolist()
+    return statistics.mean(vals), 1.96 * statistics.stdev(vals)
+
+
 def _format_metric_value(mean_confidence_interval, just_mean=False):
     mean, confidence_interval = mean_confidence_interval[0], mean_confidence_interval[1]
     if just_mean:
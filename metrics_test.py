@@ -0,0 +1,66 @@
+import statistics
+
+import numpy as np
+import pytest
+from sklearn.metrics import mean_absolute_error, mean_squared_error
+
+import metrics
+
+
+def make_folds(n_folds=4, seed=0):
+    random = np.random.default_rng(seed)
+    lengths = random.integers(50, 100, n_folds)
+    y_trues = [random.uniform(0, 1, n) for n in lengths]
+    y_preds = [np.clip(y + random.normal(0, 0.2, len(y)), 0, 1) for y in y_trues]
+    y_previous = [random.uniform(0, 1, n) for n in lengths]
+    deltas = [random.uniform(0, 1e7, n) for n in lengths]
+    deltas[0][:] = 5.  # A constant delta is left unscaled by the MinMaxScaler
+    return y_trues, y_preds, y_previous, deltas
+
+
+def confidence_interval(metric, *args):
+    vals = [metric(*args_) for args_ in zip(*args)]
+    return statistics.mean(vals), 1.96 * statistics.stdev(vals)
+
+
+def test_LombEvaluation():
+    y_trues, y_preds, y_previous, deltas = make_folds()
+    evaluation = metrics.LombEvaluation.from_CV('estimator', y_trues, y_preds, y_previous, deltas)
+
+    assert evaluation.mae == pytest.approx(confidence_interval(mean_absolute_error, y_trues, y_preds))
+    assert evaluation.mse == pytest.approx(confidence_interval(mean_squared_error, y_trues, y_preds))
+    assert evaluation.wmse_tau == pytest.approx(confidence_interval(metrics.wmse_tau, y_trues, y_preds, y_previous))
+    assert evaluation.wmse_tau_delta == pytest.approx(confidence_interval(metrics.wmse_tau_delta, y_trues, y_preds, y_previous, deltas))
+    assert evaluation.wmse_delta == pytest.approx(confidence_interval(metrics.wmse_delta, y_trues, y_preds, deltas))
+
+
+def test_DuolingoEvaluation():
+    y_trues, y_preds, _, _ = make_folds()
+    evaluation = metrics.DuolingoEvaluation.from_CV('estimator', y_trues, y_preds, dataset='all')
+
+    assert evaluation.mae == pytest.approx(confidence_interval(mean_absolute_error, y_trues, y_preds))
+    assert evaluation.mmae == pytest.approx(confidence_interval(
+        lambda y_true, y_pred: metrics.mean_absolute_error_y_less_than(y_true, y_pred, 0.5), y_trues, y_preds))
+    assert evaluation.weighted_binary_accuracy == pytest.approx(confidence_interval(
+        metrics.balanced_accuracy_score_from_float, y_trues, y_preds))
+
+    # Balanced accuracy only averages over the classes present in y_true
+    y_trues[1] = np.full(len(y_trues[1]), 0.9)
+    with pytest.warns(UserWarning):
+        expected = metrics.balanced_accuracy_score_from_float(y_trues[1], y_preds[1])
+    assert metrics.fold_metrics(y_trues, y_preds)['balanced_accuracy'][1] == pytest.approx(expected)
+
+
+def test_masked_error_curve():
+    y_trues, y_preds, y_previous, _ = make_folds(n_folds=1)
+    y_true, y_pred, previous_recall_score = y_trues[0], y_preds[0], y_previous[0]
+    thresholds, mse, mae = metrics.masked_error_curve(y_true, y_pred, previous_recall_score, thresholds=1000)
+
+    assert len(thresholds) == len(mse) == len(mae) == 1000
+    for epsilon, mse_, mae_ in list(zip(thresholds, mse, mae))[::37]:
+        mask = np.abs(y_true - previous_recall_score) > epsilon
+        if mask.any():
+            assert mse_ == pytest.approx(mean_squared_error(y_true[mask], y_pred[mask]))
+            assert mae_ == pytest.approx(mean_absolute_error(y_true[mask], y_pred[mask]))
+        else:
+            assert np.isnan(mse_) and np.isnan(mae_)
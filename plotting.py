@@ -1,12 +1,20 @@
-from collections import defaultdict, namedtuple
+import hashlib
+import os
+import re
+from collections import namedtuple
+from itertools import compress
+from typing import Dict
 
 import matplotlib.pyplot as plt
 import matplotlib.lines as mlines
+from matplotlib.figure import Figure
+import numpy as np
 import pandas as pd
-from sortedcontainers import SortedKeyList
 
+import shared
 from wrangling.domain import *
 from wrangling.DatapointBuilder import DatapointBuilder
+from wrangling.validation import ValidationReport, validate_log_batch
 
 
 @dataclass
@@ -27,12 +35,159 @@ class PlotConfig:
     }
     recall_score_colour = "grey"
     interval_between_points = 12 * 60 * 60
-    add_time_after_last_timestamp = 10 * 24 * 60 * 60,
+    add_time_after_last_timestamp = 10 * 24 * 60 * 60
+    figsize = (40, 20)
 
 default_plot_config = PlotConfig()
 
 EstimatorPlotDTO = namedtuple("EstimatorPlotDTO", ["name", "color", "estimator"])
 
+SMOOTHED_RECALL_SCORE = 'Smoothed recall score'
+
+
+@dataclass
+class RetentionDensity:
+    """
+    Histograms of curves on a (days since first exposure x recall) grid,
+    one per curve name. counts[name][i, j] is the number of points of
+    that curve in day bin i and recall bin j.
+    """
+    day_edges: np.ndarray
+    recall_edges: np.ndarray
+    counts: Dict[str, np.ndarray]
+    n_items: int = 0
+    n_skipped: int = 0
+
+    @classmethod
+    def empty(cls, names, day_edges, recall_edges):
+        return cls(day_edges, recall_edges, {
+            name: np.zeros((len(day_edges) - 1, len(recall_edges) - 1), dtype=np.int64) for name in names
+        })
+
+    def add(self, name, days, recall):
+        """
+        Adds the points (days[i], recall[i]) of curve `name`. Recall is
+        clipped to the grid; points beyond the last day are ignored.
+        """
+        recall = np.clip(np.asarray(recall, dtype=float), self.recall_edges[0], self.recall_edges[-1])
+        counts, _, _ = np.histogram2d(np.asarray(days, dtype=float), recall, bins=(self.day_edges, self.recall_edges))
+        self.counts[name] += counts.astype(np.int64)
+
+    def merge(self, other):
+        for name, counts in other.counts.items():
+            self.counts[name] += counts
+        self.n_items += other.n_items
+        self.n_skipped += other.n_skipped
+        return self
+
+    def quantiles(self, name, quantiles):
+        """
+        Output: array of shape (len(quantiles), number of day bins), the
+        recall quantiles of each day bin, linearly interpolated within recall
+        bins (nan for empty day bins).
+        """
+        counts = self.counts[name]
+        totals = counts.sum(axis=1)
+        cdf = np.concatenate([np.zeros((len(counts), 1)), np.cumsum(counts, axis=1)], axis=1)
+        result = np.full((len(quantiles), len(counts)), np.nan)
+        for i, q in enumerate(quantiles):
+            for day in np.flatnonzero(totals):
+                result[i, day] = np.interp(q * totals[day], cdf[day], self.recall_edges)
+        return result
+
+
+class LogIndex:
+    """
+    Events stored as shared columns (id code, timestamp, message code),
+    sorted by id and timestamp, so that the events of an id are the offset
+    range offsets[code]:offsets[code+1]. Added batches are merged into the
+    sorted columns lazily, the first time they are read.
+    """
+
+    def __init__(self):
+        self.id_to_code = {}
+        # id and (user, lemma) of each id code
+        self.ids = []
+        self.users_lemmas = []
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.__batches = []
+        self.__offsets = np.zeros(1, dtype=np.int64)
+        self.__timestamps = np.zeros(0, dtype=np.int64)
+        self.__messages = np.zeros(0, dtype=np.uint8)
+
+    def __contains__(self, id):
+        return id in self.id_to_code
+
+    def __len__(self):
+        return len(self.id_to_code)
+
+    def add(self, log_dicts):
+        """
+        Input: valid log dictionaries (see wrangling.validation).
+        """
+        codes = []
+        for log_dict in log_dicts:
+            id = f"{log_dict['user']}_{log_dict['lemma']}"
+            code = self.id_to_code.get(id)
+            if code is None:
+                code = self.id_to_code[id] = len(self.ids)
+                self.ids.append(id)
+                self.users_lemmas.append((log_dict['user'], log_dict['lemma']))
+            codes.append(code)
+        if not codes:
+            return
+        codes = np.array(codes, dtype=np.int32)
+        timestamps = np.array([log_dict['timestamp'] for log_dict in log_dicts], dtype=np.int64)
+        messages = np.array([MESSAGE_CODES[log_dict['message']] for log_dict in log_dicts], dtype=np.uint8)
+        self.__batches.append((codes, timestamps, messages))
+
+        counts = np.bincount(codes, minlength=len(self.ids))
+        counts[:len(self.counts)] += self.counts
+        self.counts = counts
+
+    def top(self, n):
+        """
+        Output: codes of the n ids with the most events, most events first,
+        ties in the order the ids were first seen.
+        """
+        n = min(n, len(self.counts))
+        if n == 0:
+            return np.zeros(0, dtype=np.int64)
+        codes = np.argpartition(-self.counts, n - 1)[:n]
+        return codes[np.lexsort((codes, -self.counts[codes]))]
+
+    def logs(self, id):
+        """
+        Output: new Log objects for the events of id, sorted by timestamp.
+        """
+        self.__merge_batches()
+        code = self.id_to_code[id]
+        user, lemma = self.users_lemmas[code]
+        start, end = self.__offsets[code], self.__offsets[code + 1]
+        return [
+            Log(timestamp, VALID_LOG_MESSAGES[message], user, lemma)
+            for timestamp, message in zip(self.__timestamps[start:end].tolist(), self.__messages[start:end].tolist())
+        ]
+
+    def __merge_batches(self):
+        if not self.__batches:
+            return
+        # The merged columns are already sorted, so they act as one more batch
+        offsets = self.__offsets
+        merged_codes = np.repeat(np.arange(len(offsets) - 1, dtype=np.int32), np.diff(offsets))
+        codes, timestamps, messages = (
+            np.concatenate(columns)
+            for columns in zip((merged_codes, self.__timestamps, self.__messages), *self.__batches)
+        )
+        self.__batches = []
+
+        # Stable, so events with equal timestamps stay in the order they were added
+        order = np.lexsort((timestamps, codes))
+        self.__timestamps = timestamps[order]
+        self.__messages = messages[order]
+        self.__offsets = np.concatenate([[0], np.cumsum(self.counts)])
+
+
 class PlotFactory:
 
     def __init__(self,
@@ -41,29 +196,25 @@ class PlotFactory:
                  ):
         self.config = config
         self.estimators = estimators
-        self.lemmas_to_logs = defaultdict(list)
-        pass
+        self.index = LogIndex()
+        self.validation_report = ValidationReport()
 
     def add_logs(self, log_dicts):
         """
-        Adds logs to internal member data.
+        Adds the valid logs to internal member data. Why the others were
+        rejected is accumulated in self.validation_report.
         """
-        for log_dict in log_dicts:
-            try:
-                log = Log.from_dictionary(log_dict)
-                self.lemmas_to_logs[log.id()].append(log)
-            except:
-                pass
+        log_dicts = log_dicts if isinstance(log_dicts, list) else list(log_dicts)
+        report = validate_log_batch(log_dicts)
+        self.validation_report = self.validation_report.merge(report)
+        self.index.add(list(compress(log_dicts, report.keep)))
 
     def top_lemmas(self, n=100):
         """
-        Returns a list of (lemma, username, number of events) tuples
+        Returns a list of (id, number of events) tuples
         for the n lemmas with the most events.
         """
-        lemmas_lengths = SortedKeyList(key=lambda key_val: -key_val[1])
-        for key, val in self.lemmas_to_logs.items():
-            lemmas_lengths.add((key, len(val)))
-        return list(lemmas_lengths)[0:n]
+        return [(self.index.ids[code], int(self.index.counts[code])) for code in self.index.top(n)]
 
     def plot(self, id=None, fig_ax=None):
         """
@@ -72,23 +223,156 @@ class PlotFactory:
         dotted line and estimator, if available, is plotted as a solid
         line.
         """
-        try:
-            logs = self.lemmas_to_logs[id]
-            logs.sort(key=lambda log: log.timestamp)
-        except:
+        if id not in self.index:
             raise ValueError(f"No logs have been added for lemma id: {id}")
 
         if not fig_ax:
-            fig, ax = plt.subplots(figsize=(40, 20))
+            fig, ax = plt.subplots(figsize=self.config.figsize)
         else:
             fig, ax = fig_ax
+        self.__plot_logs(ax, id, self.index.logs(id))
+
+    def export_many(self, ids, directory, n_jobs=None, format='png', dpi=None):
+        """
+        Renders each id to its own image file in `directory`, with a
+        non-interactive backend, across n_jobs processes (all cores by
+        default, 1 to render in this process), e.g. to review the top lemmas:
+            factory.export_many([id for id, _ in factory.top_lemmas(n=1000)], 'plots')
+        Output: list of filenames, in the order of ids.
+        """
+        for id in ids:
+            if id not in self.index:
+                raise ValueError(f"No logs have been added for lemma id: {id}")
+        filenames = {id: _filename(id, format) for id in ids}
+        if len(set(filenames.values())) != len(filenames):
+            raise ValueError("Lemma ids map to the same filename")
+        os.makedirs(directory, exist_ok=True)
+        jobs = [
+            (id, self.index.logs(id), os.path.join(directory, filenames[id]))
+            for id in ids
+        ]
+
+        return shared.pool_map(_export, jobs, {'config': self.config, 'estimators': self.estimators, 'dpi': dpi}, n_jobs)
+
+    def _export(self, id, logs, filename, dpi=None):
+        # Figure without pyplot: no interactive backend and nothing to close
+        fig = Figure(figsize=self.config.figsize)
+        self.__plot_logs(fig.subplots(), id, logs)
+        fig.savefig(filename, dpi=dpi or 'figure')
+        return filename
+
+    def aggregate_density(self, ids=None, max_days=90, n_day_bins=90, n_recall_bins=50, batch_size=1000, n_jobs=None):
+        """
+        Bins the smoothed recall score and every estimator's predicted curve
+        of all ids (or of `ids`) onto a shared (days since first exposure x
+        recall) grid. Items are processed in batches of batch_size, with one
+        predict call per estimator and batch, across n_jobs processes (all
+        cores by default, 1 to run in this process); only the histograms
+        and a bounded number of batches are held in memory.
+        Output: RetentionDensity
+        """
+        ids = self.index.ids if ids is None else ids
+        density = RetentionDensity.empty(
+            [SMOOTHED_RECALL_SCORE] + [estimator.name for estimator in self.estimators or []],
+            np.linspace(0, max_days, n_day_bins + 1),
+            np.linspace(0, 1, n_recall_bins + 1),
+        )
+        jobs = (
+            ([(id, self.index.logs(id)) for id in ids[i:i+batch_size]], density.day_edges, density.recall_edges)
+            for i in range(0, len(ids), batch_size)
+        )
+
+        for batch_density in shared.pool_imap(_aggregate, jobs, {'config': self.config, 'estimators': self.estimators}, n_jobs):
+            density.merge(batch_density)
+        return density
+
+    def plot_density(self, density=None, quantiles=(0.1, 0.5, 0.9), filename=None, **kwargs):
+        """
+        Draws one density heatmap per curve (smoothed recall score and each
+        estimator), normalised per day bin, with the given quantile bands.
+        Input: a RetentionDensity, or the arguments of aggregate_density.
+        Output: the figure, saved to `filename` if given.
+        """
+        if density is None:
+            density = self.aggregate_density(**kwargs)
+        colors = {SMOOTHED_RECALL_SCORE: self.config.recall_score_colour}
+        colors.update({estimator.name: estimator.color for estimator in self.estimators or []})
+
+        figsize = (self.config.figsize[0], self.config.figsize[1] * len(density.counts) / 2)
+        if filename:
+            fig = Figure(figsize=figsize)
+            axes = fig.subplots(len(density.counts), 1, squeeze=False)[:, 0]
+        else:
+            fig, axes = plt.subplots(len(density.counts), 1, figsize=figsize, squeeze=False)
+            axes = axes[:, 0]
+
+        day_centres = (density.day_edges[:-1] + density.day_edges[1:]) / 2
+        for ax, (name, counts) in zip(axes, density.counts.items()):
+            totals = counts.sum(axis=1, keepdims=True)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                ax.pcolormesh(density.day_edges, density.recall_edges, (counts / totals).T, cmap='Greys', shading='flat')
+            for q, values in zip(quantiles, density.quantiles(name, quantiles)):
+                ax.plot(day_centres, values, color=colors[name], linewidth=4 if q == 0.5 else 2, linestyle='-' if q == 0.5 else '--')
+            ax.set_title(f"{name} ({density.n_items} items)", fontsize=32)
+            ax.set_xlabel("Days elapsed since first known exposure", fontsize=28)
+            ax.set_ylabel("Probability of recall", fontsize=28)
+            ax.tick_params(labelsize=24)
+
+        if filename:
+            fig.savefig(filename)
+        return fig
+
+    def _aggregate_batch(self, batch, day_edges, recall_edges):
+        """
+        Input: list of (id, logs) pairs and the bin edges.
+        Output: RetentionDensity of the batch.
+        """
+        density = RetentionDensity.empty(
+            [SMOOTHED_RECALL_SCORE] + [estimator.name for estimator in self.estimators or []], day_edges, recall_edges)
+
+        smoothed_days, smoothed_values, grid_days, grids = [], [], [], []
+        for id, logs in batch:
+            try:
+                builder = DatapointBuilder.from_log(logs[0])
+                for log in logs[1:]:
+                    builder.add_log(log)
+                timesteps, inferred_retention_rate = self.__smoothed_recall_score(builder)
+                if self.estimators:
+                    grid_timesteps, df = self.__prediction_grid(builder)
+            except Exception:
+                # Not enough data to build a datapoint
+                density.n_skipped += 1
+                continue
+            smoothed_days += timesteps
+            smoothed_values += inferred_retention_rate
+            if self.estimators:
+                grid_days += grid_timesteps
+                grids.append(df)
+            density.n_items += 1
+
+        density.add(SMOOTHED_RECALL_SCORE, smoothed_days, smoothed_values)
+        if grids:
+            df = pd.concat(grids, ignore_index=True)
+            for estimator in self.estimators:
+                density.add(estimator.name, grid_days, np.asarray(estimator.estimator.predict(df, df['delta'])))
+        return density
+
+    def __plot_logs(self, ax, id, logs):
+        """
+        Input: the logs of id, sorted by timestamp. The builder and the
+        resampled grid are computed once per id and shared by all estimators.
+        """
+        builder = DatapointBuilder.from_log(logs[0])
+        for log in logs[1:]:
+            builder.add_log(log)
 
         self.__set_text_and_axes(ax, id)
         self.__plot_scatter(ax, logs)
-        self.__plot_smoothed_recall_score(ax, logs)
+        self.__plot_smoothed_recall_score(ax, builder)
         if self.estimators:
+            timesteps, df = self.__prediction_grid(builder)
             for estimator in self.estimators:
-                self.__plot_predicted_retention_rate(ax, logs, estimator.estimator, estimator.color)
+                self.__plot_predicted_retention_rate(ax, timesteps, df, estimator.estimator, estimator.color)
 
     def __set_text_and_axes(self, ax, id):
         """
@@ -112,7 +396,7 @@ class PlotFactory:
             labels += [estimator.name for estimator in self.estimators]
             handles += [mlines.Line2D([],[],color=estimator.color) for estimator in self.estimators]
 
-        labels += ['Smoothed recall score']
+        labels += [SMOOTHED_RECALL_SCORE]
         handles += [mlines.Line2D([],[],linewidth=6, color=self.config.recall_score_colour, linestyle=(0, (1, 2))) ]
 
         labels += self.config.message_to_color.keys()
@@ -131,30 +415,34 @@ class PlotFactory:
 
         ax.scatter(timestamps, heights, c=colours, alpha=0.3, s=400)
 
-    def __plot_smoothed_recall_score(self, ax, logs):
-        builder = DatapointBuilder.from_log(logs[0])
-        for log in logs[1:]:
-            builder.add_log(log)
+    def __plot_smoothed_recall_score(self, ax, builder):
+        timesteps, inferred_retention_rate = self.__smoothed_recall_score(builder)
+        ax.plot(timesteps, inferred_retention_rate, linewidth=6, color=self.config.recall_score_colour, linestyle=(0, (1, 6)))
 
+
+    def __smoothed_recall_score(self, builder):
+        """
+        Output: timesteps (in days) and inferred retention rate.
+        """
         sample_period = 24 * 60 * 60
         _, inferred_retention_rate = builder.infer_retention_rate(sample_period=sample_period)
         timesteps = [(i + 1) for i in range(0, len(inferred_retention_rate))]
+        return timesteps, inferred_retention_rate
 
-        ax.plot(timesteps, inferred_retention_rate, linewidth=6, color=self.config.recall_score_colour, linestyle=(0, (1, 6)))
-
-
-    def __plot_predicted_retention_rate(self, ax, logs, estimator, color):
-        # Create datapoints
-        builder = DatapointBuilder.from_log(logs[0])
-        for log in logs[1:]:
-            builder.add_log(log)
+    def __prediction_grid(self, builder):
+        """
+        Output: timesteps (in days) and DataFrame of the datapoints to predict.
+        """
         datapoints = builder.view_all_data_sequence_for_plotting(
             interval_between_points=self.config.interval_between_points,
             add_time_after_last_timestamp=self.config.add_time_after_last_timestamp
         )
-        df = pd.DataFrame(datapoints)
+        # Same columns as util.split_features_and_targets
+        df = pd.DataFrame(datapoints).drop(columns=['user', 'timestamp'], errors='ignore')
         timesteps = [(datapoints[0]["FIRST_EXPOSURE_seconds"] + i * self.config.interval_between_points)/(24*60*60) for i in range(0, len(datapoints))]
+        return timesteps, df
 
+    def __plot_predicted_retention_rate(self, ax, timesteps, df, estimator, color):
         # Get y from the estimator
         predicted_retention_rate = estimator.predict(df, df['delta'])
 
@@ -168,3 +456,28 @@ class PlotFactory:
             self.plot(ids[i], (fig, row))
 
         plt.show()
+
+
+def _worker_factory():
+    # Plot factory shared by all jobs of a worker process, made by its first job
+    state = shared.worker_state()
+    if 'factory' not in state:
+        state['factory'] = PlotFactory(state['config'], state['estimators'])
+    return state['factory']
+
+
+def _export(job):
+    id, logs, filename = job
+    return _worker_factory()._export(id, logs, filename, shared.worker_state()['dpi'])
+
+
+def _aggregate(job):
+    return _worker_factory()._aggregate_batch(*job)
+
+
+def _filename(id, format):
+    # Ids which had to be changed get a hash of the original, so that e.g. "a b" and "a_b" don't collide
+    name = re.sub(r'[^\w.-]', '_', id)
+    if name != id:
+        name += '-' + hashlib.sha1(id.encode()).hexdigest()[:8]
+    return name + '.' + format
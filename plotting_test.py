@@ -0,0 +1,93 @@
+import os
+from collections import defaultdict
+
+import numpy as np
+
+import plotting
+from estimators.mtr import SWPMTREstimator
+from plotting import EstimatorPlotDTO, PlotFactory, RetentionDensity, SMOOTHED_RECALL_SCORE, default_plot_config
+from synthetic_test import make_logs
+from util import split_features_and_targets
+from wrangling.DatasetFactory import DatasetFactory
+
+
+def make_factory():
+    # Only the messages the scatter plot has colours for
+    message_rates = {message: 1. for message in default_plot_config.message_to_color}
+    logs = make_logs(1000, n_lemmas=50, message_rates=message_rates)
+
+    dataset_factory = DatasetFactory()
+    dataset_factory.add_logs(logs)
+    X, y, _ = split_features_and_targets(dataset_factory.create_dataframe_with_all_data_sequence())
+    estimator = SWPMTREstimator()
+    estimator.fit(X, y, X['delta'])
+
+    factory = PlotFactory(estimators=[EstimatorPlotDTO('SWP', 'black', estimator)])
+    factory.add_logs(logs)
+    return factory
+
+
+def test_export_many_writes_one_file_per_id(tmp_path):
+    factory = make_factory()
+    ids = [id for id, _ in factory.top_lemmas(n=4)]
+
+    serial = factory.export_many(ids[:2], tmp_path / 'serial', n_jobs=1, dpi=10)
+    parallel = factory.export_many(ids, tmp_path / 'parallel', n_jobs=2, dpi=10)
+
+    assert [os.path.basename(filename) for filename in serial] == [id + '.png' for id in ids[:2]]
+    assert len(parallel) == 4
+    for filename in serial + parallel:
+        assert os.path.getsize(filename) > 0
+
+
+def test_filenames_are_unique():
+    assert plotting._filename('user_lemma', 'png') == 'user_lemma.png'
+    names = {plotting._filename(id, 'png') for id in ['a b', 'a_b', 'a/b', 'a?b']}
+    assert len(names) == 4
+
+
+def test_index_matches_per_id_lists():
+    logs = make_logs()
+    np.random.default_rng(0).shuffle(logs)
+    factory = PlotFactory()
+    factory.add_logs(logs[:1000])
+    factory.top_lemmas()
+    factory.add_logs(logs[1000:])
+
+    expected = defaultdict(list)
+    for log in logs:
+        expected[f"{log['user']}_{log['lemma']}"].append((log['timestamp'], log['message']))
+    for id, events in expected.items():
+        assert [(log.timestamp, log.message) for log in factory.index.logs(id)] == sorted(events, key=lambda event: event[0])
+
+    top = factory.top_lemmas(n=10)
+    assert [count for _, count in top] == sorted((len(events) for events in expected.values()), reverse=True)[:10]
+    assert all(len(expected[id]) == count for id, count in top)
+
+
+def test_aggregate_density_is_the_same_in_parallel(tmp_path):
+    factory = make_factory()
+    serial = factory.aggregate_density(max_days=60, n_day_bins=30, n_recall_bins=20, batch_size=7, n_jobs=1)
+    parallel = factory.aggregate_density(max_days=60, n_day_bins=30, n_recall_bins=20, batch_size=7, n_jobs=2)
+
+    assert serial.n_items + serial.n_skipped == len(factory.index)
+    assert set(serial.counts) == {SMOOTHED_RECALL_SCORE, 'SWP'}
+    for name, counts in serial.counts.items():
+        assert counts.sum() > 0
+        np.testing.assert_array_equal(counts, parallel.counts[name])
+
+    low, median, high = serial.quantiles(SMOOTHED_RECALL_SCORE, [0.1, 0.5, 0.9])
+    present = ~np.isnan(median)
+    assert present.any()
+    assert np.all((low[present] <= median[present]) & (median[present] <= high[present]))
+
+    filename = tmp_path / 'density.png'
+    factory.plot_density(serial, filename=filename)
+    assert os.path.getsize(filename) > 0
+
+
+def test_density_quantiles_match_the_data():
+    density = RetentionDensity.empty(['curve'], np.array([0., 1.]), np.linspace(0, 1, 101))
+    recall = np.random.default_rng(0).uniform(size=10000)
+    density.add('curve', np.full(len(recall), 0.5), recall)
+    np.testing.assert_allclose(density.quantiles('curve', [0.25, 0.5])[:, 0], np.quantile(recall, [0.25, 0.5]), atol=0.01)
@@ -0,0 +1,253 @@
+"""
+Hyperparameter search over featurization parameters and functional forms.
+
+A trial is a (Featurization, estimator name) pair. Trials are evaluated
+with successive halving: every trial is cross-validated on a small random
+subsample of the rows, the best 1/eta of them move on to a subsample eta
+times larger, and so on until the survivors are evaluated on all rows.
+
+Featurized datasets are cached by featurization, so every estimator and
+every rung reuses them. NEVER can't be remapped on a built dataset (elapsed
+times saturate at NEVER and some base cases compare with it), so every
+never value is featurized again, through DatasetConfiguration.never.
+Within a featurization, all trials and folds run in parallel on
+cross_validation's process pool.
+
+Usage:
+    cache = DatasetCache(util.load_logs())
+    rungs = successive_halving(make_trials(featurization_grid(alpha=[0.3, 0.5, 0.7])), cache)
+    results_to_dataframe(rungs)
+"""
+import hashlib
+import itertools
+import math
+import os
+import pickle
+from dataclasses import asdict, dataclass, replace
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from config import NEVER, OUTLIERS_COEFFICIENT
+from cross_validation import cross_validate
+from estimators import mtr
+from types_ import DatasetConfiguration
+from util import split_features_and_targets
+from wrangling.DatapointBuilder import DatapointBuilder
+from wrangling.DatasetFactory import DatasetFactory
+
+
+@dataclass(frozen=True)
+class Featurization:
+    sample_period: int = 24 * 60 * 60
+    alpha: float = 0.5
+    outliers_coefficient: float = OUTLIERS_COEFFICIENT
+    never: int = NEVER
+
+    def dataset_key(self):
+        """
+        Output: the parameters the featurized dataset depends on.
+        """
+        return self.sample_period, self.alpha, self.outliers_coefficient, self.never
+
+
+@dataclass(frozen=True)
+class Trial:
+    featurization: Featurization
+    estimator_name: str
+
+
+@dataclass
+class TrialResult:
+    trial: Trial
+    rung: int
+    fraction: float
+    n_rows: int
+    score: float
+    evaluation: metrics.LombEvaluation
+
+
+def estimator_choices(estimator_constructors=mtr.all_estimators):
+    """
+    Output: dictionary of estimator name to constructor. Estimators which
+    keep delta in X are suffixed with '+delta', as in benchmark.py.
+    """
+    choices = {}
+    for estimator_constructor in estimator_constructors:
+        estimator = estimator_constructor()
+        choices[estimator.get_name() + ('' if estimator.drop_delta_in_X else '+delta')] = estimator_constructor
+    return choices
+
+
+def featurization_grid(sample_period=(24 * 60 * 60,), alpha=(0.5,), outliers_coefficient=(OUTLIERS_COEFFICIENT,), never=(NEVER,)):
+    """
+    Output: list of every combination of the given parameter values.
+    """
+    return [
+        Featurization(*values)
+        for values in itertools.product(sample_period, alpha, outliers_coefficient, never)
+    ]
+
+
+def make_trials(featurizations, estimator_names=None):
+    """
+    Output: list of trials, every featurization with every estimator (all
+    of estimator_choices() by default).
+    """
+    estimator_names = list(estimator_choices()) if estimator_names is None else estimator_names
+    return [Trial(featurization, name) for featurization in featurizations for name in estimator_names]
+
+
+class DatasetCache:
+    """
+    Featurized datasets by Featurization.dataset_key(), kept in memory and,
+    when `directory` is given, pickled there under the logs_fingerprint of
+    the logs.
+    """
+
+    def __init__(self, logs, config=DatasetConfiguration(), directory=None):
+        logs = list(logs)
+        self.config = config
+        self.directory = directory
+        self.fingerprint = logs_fingerprint(logs)
+        self.factory = DatasetFactory(builder_constructor=DatapointBuilder, config=config)
+        self.factory.add_logs(logs)
+        self.datasets = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, featurization):
+        """
+        Output: X, y, previous_recall_score for the featurization.
+        """
+        df = self.__dataframe(featurization.dataset_key())
+        return split_features_and_targets(df)
+
+    def __dataframe(self, key):
+        if key in self.datasets:
+            self.hits += 1
+            return self.datasets[key]
+
+        filename = None
+        if self.directory is not None:
+            filename = os.path.join(self.directory, 'dataset_{}_{}_{}_{}_{}.pkl'.format(self.fingerprint, *key))
+            if os.path.exists(filename):
+                self.hits += 1
+                self.datasets[key] = pd.read_pickle(filename)
+                return self.datasets[key]
+
+        self.misses += 1
+        sample_period, alpha, outliers_coefficient, never = key
+        # The factory keeps its builders across configurations (see DatasetFactory.cache)
+        factory_config = self.factory.config
+        self.factory.config = replace(self.config, sample_period=sample_period, alpha=alpha,
+                                      outliers_coefficient=outliers_coefficient, never=never)
+        try:
+            df = self.factory.create_dataframe_with_all_data_sequence()
+        finally:
+            self.factory.config = factory_config
+        if filename is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            df.to_pickle(filename, protocol=pickle.HIGHEST_PROTOCOL)
+        self.datasets[key] = df
+        return df
+
+
+def logs_fingerprint(logs):
+    """
+    Input: log dictionaries.
+    Output: the number of logs and a hash of their ids and timestamps, which
+    tells cached datasets of different logs apart.
+    """
+    digest = hashlib.sha1()
+    for log in logs:
+        digest.update(f"{log['user']}_{log['lemma']}:{log['timestamp']};".encode())
+    return f'{len(logs)}-{digest.hexdigest()[:16]}'
+
+
+def successive_halving(trials, cache, eta=3, min_fraction=None, metric='mse', folds=5, seeds=(100,),
+                       estimator_constructors=None, n_jobs=None, seed=0) -> List[List[TrialResult]]:
+    """
+    Input: list of trials, a DatasetCache, the halving rate eta, the fraction
+    of rows of the first rung (by default, small enough for one trial to
+    reach all rows), the LombEvaluation metric to minimise, the CV folds
+    and seeds, the estimator constructors by name (estimator_choices() by
+    default), the number of worker processes (all cores by default) and
+    the seed of the row subsamples.
+    Output: one list of TrialResult per rung, best first.
+    """
+    estimator_constructors = estimator_choices() if estimator_constructors is None else estimator_constructors
+    if min_fraction is None:
+        n_rungs = max(1, math.ceil(math.log(max(len(trials), 1), eta)) + 1)
+        min_fraction = float(eta) ** -(n_rungs - 1)
+
+    rungs = []
+    remaining = list(trials)
+    fraction = min_fraction
+    while remaining:
+        results = evaluate(remaining, cache, fraction, metric, folds, seeds, estimator_constructors, n_jobs, seed)
+        for result in results:
+            result.rung = len(rungs)
+        results.sort(key=lambda result: result.score)
+        rungs.append(results)
+        if fraction >= 1 or len(results) == 1:
+            break
+        remaining = [result.trial for result in results[:max(1, math.ceil(len(results) / eta))]]
+        fraction = min(1., fraction * eta)
+    return rungs
+
+
+def evaluate(trials, cache, fraction=1., metric='mse', folds=5, seeds=(100,), estimator_constructors=None,
+             n_jobs=None, seed=0) -> List[TrialResult]:
+    """
+    Cross-validates each trial on `fraction` of the rows. Subsamples are
+    nested: a larger fraction contains the rows of every smaller one.
+    Output: one TrialResult per trial, in the order of trials.
+    """
+    estimator_constructors = estimator_choices() if estimator_constructors is None else estimator_constructors
+    by_featurization = {}
+    for trial in trials:
+        by_featurization.setdefault(trial.featurization, []).append(trial)
+
+    results = {}
+    for featurization, featurization_trials in by_featurization.items():
+        X, y, previous_recall_score = cache.get(featurization)
+        n_rows = max(folds, math.ceil(fraction * len(X)))
+        index = np.sort(np.random.default_rng(seed).permutation(len(X))[:n_rows])
+        X, y, previous_recall_score = X.iloc[index], y.iloc[index], previous_recall_score.iloc[index]
+
+        cv_results = cross_validate(X, y, X['delta'],
+                                    [estimator_constructors[trial.estimator_name] for trial in featurization_trials],
+                                    folds, seeds, previous_recall_score=previous_recall_score, n_jobs=n_jobs)
+        for trial, cv_result in zip(featurization_trials, cv_results):
+            evaluation = cv_result.to_lomb_evaluation()
+            results[trial] = TrialResult(trial, 0, fraction, len(index), getattr(evaluation, metric)[0], evaluation)
+    return [results[trial] for trial in trials]
+
+
+def results_to_dataframe(rungs):
+    """
+    Output: DataFrame with one row per trial and rung: featurization
+    parameters, estimator, rung, fraction, number of rows, score and the
+    mean of each LombEvaluation metric.
+    """
+    rows = []
+    for results in rungs:
+        for result in results:
+            evaluation = result.evaluation
+            rows.append({
+                **asdict(result.trial.featurization),
+                'estimator': result.trial.estimator_name,
+                'rung': result.rung,
+                'fraction': result.fraction,
+                'n_rows': result.n_rows,
+                'score': result.score,
+                **{
+                    name: getattr(evaluation, name)[0]
+                    for name in ['mae', 'mse', 'wmse_tau', 'wmse_delta', 'wmse_tau_delta']
+                    if getattr(evaluation, name) is not None
+                },
+            })
+    return pd.DataFrame(rows)
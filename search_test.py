@@ -0,0 +1,62 @@
+import numpy as np
+
+from config import NEVER
+from search import *
+from synthetic_test import make_logs
+from wrangling.Datapoint import NEVER_COLUMNS
+
+
+def make_cache():
+    return DatasetCache(make_logs())
+
+
+def test_successive_halving_reuses_cached_datasets():
+    cache = make_cache()
+    estimator_constructors = estimator_choices(mtr.all_estimators[:2])
+    trials = make_trials(featurization_grid(alpha=[0.3, 0.5], never=[NEVER, 2 * NEVER]), list(estimator_constructors))
+    rungs = successive_halving(trials, cache, folds=3, estimator_constructors=estimator_constructors, n_jobs=1)
+
+    assert [len(results) for results in rungs] == [8, 3, 1]
+    assert [results[0].fraction for results in rungs] == [1 / 9, 1 / 3, 1.]
+    # One dataset per featurization, reused by the estimators and rungs
+    assert cache.misses == 4
+    for results in rungs:
+        scores = [result.score for result in results]
+        assert scores == sorted(scores)
+    assert rungs[1][0].trial in [result.trial for result in rungs[0][:3]]
+
+    df = results_to_dataframe(rungs)
+    assert len(df) == 12
+    assert {'alpha', 'never', 'estimator', 'rung', 'mse', 'wmse_tau'} <= set(df.columns)
+
+
+def test_datasets_with_another_never_are_featurized_again():
+    cache = make_cache()
+    X, _, _ = cache.get(Featurization())
+
+    for never in [NEVER // 20, NEVER // 5]:
+        X_never, _, _ = cache.get(Featurization(never=never))
+        for column in NEVER_COLUMNS:
+            assert not (X_never[column] == NEVER).any()
+        assert (X_never[NEVER_COLUMNS] == never).any().any()
+        # Not the same as replacing NEVER: elapsed times saturate at NEVER and base cases compare with it
+        remapped = X.mask(X == NEVER, never)
+        assert not X_never[remapped.columns].equals(remapped)
+    # The shared factory is left with its own configuration
+    assert cache.factory.config == cache.config
+
+
+def test_cached_files_are_named_after_the_logs(tmp_path):
+    logs = make_logs()
+    DatasetCache(logs, directory=tmp_path).get(Featurization())
+
+    cache = DatasetCache(logs, directory=tmp_path)
+    cache.get(Featurization())
+    assert (cache.hits, cache.misses) == (1, 0)
+
+    other_logs = make_logs()[:-1]
+    other_cache = DatasetCache(other_logs, directory=tmp_path)
+    other_cache.get(Featurization())
+    assert (other_cache.hits, other_cache.misses) == (0, 1)
+    assert other_cache.fingerprint != cache.fingerprint
+    assert len(list(tmp_path.iterdir())) == 2
@@ -0,0 +1,258 @@
+"""
+Shared, memory-mapped feature matrices for process pools.
+
+publish writes a DataFrame, Series or array once, column by column, as .npy
+files in a directory in shared memory (/dev/shm when it has room, the
+temporary directory otherwise) and returns a small picklable SharedHandle.
+Workers attach to it and get the same object backed by read-only memory
+maps: the pages are shared by every process instead of each worker
+unpickling its own copy.
+
+The publishing process owns the files. They are removed by release, or at
+exit for handles that were never released.
+
+    handle = shared.publish(X)
+    ...  # pass handle to the workers, which call shared.attach(handle)
+    handle.release()
+
+pool_map and pool_imap run a module level function over jobs on a process
+pool. The state the jobs share is sent to each worker once, when it starts
+(the entries named in `published` through shared memory), and read in the
+jobs with worker_state():
+
+    def _fit(job):
+        X = shared.worker_state()['X']
+        ...
+
+    estimators = shared.pool_map(_fit, jobs, {'X': X}, n_jobs, published=['X'])
+"""
+import atexit
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+SHARED_MEMORY_DIRECTORY = '/dev/shm'
+
+# Directories of the handles published by this process and not released yet.
+_published = {}
+
+
+@dataclass
+class SharedColumn:
+    name: object
+    kind: str  # 'array', 'categorical' or 'masked'
+    dtype: Optional[str] = None
+    categories: Optional[list] = None
+    ordered: bool = False
+
+
+@dataclass
+class SharedHandle:
+    directory: str
+    kind: str  # 'frame', 'series' or 'array'
+    columns: List[SharedColumn] = field(default_factory=list)
+    has_index: bool = False
+    owner_pid: int = field(default_factory=os.getpid)
+
+    def attach(self):
+        """
+        Output: the published object, backed by read-only memory maps.
+        """
+        columns = {column.name: self.__load_column(i, column) for i, column in enumerate(self.columns)}
+        index = self.__load_index() if self.has_index else None
+        if self.kind == 'array':
+            return columns[None]
+        if self.kind == 'series':
+            (name, values), = columns.items()
+            return pd.Series(values, index=index, name=name, copy=False)
+        return pd.DataFrame(columns, index=index, copy=False)
+
+    def release(self):
+        """
+        Removes the files. Only the publishing process can release a handle;
+        objects attached to it must not be used afterwards.
+        """
+        if os.getpid() != self.owner_pid:
+            return
+        _published.pop(self.directory, None)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    def __load_column(self, i, column):
+        # A plain ndarray view of the map: the same pages, without the memmap subclass
+        values = np.load(self.__path(i), mmap_mode='r').view(np.ndarray)
+        if column.kind == 'categorical':
+            return pd.Categorical.from_codes(values, categories=column.categories, ordered=column.ordered)
+        if column.kind == 'masked':
+            mask = np.load(self.__path(f'{i}_mask'), mmap_mode='r').view(np.ndarray)
+            return _masked_array(values, mask, column.dtype)
+        return values
+
+    def __load_index(self):
+        try:
+            return np.load(self.__path('index'), mmap_mode='r').view(np.ndarray)
+        except ValueError:
+            # Object indexes can't be memory mapped
+            return np.load(self.__path('index'), allow_pickle=True)
+
+    def __path(self, name):
+        return os.path.join(self.directory, f'{name}.npy')
+
+
+def publish(data, directory=None) -> SharedHandle:
+    """
+    Input: DataFrame, Series or numpy array, and optionally the parent
+    directory of the files (shared memory by default).
+    Output: SharedHandle. Object and string columns are published as categoricals.
+    """
+    if isinstance(data, pd.DataFrame):
+        kind, items = 'frame', list(data.items())
+    elif isinstance(data, pd.Series):
+        kind, items = 'series', [(data.name, data)]
+    else:
+        kind, items = 'array', [(None, np.asarray(data))]
+
+    nbytes = sum(_nbytes(values) for _, values in items)
+    handle = SharedHandle(tempfile.mkdtemp(prefix='shared-', dir=directory or _default_directory(nbytes)), kind)
+    _published[handle.directory] = handle
+    try:
+        for i, (name, values) in enumerate(items):
+            handle.columns.append(_save_column(handle.directory, i, name, values))
+        if kind != 'array' and not _is_default_index(data.index):
+            np.save(os.path.join(handle.directory, 'index.npy'), np.asarray(data.index), allow_pickle=True)
+            handle.has_index = True
+    except BaseException:
+        handle.release()
+        raise
+    return handle
+
+
+def attach(data):
+    """
+    Output: data attached if it is a SharedHandle, data itself otherwise, so
+    worker initializers can take either.
+    """
+    return data.attach() if isinstance(data, SharedHandle) else data
+
+
+def release(data):
+    if isinstance(data, SharedHandle):
+        data.release()
+
+
+# State shared by all jobs of a worker process (or of the jobs run in this process).
+_worker_state = {}
+
+
+def worker_state() -> dict:
+    return _worker_state
+
+
+def pool_map(function, jobs, state, n_jobs=None, published=()) -> list:
+    """
+    Input: module level function of one job, list of jobs, dictionary of
+    the state the jobs share, number of worker processes (all cores by
+    default, 1 to run in this process) and the names of the state entries
+    to publish to shared memory instead of pickling them for each worker.
+    Output: list of function(job), in the order of jobs.
+    """
+    n_jobs = n_jobs or os.cpu_count()
+    if n_jobs == 1 or len(jobs) <= 1:
+        _initialize_worker(state)
+        return list(map(function, jobs))
+    with _pool(state, n_jobs, published) as executor:
+        return list(executor.map(function, jobs, chunksize=max(1, len(jobs) // (4 * n_jobs))))
+
+
+def pool_imap(function, jobs, state, n_jobs=None, published=()):
+    """
+    pool_map for a stream of jobs: jobs may be any iterable and is consumed
+    lazily, with at most 2 * n_jobs jobs in flight.
+    Output: iterator of function(job), in the order of jobs.
+    """
+    n_jobs = n_jobs or os.cpu_count()
+    if n_jobs == 1:
+        _initialize_worker(state)
+        yield from map(function, jobs)
+        return
+    with _pool(state, n_jobs, published) as executor:
+        in_flight = deque()
+        for job in jobs:
+            in_flight.append(executor.submit(function, job))
+            if len(in_flight) >= 2 * n_jobs:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+@contextmanager
+def _pool(state, n_jobs, published):
+    handles = {name: publish(state[name]) for name in published}
+    try:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_initialize_worker,
+                                 initargs=({**state, **handles},)) as executor:
+            yield executor
+    finally:
+        for handle in handles.values():
+            handle.release()
+
+
+def _initialize_worker(state):
+    _worker_state.clear()
+    _worker_state.update({name: attach(value) for name, value in state.items()})
+
+
+def _save_column(directory, i, name, values):
+    path = os.path.join(directory, f'{i}.npy')
+    if isinstance(values, pd.Series) and (values.dtype == object or pd.api.types.is_string_dtype(values.dtype)):
+        values = values.astype('category')
+    dtype = getattr(values, 'dtype', None)
+    if isinstance(dtype, pd.CategoricalDtype):
+        np.save(path, np.asarray(values.cat.codes if isinstance(values, pd.Series) else values.codes))
+        return SharedColumn(name, 'categorical', categories=list(dtype.categories), ordered=bool(dtype.ordered))
+    if isinstance(values, pd.Series) and hasattr(values.array, '_mask'):
+        # Nullable integer, float and boolean columns
+        array = values.array
+        np.save(path, np.asarray(array._data))
+        np.save(os.path.join(directory, f'{i}_mask.npy'), np.asarray(array._mask))
+        return SharedColumn(name, 'masked', dtype=str(dtype))
+    np.save(path, np.asarray(values))
+    return SharedColumn(name, 'array')
+
+
+def _masked_array(values, mask, dtype):
+    array_type = pd.api.types.pandas_dtype(dtype).construct_array_type()
+    return array_type(values, mask, copy=False)
+
+
+def _nbytes(values):
+    return getattr(values, 'nbytes', 0) or np.asarray(values).nbytes
+
+
+def _is_default_index(index):
+    return isinstance(index, pd.RangeIndex) and index.start == 0 and index.step == 1
+
+
+def _default_directory(nbytes):
+    if os.path.isdir(SHARED_MEMORY_DIRECTORY) and shutil.disk_usage(SHARED_MEMORY_DIRECTORY).free > 2 * nbytes:
+        return SHARED_MEMORY_DIRECTORY
+    return None
+
+
+@atexit.register
+def _release_all():
+    for handle in list(_published.values()):
+        handle.release()
@@ -0,0 +1,59 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import shared
+
+
+def make_frame():
+    return pd.DataFrame({
+        'int': np.arange(5, dtype=np.int32),
+        'float': np.linspace(0, 1, 5),
+        'bool': [True, False, True, False, True],
+        'str': ['a', 'b', 'a', 'c', 'b'],
+        'category': pd.Categorical(['x', 'y', 'x', 'x', 'y']),
+        'nullable': pd.array([1, None, 3, None, 5], dtype='Int32'),
+    }, index=[10, 11, 12, 13, 14])
+
+
+def _sum_floats(handle):
+    return float(shared.attach(handle)['float'].sum())
+
+
+def test_publish_and_attach_round_trip():
+    df = make_frame()
+    with shared.publish(df) as handle:
+        attached = handle.attach()
+        pd.testing.assert_frame_equal(attached, df.astype({'str': 'category'}))
+        assert not attached['float'].to_numpy().flags.writeable
+
+        series = shared.publish(df['nullable']).attach()
+        pd.testing.assert_series_equal(series, df['nullable'])
+        np.testing.assert_array_equal(shared.publish(np.eye(3)).attach(), np.eye(3))
+    assert not os.path.exists(handle.directory)
+
+
+def test_workers_attach_to_the_published_data():
+    df = make_frame()
+    with shared.publish(df) as handle:
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            assert list(executor.map(_sum_floats, [handle, handle])) == [df['float'].sum()] * 2
+        # Workers can't release the publisher's files
+        assert os.path.exists(handle.directory)
+    assert shared.attach(df) is df
+
+
+def _scaled_row_sum(job):
+    state = shared.worker_state()
+    return float(state['X'].iloc[job].sum() * state['scale'])
+
+
+def test_pool_map_and_imap_share_the_state():
+    df = make_frame()[['int', 'float']]
+    state = {'X': df, 'scale': 2}
+    expected = [float(row.sum() * 2) for _, row in df.iterrows()]
+    for n_jobs in [1, 2]:
+        assert shared.pool_map(_scaled_row_sum, list(range(len(df))), state, n_jobs, published=['X']) == expected
+        assert list(shared.pool_imap(_scaled_row_sum, iter(range(len(df))), state, n_jobs)) == expected
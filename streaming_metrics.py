@@ -0,0 +1,246 @@
+"""
+Streaming, mergeable versions of the metrics in metrics.py.
+
+Each accumulator is updated from chunks of predictions and only keeps a
+handful of sums, so a model can be scored over an archive that does not fit
+in memory. Accumulators computed in different processes are combined with
+merge, and the result is the same as computing the metric over the
+concatenated chunks.
+"""
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+import shared
+from cross_validation import Y_PRED_BOUNDS
+from lib import min_max_scale
+
+
+class IMetricAccumulator(ABC):
+
+    @abstractmethod
+    def update(self, y_true, y_pred, y_previous=None, delta=None):
+        """
+        Input: one chunk of y_true, y_pred and, for the metrics that need
+        them, the previous recall score and delta.
+        Output: self
+        """
+        pass
+
+    @abstractmethod
+    def merge(self, other):
+        """
+        Adds the chunks seen by another accumulator of the same kind.
+        Output: self
+        """
+        pass
+
+    @abstractmethod
+    def result(self):
+        pass
+
+
+class MeanAbsoluteErrorAccumulator(IMetricAccumulator):
+
+    def __init__(self):
+        self.n = 0
+        self.total = 0.
+
+    def update(self, y_true, y_pred, y_previous=None, delta=None):
+        self.n += len(y_true)
+        self.total += float(np.sum(np.abs(_array(y_true) - _array(y_pred))))
+        return self
+
+    def merge(self, other):
+        self.n += other.n
+        self.total += other.total
+        return self
+
+    def result(self):
+        return self.total / self.n if self.n else float('nan')
+
+
+class MeanSquaredErrorAccumulator(MeanAbsoluteErrorAccumulator):
+
+    def update(self, y_true, y_pred, y_previous=None, delta=None):
+        self.n += len(y_true)
+        self.total += float(np.sum(np.square(_array(y_true) - _array(y_pred))))
+        return self
+
+
+class MeanAbsoluteErrorYLessThanAccumulator(MeanAbsoluteErrorAccumulator):
+    """
+    MAE over the rows where y_true < upper_bound.
+    """
+
+    def __init__(self, upper_bound=0.5):
+        super().__init__()
+        self.upper_bound = upper_bound
+
+    def update(self, y_true, y_pred, y_previous=None, delta=None):
+        y_true, y_pred = _array(y_true), _array(y_pred)
+        idx = y_true < self.upper_bound
+        return super().update(y_true[idx], y_pred[idx])
+
+
+class BalancedAccuracyAccumulator(IMetricAccumulator):
+    """
+    Balanced accuracy of y > 0.5, from a running confusion matrix.
+    """
+
+    def __init__(self):
+        # Rows: y_true negative / positive. Columns: y_pred negative / positive.
+        self.confusion_matrix = np.zeros((2, 2), dtype=np.int64)
+
+    def update(self, y_true, y_pred, y_previous=None, delta=None):
+        index = 2 * (_array(y_true) > 0.5) + (_array(y_pred) > 0.5)
+        self.confusion_matrix += np.bincount(index, minlength=4).reshape(2, 2)
+        return self
+
+    def merge(self, other):
+        self.confusion_matrix += other.confusion_matrix
+        return self
+
+    def result(self):
+        support = self.confusion_matrix.sum(axis=1)
+        present = support > 0
+        # Like sklearn, only average over the classes present in y_true
+        return float(np.mean(np.diag(self.confusion_matrix)[present] / support[present]))
+
+
+class WMSETauAccumulator(MeanAbsoluteErrorAccumulator):
+
+    def update(self, y_true, y_pred, y_previous=None, delta=None):
+        y_true = _array(y_true)
+        tau = np.abs(_array(y_previous) - y_true)
+        self.n += len(y_true)
+        self.total += float(np.sum(np.square(tau * (y_true - _array(y_pred)))))
+        return self
+
+
+class WMSEDeltaAccumulator(IMetricAccumulator):
+    """
+    wMSE-Δ, or wMSE-τΔ when `use_tau`, in a single pass.
+
+    The weights are min-max scaled deltas and the min/max are only known at
+    the end, so the accumulator keeps the running min/max and the power sums
+    Σ w e² (d - c)^k for k = 0, 1, 2, with w = τ² or 1 and c a shift fixed by
+    the first chunk to keep the sums small. Expanding the square of
+    (d - min) = (d - c) - (min - c) then gives the exact metric for the
+    final min/max, without a second pass over the data.
+    """
+
+    def __init__(self, use_tau=False):
+        self.use_tau = use_tau
+        self.n = 0
+        self.shift = None
+        self.delta_min = np.inf
+        self.delta_max = -np.inf
+        self.power_sums = np.zeros(3)
+
+    def update(self, y_true, y_pred, y_previous=None, delta=None):
+        y_true, delta = _array(y_true), _array(delta)
+        if not len(y_true):
+            return self
+        weight = np.square(y_true - _array(y_pred))
+        if self.use_tau:
+            weight *= np.square(_array(y_previous) - y_true)
+        if self.shift is None:
+            self.shift = float(delta.min())
+
+        shifted = delta - self.shift
+        self.power_sums += [np.sum(weight), np.sum(weight * shifted), np.sum(weight * np.square(shifted))]
+        self.n += len(y_true)
+        self.delta_min = min(self.delta_min, float(delta.min()))
+        self.delta_max = max(self.delta_max, float(delta.max()))
+        return self
+
+    def merge(self, other):
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.shift = other.shift
+        s0, s1, s2 = other.power_sums
+        a = other.shift - self.shift
+        self.power_sums += [s0, s1 + a * s0, s2 + 2 * a * s1 + a * a * s0]
+        self.n += other.n
+        self.delta_min = min(self.delta_min, other.delta_min)
+        self.delta_max = max(self.delta_max, other.delta_max)
+        return self
+
+    def result(self):
+        if not self.n:
+            return float('nan')
+        s0, s1, s2 = self.power_sums
+        k = self.delta_min - self.shift
+        scale = min_max_scale(np.array([self.delta_min]), np.array([self.delta_max]))[0]
+        return float(scale * scale * max(s2 - 2 * k * s1 + k * k * s0, 0.) / self.n)
+
+
+class EvaluationAccumulator(IMetricAccumulator):
+    """
+    Every metric of LombEvaluation and DuolingoEvaluation at once. The keys
+    of result() match metrics.fold_metrics. The tau and delta weighted metrics
+    are only reported when y_previous / delta were given.
+    """
+
+    def __init__(self):
+        self.accumulators = {
+            'mae': MeanAbsoluteErrorAccumulator(),
+            'mse': MeanSquaredErrorAccumulator(),
+            'mmae': MeanAbsoluteErrorYLessThanAccumulator(0.5),
+            'balanced_accuracy': BalancedAccuracyAccumulator(),
+            'wmse_tau': WMSETauAccumulator(),
+            'wmse_delta': WMSEDeltaAccumulator(),
+            'wmse_tau_delta': WMSEDeltaAccumulator(use_tau=True),
+        }
+        self.updated = set()
+
+    def update(self, y_true, y_pred, y_previous=None, delta=None):
+        for name, accumulator in self.accumulators.items():
+            if name in ['wmse_tau', 'wmse_tau_delta'] and y_previous is None:
+                continue
+            if name in ['wmse_delta', 'wmse_tau_delta'] and delta is None:
+                continue
+            accumulator.update(y_true, y_pred, y_previous, delta)
+            self.updated.add(name)
+        return self
+
+    def merge(self, other):
+        for name, accumulator in self.accumulators.items():
+            accumulator.merge(other.accumulators[name])
+        self.updated |= other.updated
+        return self
+
+    def result(self):
+        return {
+            name: accumulator.result()
+            for name, accumulator in self.accumulators.items()
+            if name in self.updated
+        }
+
+
+def score_chunks(estimator, chunks, n_jobs=None):
+    """
+    Scores a fitted estimator over a stream of chunks in constant memory.
+    Input: the estimator, an iterable of (X, y, delta) or
+    (X, y, delta, previous_recall_score) chunks, and the number of worker
+    processes (all cores by default).
+    Output: dictionary of metric name to value, see EvaluationAccumulator.
+    Only a bounded number of chunks is in flight at any time.
+    """
+    total = EvaluationAccumulator()
+    for accumulator in shared.pool_imap(_score_chunk, chunks, {'estimator': estimator}, n_jobs):
+        total.merge(accumulator)
+    return total.result()
+
+
+def _array(x):
+    return np.asarray(x, dtype=float).reshape(-1)
+
+
+def _score_chunk(chunk):
+    X, y, delta, *previous_recall_score = chunk
+    y_pred = np.clip(shared.worker_state()['estimator'].predict(X, delta), *Y_PRED_BOUNDS)
+    y_previous = previous_recall_score[0] if previous_recall_score else None
+    return EvaluationAccumulator().update(y, y_pred, y_previous, delta)
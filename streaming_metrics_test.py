@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+import metrics
+import streaming_metrics
+from estimators import mtr
+from estimators.mtr_test import make_dataset
+from metrics_test import make_folds
+
+
+def test_EvaluationAccumulator():
+    y_trues, y_preds, y_previous, deltas = make_folds(n_folds=5)
+    expected = metrics.fold_metrics([np.concatenate(y_trues)], [np.concatenate(y_preds)],
+                                    [np.concatenate(y_previous)], [np.concatenate(deltas)])
+
+    # Accumulate the chunks in two "workers" and merge them
+    workers = [streaming_metrics.EvaluationAccumulator(), streaming_metrics.EvaluationAccumulator()]
+    for i, chunk in enumerate(zip(y_trues, y_preds, y_previous, deltas)):
+        workers[i % 2].update(*chunk)
+    result = workers[1].merge(workers[0]).result()
+
+    assert set(result) == set(expected)
+    for name, value in result.items():
+        assert value == pytest.approx(expected[name][0]), name
+
+
+def test_score_chunks():
+    X, y, delta = make_dataset(n=1000)
+    estimator = mtr.SWPMTREstimator()
+    estimator.fit(X, y, delta)
+    y_pred = np.clip(estimator.predict(X, delta), *streaming_metrics.Y_PRED_BOUNDS)
+    expected = metrics.fold_metrics([y], [y_pred], deltas=[delta])
+
+    chunks = ((X.iloc[i:i+100], y.iloc[i:i+100], delta.iloc[i:i+100]) for i in range(0, len(X), 100))
+    result = streaming_metrics.score_chunks(estimator, chunks, n_jobs=2)
+
+    assert set(result) == {'mae', 'mse', 'mmae', 'balanced_accuracy', 'wmse_delta'}
+    for name, value in result.items():
+        assert value == pytest.approx(expected[name][0]), name
@@ -0,0 +1,263 @@
+"""
+Synthetic learner logs for load testing and profiling.
+
+Produces event streams with the same schema as the real logs (user, lemma,
+timestamp, message) for N users × M lemmas. Forgetting follows any
+IMemoryTraceFunctionalForm: every item has a half-life which doubles (by
+`growth`) after each successful recall and shrinks (by `lapse`) after each
+failure, and the probability of recalling it after delta seconds is
+calculate_retention_rate(calculate_mu(0.5, half_life), delta).
+
+Revision and reading events are outcomes of that model (REVISION__NOT_CLICKED
+and TEXT__SENTENCE_READ when recalled, REVISION__CLICKED and
+TEXT__WORD_HIGHLIGHTED when not); every other message type is mixed in at
+its configured rate. Users are generated one at a time from their own
+seeded random stream, so the output is deterministic per seed and only one
+user's events are ever held in memory.
+"""
+import json
+import os
+import pickle
+from dataclasses import dataclass, field
+from typing import Dict, Type
+
+import numpy as np
+
+from estimators.mtr import IMemoryTraceFunctionalForm, SimplifiedWickelgren
+from wrangling.domain import *
+
+REVISION = 'REVISION'
+READING = 'READING'
+
+DEFAULT_MESSAGE_RATES = {
+    TEXT__WORD_HIGHLIGHTED: 0.15,
+    TEXT__SENTENCE_CLICK: 0.1,
+    TEXT__SENTENCE_READ: 0.25,
+    REVISION__CLICKED: 0.15,
+    REVISION__NOT_CLICKED: 0.25,
+    VIDEO__TRANSLATION_WAS_REVEALED: 0.025,
+    VIDEO__WAS_SEEN: 0.025,
+    BOOK_DRILL_SCROLL: 0.025,
+    BOOK_DRILL_CLICK: 0.025,
+}
+
+
+@dataclass
+class SyntheticLogConfiguration:
+    n_users: int = 10
+    n_lemmas: int = 1000
+    seed: int = 0
+    functional_form: Type[IMemoryTraceFunctionalForm] = SimplifiedWickelgren
+    # Relative rates of each message type. The revision and reading rates
+    # are pooled; which message of the pair is logged depends on recall.
+    message_rates: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_MESSAGE_RATES))
+    mean_events_per_item: float = 20.
+    mean_seconds_between_events: float = 2 * 24 * 60 * 60
+    start_timestamp: int = 1_600_000_000
+    first_exposure_window_seconds: int = 90 * 24 * 60 * 60
+    initial_half_life_seconds: float = 24 * 60 * 60
+    growth: float = 2.
+    lapse: float = 0.5
+
+
+class SyntheticLogGenerator:
+
+    def __init__(self, config=SyntheticLogConfiguration()):
+        self.config = config
+        unknown = set(config.message_rates) - set(VALID_LOG_MESSAGES)
+        if unknown:
+            raise ValueError(f'{sorted(unknown)} are not valid log messages.')
+
+        rates = config.message_rates
+        kinds = {
+            REVISION: rates.get(REVISION__CLICKED, 0) + rates.get(REVISION__NOT_CLICKED, 0),
+            READING: rates.get(TEXT__WORD_HIGHLIGHTED, 0) + rates.get(TEXT__SENTENCE_READ, 0),
+        }
+        for message, rate in rates.items():
+            if message not in [REVISION__CLICKED, REVISION__NOT_CLICKED, TEXT__WORD_HIGHLIGHTED, TEXT__SENTENCE_READ]:
+                kinds[message] = rate
+        self.kinds = [kind for kind, rate in kinds.items() if rate > 0]
+        total = sum(kinds[kind] for kind in self.kinds)
+        self.kind_probabilities = np.array([kinds[kind] / total for kind in self.kinds])
+
+    @classmethod
+    def for_events(cls, n_events, seed=0, n_lemmas=200, **kwargs):
+        """
+        Output: a generator sized to produce roughly n_events events.
+        """
+        mean_events_per_item = kwargs.get('mean_events_per_item', SyntheticLogConfiguration.mean_events_per_item)
+        n_users = max(1, int(np.ceil(n_events / (n_lemmas * mean_events_per_item))))
+        n_lemmas = min(n_lemmas, max(1, int(np.ceil(n_events / mean_events_per_item))))
+        return cls(SyntheticLogConfiguration(n_users=n_users, n_lemmas=n_lemmas, seed=seed, **kwargs))
+
+    def iter_user_columns(self):
+        """
+        Yields, for one user at a time, a dictionary of equally long arrays:
+        user (index), lemma (index), timestamp and message (index into
+        VALID_LOG_MESSAGES), sorted by timestamp, and p_recall (the ground
+        truth probability of recall at the event, nan for events which do
+        not test recall).
+        """
+        for user in range(self.config.n_users):
+            yield self.__generate_user(user)
+
+    def iter_chunks(self, chunk_size=100000, ground_truth=False):
+        """
+        Yields lists of at most chunk_size log dictionaries.
+        """
+        chunk = []
+        for columns in self.iter_user_columns():
+            logs = self.__to_dictionaries(columns, ground_truth)
+            # Complete the pending chunk, then slice whole chunks from the user's logs
+            start = 0
+            while len(chunk) + len(logs) - start >= chunk_size:
+                end = start + chunk_size - len(chunk)
+                yield chunk + logs[start:end]
+                chunk, start = [], end
+            chunk += logs[start:]
+        if chunk:
+            yield chunk
+
+    def iter_logs(self, ground_truth=False):
+        for chunk in self.iter_chunks(ground_truth=ground_truth):
+            yield from chunk
+
+    def write_pickle(self, filename, chunk_size=100000):
+        """
+        Writes one pickled list per chunk to the same file, which util.load_logs
+        reads back as a single list (or iter_pickle_chunks chunk by chunk).
+        """
+        with open(filename, 'wb') as file:
+            for chunk in self.iter_chunks(chunk_size):
+                pickle.dump(chunk, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def write_jsonl(self, filename, chunk_size=100000):
+        with open(filename, 'w') as file:
+            for chunk in self.iter_chunks(chunk_size):
+                file.writelines(json.dumps(log) + '\n' for log in chunk)
+
+    def write_columnar(self, directory):
+        """
+        Writes one raw little-endian file per column (see read_columnar) and a
+        metadata.json describing the columns and how to decode them.
+        """
+        os.makedirs(directory, exist_ok=True)
+        files = {name: open(os.path.join(directory, name + '.bin'), 'wb') for name in COLUMNAR_DTYPES}
+        n_events = 0
+        try:
+            for columns in self.iter_user_columns():
+                for name, dtype in COLUMNAR_DTYPES.items():
+                    files[name].write(columns[name].astype(dtype).tobytes())
+                n_events += len(columns['timestamp'])
+        finally:
+            for file in files.values():
+                file.close()
+        with open(os.path.join(directory, 'metadata.json'), 'w') as file:
+            json.dump({
+                'n_events': n_events,
+                'dtypes': COLUMNAR_DTYPES,
+                'messages': VALID_LOG_MESSAGES,
+                'user_format': USER_FORMAT,
+                'lemma_format': LEMMA_FORMAT,
+            }, file)
+
+    def __generate_user(self, user):
+        config = self.config
+        random = np.random.default_rng([config.seed, user])
+        form = config.functional_form
+        n_lemmas = config.n_lemmas
+
+        n_events = 1 + random.poisson(config.mean_events_per_item - 1, n_lemmas)
+        timestamp = config.start_timestamp + random.uniform(0, config.first_exposure_window_seconds, n_lemmas)
+        last_exposure = timestamp.copy()
+        half_life = np.full(n_lemmas, float(config.initial_half_life_seconds))
+
+        steps = []
+        for step in range(n_events.max()):
+            active = np.flatnonzero(step < n_events)
+            if step:
+                timestamp[active] += random.exponential(config.mean_seconds_between_events, len(active))
+            kinds = random.choice(len(self.kinds), size=len(active), p=self.kind_probabilities)
+
+            delta = timestamp[active] - last_exposure[active]
+            p_recall = form.calculate_retention_rate(form.calculate_mu(0.5, half_life[active]), delta)
+            recalled = random.random(len(active)) < p_recall
+
+            messages = np.empty(len(active), dtype=np.uint8)
+            tests_recall = np.zeros(len(active), dtype=bool)
+            for i, kind in enumerate(self.kinds):
+                is_kind = kinds == i
+                if kind == REVISION:
+                    messages[is_kind] = np.where(recalled[is_kind], MESSAGE_CODES[REVISION__NOT_CLICKED], MESSAGE_CODES[REVISION__CLICKED])
+                elif kind == READING:
+                    messages[is_kind] = np.where(recalled[is_kind], MESSAGE_CODES[TEXT__SENTENCE_READ], MESSAGE_CODES[TEXT__WORD_HIGHLIGHTED])
+                else:
+                    messages[is_kind] = MESSAGE_CODES[kind]
+                tests_recall |= is_kind & (kind in [REVISION, READING])
+
+            # Only events which test recall change the memory trace
+            tested = active[tests_recall]
+            half_life[tested] *= np.where(recalled[tests_recall], config.growth, config.lapse)
+            last_exposure[active] = timestamp[active]
+
+            steps.append({
+                'lemma': active,
+                'timestamp': timestamp[active].astype(np.int64),
+                'message': messages,
+                'p_recall': np.where(tests_recall, p_recall, np.nan),
+            })
+
+        columns = {name: np.concatenate([step[name] for step in steps]) for name in steps[0]}
+        order = np.argsort(columns['timestamp'], kind='stable')
+        columns = {name: values[order] for name, values in columns.items()}
+        columns['user'] = np.full(len(order), user, dtype=np.uint32)
+        return columns
+
+    @staticmethod
+    def __to_dictionaries(columns, ground_truth):
+        user = USER_FORMAT.format(int(columns['user'][0])) if len(columns['user']) else None
+        logs = [
+            {'user': user, 'lemma': LEMMA_FORMAT.format(lemma), 'timestamp': timestamp, 'message': VALID_LOG_MESSAGES[message]}
+            for lemma, timestamp, message in zip(columns['lemma'].tolist(), columns['timestamp'].tolist(), columns['message'].tolist())
+        ]
+        if ground_truth:
+            for log, p_recall in zip(logs, columns['p_recall'].tolist()):
+                log['p_recall'] = p_recall
+        return logs
+
+
+USER_FORMAT = 'user_{}'
+LEMMA_FORMAT = 'lemma_{}'
+COLUMNAR_DTYPES = {
+    'user': '<u4',
+    'lemma': '<u4',
+    'timestamp': '<i8',
+    'message': 'u1',
+}
+
+
+def read_columnar(directory):
+    """
+    Output: metadata and a dictionary of memory mapped column arrays
+    written by SyntheticLogGenerator.write_columnar.
+    """
+    with open(os.path.join(directory, 'metadata.json')) as file:
+        metadata = json.load(file)
+    columns = {
+        name: np.memmap(os.path.join(directory, name + '.bin'), dtype=dtype, mode='r', shape=(metadata['n_events'],))
+        if metadata['n_events'] else np.empty(0, dtype=dtype)
+        for name, dtype in metadata['dtypes'].items()
+    }
+    return metadata, columns
+
+
+def iter_pickle_chunks(filename):
+    """
+    Yields the lists of logs of a file written by SyntheticLogGenerator.write_pickle.
+    """
+    with open(filename, 'rb') as file:
+        while True:
+            try:
+                yield pickle.load(file)
+            except EOFError:
+                return
@@ -0,0 +1,58 @@
+import json
+from itertools import islice
+
+import numpy as np
+
+import synthetic
+from wrangling.DatasetFactory import DatasetFactory
+from wrangling.domain import VALID_LOG_MESSAGES, Log
+
+
+def make_logs(n_events=3000, n_lemmas=100, **config):
+    """
+    Test logs shared by the test modules: the first n_events log
+    dictionaries of a generator sized for about n_events events.
+    """
+    generator = synthetic.SyntheticLogGenerator.for_events(n_events, n_lemmas=n_lemmas, **config)
+    return list(islice(generator.iter_logs(), n_events))
+
+
+def test_SyntheticLogGenerator(tmp_path):
+    config = synthetic.SyntheticLogConfiguration(n_users=3, n_lemmas=50, seed=7)
+    logs = list(synthetic.SyntheticLogGenerator(config).iter_logs())
+
+    # Deterministic per seed, and every message type is generated
+    assert logs == list(synthetic.SyntheticLogGenerator(config).iter_logs())
+    assert {log['message'] for log in logs} == set(VALID_LOG_MESSAGES)
+    assert {log['user'] for log in logs} == {'user_0', 'user_1', 'user_2'}
+    for log in logs[:100]:
+        Log.from_dictionary(log)
+
+    # The three formats hold the same events
+    generator = synthetic.SyntheticLogGenerator(config)
+    generator.write_pickle(tmp_path / 'logs.pkl', chunk_size=1000)
+    generator.write_jsonl(tmp_path / 'logs.jsonl', chunk_size=1000)
+    generator.write_columnar(tmp_path / 'columnar')
+
+    assert [log for chunk in synthetic.iter_pickle_chunks(tmp_path / 'logs.pkl') for log in chunk] == logs
+    with open(tmp_path / 'logs.jsonl') as file:
+        assert [json.loads(line) for line in file] == logs
+    metadata, columns = synthetic.read_columnar(tmp_path / 'columnar')
+    assert metadata['n_events'] == len(logs)
+    assert np.array_equal(columns['timestamp'], [log['timestamp'] for log in logs])
+    assert [metadata['messages'][code] for code in columns['message']] == [log['message'] for log in logs]
+
+    # Logs are usable by the featurization pipeline
+    factory = DatasetFactory()
+    factory.add_logs(logs)
+    assert len(factory.create_dataframe_with_all_data_sequence()) > 0
+
+
+def test_ground_truth_forgetting():
+    config = synthetic.SyntheticLogConfiguration(n_users=2, n_lemmas=200, seed=1)
+    logs = list(synthetic.SyntheticLogGenerator(config).iter_logs(ground_truth=True))
+    p_recall = np.array([log['p_recall'] for log in logs if log['message'] in ['REVISION__CLICKED', 'REVISION__NOT_CLICKED']])
+    recalled = np.array([log['message'] == 'REVISION__NOT_CLICKED' for log in logs if log['message'] in ['REVISION__CLICKED', 'REVISION__NOT_CLICKED']])
+
+    # Outcomes are drawn from the ground truth probability of recall
+    assert abs(recalled.mean() - p_recall.mean()) < 0.05
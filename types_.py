@@ -1,9 +1,25 @@
 from dataclasses import dataclass
 from typing import Union
 
+from config import NEVER, OUTLIERS_COEFFICIENT
+
 @dataclass
 class DatasetConfiguration:
     users: Union[None, list] = None
     filename: str = 'logs-14mo.pkl'
     keep_username: bool = False
-    keep_timestamp: bool = False
\ No newline at end of file
+    keep_timestamp: bool = False
+    # Featurization parameters of DatapointBuilder.view_all_data_sequence. They
+    # only apply to the DatasetFactory views built on it: ALL_DATA_SEQUENCE,
+    # iter_dataframes_with_all_data_sequence and create_sequence_for_rnn
+    sample_period: int = 24 * 60 * 60
+    alpha: float = 0.5
+    outliers_coefficient: float = OUTLIERS_COEFFICIENT
+    # Seconds the *_seconds features hold while their event has not happened
+    never: int = NEVER
+    # Run the streak and interval state machines in wrangling.kernels (compiled
+    # with numba when it is installed) instead of the Datapoint partitions
+    compiled_kernels: bool = False
+    # Output the compact schema of wrangling.schema (int32/float32, categorical
+    # user and missing values instead of NEVER)
+    compact: bool = False
@@ -1,6 +1,7 @@
 import pickle
 import os
 
+import pandas as pd
 from sklearn.model_selection import train_test_split
 
 from wrangling.DatapointBuilder import DatapointBuilder
@@ -15,19 +16,49 @@ def load_data(config=DatasetConfiguration()):
     factory.add_logs(logs)
     df = factory.create_dataframe_with_all_data_sequence()
     debug(df.columns)
+    X, y, previous_recall_score = split_features_and_targets(df)
+    return X, y, previous_recall_score, df
+
+def split_features_and_targets(df):
     y  = df["inferred_retention_rate"]
     previous_recall_score  = df["previous_recall_score"]
 
     X  = df.drop(['inferred_retention_rate', "previous_recall_score", "user", "timestamp"], axis=1)
-    return X, y, previous_recall_score, df
+    return X, y, previous_recall_score
 
 def load_data_split(seed=10, test_size=0.1):
     X,y,previous_recall_score, _ = load_data()
     return train_test_split(X, y, previous_recall_score, random_state=seed, test_size=test_size)
 
+def iter_data_chunks(config=DatasetConfiguration(), builders_per_chunk=1000):
+    """
+    Streams the dataset load_data builds as (X, y, delta) chunks of
+    `builders_per_chunk` items each, e.g. for MTRLinearRegression.fit_from_chunks.
+    """
+    factory = DatasetFactory(builder_constructor=DatapointBuilder, config=config)
+    factory.add_logs(load_logs(config))
+    for df in factory.iter_dataframes_with_all_data_sequence(builders_per_chunk):
+        X, y, _ = split_features_and_targets(df)
+        yield X, y, X['delta']
+
+def iter_csv_chunks(filename, target_column, drop_columns=(), chunksize=100000):
+    """
+    Streams a csv file (e.g. the Duolingo learning traces) as (X, y, delta) chunks.
+    """
+    for df in pd.read_csv(filename, chunksize=chunksize):
+        y = df[target_column]
+        X = df.drop([target_column, *drop_columns], axis=1)
+        yield X, y, X['delta']
+
 def load_logs(config=DatasetConfiguration()):
     with open(os.path.join('data', config.filename), 'rb') as file:
         logs = pickle.load(file)
+        # Files written in chunks (see synthetic.py) hold several pickled lists
+        while True:
+            try:
+                logs += pickle.load(file)
+            except EOFError:
+                break
     return logs
 
 def swap_columns(df, c1, c2):
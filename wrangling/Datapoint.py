@@ -1,7 +1,8 @@
 """
 The serial module provides classes for turning log data into datapoints.
 """
-from dataclasses import asdict
+from dataclasses import fields
+from functools import lru_cache
 
 from config import NEVER
 from wrangling.domain import *
@@ -14,14 +15,33 @@ class DictionaryViewWithEncapsulation:
     """
 
     def to_dict(self):
-        def dict_factory(data):
-            return dict(filter(lambda x: x[0][0]!='_', data))
-        return asdict(self, dict_factory=dict_factory)
+        # The fields are scalars, so there is nothing for dataclasses.asdict to copy
+        return {name: getattr(self, name) for name in _public_fields(type(self))}
+
+
+@lru_cache(maxsize=None)
+def _public_fields(cls):
+    return tuple(field.name for field in fields(cls) if field.name[0] != '_')
+
+
+@dataclass
+class NeverDefaults:
+    """
+    Subclasses take the number of seconds standing for an event which never
+    happened as `_never` (config.NEVER by default), which replaces the
+    NEVER defaults of their fields.
+    """
+    _never: int = NEVER
+
+    def __post_init__(self):
+        for field in fields(self):
+            if field.default == NEVER and field.name != '_never':
+                setattr(self, field.name, self._never)
 
 
 @enforce_types
 @dataclass
-class CommonDatapointData(DictionaryViewWithEncapsulation):
+class CommonDatapointData(NeverDefaults, DictionaryViewWithEncapsulation):
     CLICKED: bool = True
     FIRST_EXPOSURE_seconds: int = NEVER
     user: str = None
@@ -77,7 +97,7 @@ class CommonDatapointData(DictionaryViewWithEncapsulation):
 
 @enforce_types
 @dataclass
-class RevisionDatapointPartition(DictionaryViewWithEncapsulation):
+class RevisionDatapointPartition(NeverDefaults, DictionaryViewWithEncapsulation):
     REVISION__CLICKED_amount : int = 0
     REVISION__NOT_CLICKED_amount : int = 0
     REVISION__ALL_amount : int = 0
@@ -119,7 +139,7 @@ class RevisionDatapointPartition(DictionaryViewWithEncapsulation):
         # Seconds elapsed since last revision outcome
         self.REVISION__CLICKED_seconds = timestamp - self.__REVISION__CLICKED_last_timestamp
         self.REVISION__NOT_CLICKED_seconds = timestamp - self.__REVISION__NOT_CLICKED_last_timestamp \
-            if self.__REVISION__NOT_CLICKED_last_timestamp else NEVER
+            if self.__REVISION__NOT_CLICKED_last_timestamp else self._never
         self.REVISION__ALL_seconds = min(self.REVISION__CLICKED_seconds, self.REVISION__NOT_CLICKED_seconds)
 
     def __update_intervals(self,message,timestamp):
@@ -150,7 +170,7 @@ class RevisionDatapointPartition(DictionaryViewWithEncapsulation):
 
 @enforce_types
 @dataclass
-class BookDrillDatapointPartition(DictionaryViewWithEncapsulation):
+class BookDrillDatapointPartition(NeverDefaults, DictionaryViewWithEncapsulation):
     BOOK_DRILL_CLICK_amount : int = 0
     BOOK_DRILL_SCROLL_amount : int = 0
     BOOK_DRILL__ALL_amount : int = 0
@@ -188,7 +208,7 @@ class BookDrillDatapointPartition(DictionaryViewWithEncapsulation):
         # Seconds elapsed since last revision outcome
         self.BOOK_DRILL_CLICK_seconds = timestamp - self.__BOOK_DRILL__CLICK_last_timestamp
         self.BOOK_DRILL_SCROLL_seconds = timestamp - self.__BOOK_DRILL__SCROLL_last_timestamp \
-            if self.__BOOK_DRILL__SCROLL_last_timestamp else NEVER
+            if self.__BOOK_DRILL__SCROLL_last_timestamp else self._never
         self.REVISION__ALL_seconds = min(self.BOOK_DRILL_CLICK_seconds, self.BOOK_DRILL_SCROLL_seconds)
 
     def __store_timestamps_for_next_iteration(self,message,timestamp):
@@ -211,7 +231,7 @@ VIDEO__WAS_SEEN = "VIDEO__WAS_SEEN"
 
 @enforce_types
 @dataclass
-class VideoDatapointPartition(DictionaryViewWithEncapsulation):
+class VideoDatapointPartition(NeverDefaults, DictionaryViewWithEncapsulation):
     VIDEO__TRANSLATION_WAS_REVEALED_amount : int = 0
     VIDEO__WAS_SEEN_amount : int = 0
     VIDEO_ALL_amount : int = 0
@@ -249,7 +269,7 @@ class VideoDatapointPartition(DictionaryViewWithEncapsulation):
         # Seconds elapsed since last revision outcome
         self.VIDEO__TRANSLATION_WAS_REVEALED_seconds = timestamp - self.__VIDEO__TRANSLATION_WAS_REVEALED_last_timestamp
         self.VIDEO__WAS_SEEN_seconds = timestamp - self.__VIDEO__WAS_SEEN_last_timestamp \
-            if self.__VIDEO__WAS_SEEN_last_timestamp else NEVER
+            if self.__VIDEO__WAS_SEEN_last_timestamp else self._never
         self.REVISION__ALL_seconds = min(self.VIDEO__TRANSLATION_WAS_REVEALED_seconds, self.VIDEO__WAS_SEEN_seconds)
 
     def __store_timestamps_for_next_iteration(self,message,timestamp):
@@ -269,7 +289,7 @@ class VideoDatapointPartition(DictionaryViewWithEncapsulation):
 
 @enforce_types
 @dataclass
-class ReadingDatapointPartition(DictionaryViewWithEncapsulation):
+class ReadingDatapointPartition(NeverDefaults, DictionaryViewWithEncapsulation):
     TEXT__WORD_HIGHLIGHTED_amount: int = 0
     TEXT__SENTENCE_CLICK_amount: int = 0
     TEXT__SENTENCE_READ_amount: int = 0
@@ -287,7 +307,7 @@ class ReadingDatapointPartition(DictionaryViewWithEncapsulation):
         message, timestamp = log.message, log.timestamp
 
         # Base case: first log
-        if self.TEXT__ALL_seconds == NEVER:
+        if self.TEXT__ALL_seconds == self._never:
             # First event counts as a click and a highlight
             self.__TEXT__SENTENCE_CLICK_timestamp = timestamp
             self.TEXT__SENTENCE_CLICK_amount += 1
@@ -320,17 +340,17 @@ class ReadingDatapointPartition(DictionaryViewWithEncapsulation):
     def update_timestamp(self, timestamp):
         # Update seconds elapsed based on previous timestamp
         self.TEXT__SENTENCE_READ_seconds = timestamp - self.__TEXT__SENTENCE_READ_timestamp \
-            if self.__TEXT__SENTENCE_READ_timestamp else NEVER
+            if self.__TEXT__SENTENCE_READ_timestamp else self._never
         self.TEXT__SENTENCE_CLICK_seconds = timestamp - self.__TEXT__SENTENCE_CLICK_timestamp \
-            if self.__TEXT__SENTENCE_CLICK_timestamp else NEVER
+            if self.__TEXT__SENTENCE_CLICK_timestamp else self._never
         self.TEXT__WORD_HIGHLIGHTED_seconds = timestamp - self.__TEXT__WORD_HIGHLIGHTED_timestamp \
-            if self.__TEXT__WORD_HIGHLIGHTED_timestamp else NEVER
+            if self.__TEXT__WORD_HIGHLIGHTED_timestamp else self._never
         self.TEXT__ALL_seconds = min(self.TEXT__SENTENCE_READ_seconds, self.TEXT__SENTENCE_CLICK_seconds, self.TEXT__WORD_HIGHLIGHTED_seconds)
 
 
 @enforce_types
 @dataclass
-class AllDatapointPartition(DictionaryViewWithEncapsulation):
+class AllDatapointPartition(NeverDefaults, DictionaryViewWithEncapsulation):
     ALL_amount: int  = 0
     ALL_seconds: int = NEVER
     ALL_leading_failures_amount : int = 0
@@ -407,15 +427,19 @@ class Datapoint:
     partitions and exposes an interface to both update the partitions together
     and to retrieve a dictionary containing either the full data, only the
     revision data, or only the reading data.
+
+    `never` is the number of seconds the *_seconds features hold while the
+    event they measure has not happened (DatasetConfiguration.never).
     """
 
-    def __init__(self):
-        self.common = CommonDatapointData()
-        self.reading = ReadingDatapointPartition()
-        self.revision = RevisionDatapointPartition()
-        self.book_drill = BookDrillDatapointPartition()
-        # self.video = VideoDatapointPartition()
-        self.all = AllDatapointPartition()
+    def __init__(self, never=NEVER):
+        self.never = never
+        self.common = CommonDatapointData(_never=never)
+        self.reading = ReadingDatapointPartition(_never=never)
+        self.revision = RevisionDatapointPartition(_never=never)
+        self.book_drill = BookDrillDatapointPartition(_never=never)
+        # self.video = VideoDatapointPartition(_never=never)
+        self.all = AllDatapointPartition(_never=never)
 
     def __base_update_from_log(self, log):
         self.reading.update_from_log(log)
@@ -448,3 +472,15 @@ class Datapoint:
 
     def view_all_data(self):
         return {**self.common.to_dict(), **self.reading.to_dict(), **self.revision.to_dict(), **self.book_drill.to_dict(),  **self.all.to_dict()}
+
+
+# Columns which hold the never value of their Datapoint while the event they
+# measure has not happened (the fields with a NEVER default, which
+# NeverDefaults replaces). REVISION_previous_interval has a default of 0 but
+# inherits never from REVISION_last_interval after the first revision.
+NEVER_COLUMNS = [
+    field.name
+    for partition in [ReadingDatapointPartition, RevisionDatapointPartition, BookDrillDatapointPartition, AllDatapointPartition]
+    for field in fields(partition)
+    if field.default == NEVER and not field.name.startswith('_')
+] + ['REVISION_previous_interval']
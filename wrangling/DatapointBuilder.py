@@ -1,4 +1,6 @@
 import math
+from bisect import insort
+from collections import namedtuple
 from copy import copy
 from functools import partial
 from abc import ABC, abstractmethod
@@ -6,40 +8,58 @@ from abc import ABC, abstractmethod
 from enforce_typing import enforce_types
 
 from types_ import DatasetConfiguration
+from wrangling import kernels
 from wrangling.Datapoint import Datapoint
 from wrangling.domain import is_click, is_recall, calculate_recall_score, Log, CoreLog
 
 
+# Read-only copy of a Log with its timestamp relative to the first log of its builder.
+RelativeLog = namedtuple('RelativeLog', ['timestamp', 'message', 'user', 'lemma', 'original_timestamp'])
+
+
 class IDatapointBuilder(ABC):
 
     def __init__(self, id, config = DatasetConfiguration()):
         self._id = id
-        self._logs = []
+        self._logs = []  # Sorted by timestamp
+        self._cache = {}  # Results derived from the logs, cleared when a log is added
         self.config = config
 
     @classmethod
     @enforce_types
-    def from_log(cls, log: Log):
+    def from_log(cls, log: Log, config: DatasetConfiguration = DatasetConfiguration()):
         """
         Static factory method using a log.
-        Input: log
+        Input: log, and the DatasetConfiguration of the dataset
         Output: DatapointBuilder instance
         """
-        self = cls(log.id())
+        self = cls(log.id(), config)
         self.add_log(log)
         return self
 
     @enforce_types
     def add_log(self, log: Log):
         """
-        Just adds a log.
+        Adds a log, keeping the logs sorted by timestamp (logs with equal
+        timestamps stay in the order they were added).
         Input: log
         Output: None
         """
         assert log.id() == self._id
-        self._logs.append(log)
+        insort(self._logs, log, key=lambda log: log.timestamp)
+        self._cache.clear()
 
 
+    @classmethod
+    def compute_kernel_states(cls, builders):
+        """
+        Precomputes, for builders which support it, what their views need
+        from wrangling.kernels, over all the builders at once.
+        Input: list of builders
+        Output: None
+        """
+        pass
+
     @abstractmethod
     def view_all_data_sequence(self, **kwargs):
         pass
@@ -52,6 +72,18 @@ class IDatapointBuilder(ABC):
                                             return_timesteps=True):
         pass
 
+    @abstractmethod
+    def view_all_data_flattened(self):
+        pass
+
+    @abstractmethod
+    def view_reading_data_flattened(self):
+        pass
+
+    @abstractmethod
+    def view_revision_data_flattened(self):
+        pass
+
     def __len__(self):
         return len(self._logs)
 
@@ -107,6 +139,58 @@ class DatapointBuilder(IDatapointBuilder):
             datapoint['FIRST_EXPOSURE_seconds'] += datapoint['delta']
         return datapoints_for_prediction
 
+    def view_all_data_flattened(self):
+        return self.__flattened(self.__final_state().view_all_data())
+
+    def view_reading_data_flattened(self):
+        return self.__flattened(self.__final_state().view_reading_data())
+
+    def view_revision_data_flattened(self):
+        return self.__flattened(self.__final_state().view_revision_data())
+
+    def __flattened(self, datapoint_dict):
+        datapoint_dict['lemma'] = self._logs[0].lemma
+        return datapoint_dict
+
+    def __final_state(self):
+        """
+        Datapoint after all the logs, in a single pass: no aggregation into
+        periods, interpolation or smoothing.
+        Output: Datapoint
+        """
+        logs = self.__relative_logs()
+        datapoint = self.__new_datapoint()
+        for log in logs:
+            datapoint.update_from_log_counting_text_interactions_as_clicks(log)
+        return datapoint
+
+    def __new_datapoint(self):
+        # A Datapoint to update with all the logs, in order
+        datapoint = Datapoint(self.config.never)
+        if self.config.compiled_kernels:
+            if 'kernel_states' not in self._cache:
+                self.compute_kernel_states([self])
+            kernels.use_compiled_partitions(datapoint, self._cache['kernel_states'])
+        return datapoint
+
+    @classmethod
+    def compute_kernel_states(cls, builders):
+        """
+        Runs the kernels once over the logs of all the builders configured
+        with compiled_kernels, instead of once per builder. The states are
+        kept until a log is added.
+        Input: list of builders
+        Output: None
+        """
+        by_never = {}
+        for builder in builders:
+            if builder.config.compiled_kernels and 'kernel_states' not in builder._cache:
+                by_never.setdefault(builder.config.never, []).append(builder)
+        for never, group in by_never.items():
+            states = kernels.compute_states([builder.__relative_logs() for builder in group], never)
+            for builder, builder_states in zip(group, states):
+                builder._cache['kernel_states'] = builder_states
+
     def infer_retention_rate(self, sample_period=24 * 60 * 60, alpha=0.9):
         """
         Infers retention rate from the events by:
@@ -116,16 +200,21 @@ class DatapointBuilder(IDatapointBuilder):
         3. Smoothing by bi-directional Exponential Moving Average with parameter
         `alpha`.
 
+        The results are memoized per (sample_period, alpha) until a log is
+        added, and every call returns copies which the caller may modify.
+
         Input: sample_period, alpha
-        Output:
+        Output: the datapoint dictionaries of the periods (None for periods
+        without events) and the inferred retention rate of every period.
         """
-        logs = copy(self._logs)
-        logs.sort(key=lambda log: log.timestamp)
-        # Subtract first timestamp
-        first_timestamp = logs[0].timestamp
-        for log in logs:
-            log.timestamp -= first_timestamp
-
+        key = ('infer_retention_rate', sample_period, alpha)
+        if key not in self._cache:
+            self._cache[key] = self.__infer_retention_rate(sample_period, alpha)
+        datapoints, ema = self._cache[key]
+        return [copy(datapoint) if datapoint is not None else None for datapoint in datapoints], list(ema)
+
+    def __infer_retention_rate(self, sample_period, alpha):
+        logs = self.__relative_logs()
         datapoints = self.__aggregate_logs_into_timesteps(logs, sample_period)
         recall_scores = list(map(lambda datapoint: datapoint['recall_score'] if datapoint else None, datapoints))
 
@@ -141,6 +230,12 @@ class DatapointBuilder(IDatapointBuilder):
 
         return datapoints,ema
 
+    def __relative_logs(self):
+        # Copies of the logs with timestamps relative to the first log; the logs themselves are left untouched
+        first_timestamp = self._logs[0].timestamp
+        return [RelativeLog(log.timestamp - first_timestamp, log.message, log.user, log.lemma, log.original_timestamp)
+                for log in self._logs]
+
     def __find_consecutive_nones(self, scores):
         consecutive_nones = []
         i = j = 0
@@ -181,7 +276,7 @@ class DatapointBuilder(IDatapointBuilder):
         datapoints = []
         next_timestamp = sample_period
         i = 0
-        datapoint = Datapoint()
+        datapoint = self.__new_datapoint()
         while next_timestamp < last_timestamp + sample_period:
             recalls = 0
             clicks = 0
@@ -0,0 +1,64 @@
+from synthetic import SyntheticLogConfiguration, SyntheticLogGenerator
+from wrangling.DatapointBuilder import DatapointBuilder
+from wrangling.domain import Log
+
+
+def make_builder():
+    generator = SyntheticLogGenerator(SyntheticLogConfiguration(n_users=1, n_lemmas=1, mean_events_per_item=200))
+    logs = [Log.from_dictionary(log) for log in generator.iter_logs()]
+    builder = DatapointBuilder.from_log(logs[-1])
+    for log in reversed(logs[:-1]):
+        builder.add_log(log)
+    return builder, logs
+
+
+def test_flattened_views_are_the_final_state():
+    builder, logs = make_builder()
+    timestamps = [log.timestamp for log in logs]
+
+    flattened = builder.view_all_data_flattened()
+    assert flattened['ALL_amount'] == len(logs)
+    assert flattened['timestamp'] == logs[0].timestamp
+    assert (flattened['user'], flattened['lemma']) == (logs[0].user, logs[0].lemma)
+    # The logs are not made relative in place
+    assert [log.timestamp for log in logs] == timestamps
+
+    for view in [builder.view_reading_data_flattened(), builder.view_revision_data_flattened()]:
+        assert {key: flattened[key] for key in view} == view
+
+
+def test_flattened_view_matches_the_last_sequence_datapoint_features():
+    builder, logs = make_builder()
+    flattened = builder.view_all_data_flattened()
+    # The last period has seen every log, so only the labels of the sequence differ
+    last = [datapoint for datapoint in builder.infer_retention_rate()[0] if datapoint is not None][-1]
+    for key in ['recall_score', 'period_start', 'period_end']:
+        del last[key]
+    assert flattened.pop('lemma') == logs[0].lemma
+    assert flattened == last
+
+
+def test_logs_are_kept_sorted_and_not_mutated():
+    builder, logs = make_builder()
+    timestamps = [log.timestamp for log in logs]
+    assert [log.timestamp for log in builder._logs] == sorted(timestamps)
+
+    first = builder.view_all_data_sequence()
+    assert builder.view_all_data_sequence() == first
+    assert [log.timestamp for log in logs] == timestamps
+
+
+def test_infer_retention_rate_is_memoized_until_a_log_is_added():
+    builder, logs = make_builder()
+    datapoints, rates = builder.infer_retention_rate(sample_period=86400, alpha=0.5)
+
+    # Callers get copies, so modifying them doesn't change later results
+    datapoints[0]['ALL_amount'] = -1
+    rates[0] = -1
+    again, again_rates = builder.infer_retention_rate(sample_period=86400, alpha=0.5)
+    assert again[0]['ALL_amount'] != -1 and again_rates[0] != -1
+    assert builder.infer_retention_rate(sample_period=86400, alpha=0.9)[1] != again_rates
+
+    last = logs[-1]
+    builder.add_log(Log(last.timestamp + 30 * 86400, last.message, last.user, last.lemma))
+    assert len(builder.infer_retention_rate(sample_period=86400, alpha=0.5)[1]) == len(again_rates) + 30
@@ -2,89 +2,208 @@ from __future__ import annotations
 
 import statistics
 from collections import defaultdict
-from typing import List, Dict, Callable
+from itertools import compress
+from typing import List, Dict
 
 import pandas
 
-from config import OUTLIERS_COEFFICIENT
 from lib import debug
 from types_ import DatasetConfiguration
+from wrangling import kernels
+from wrangling.asof import AsOfIndex
 from wrangling.DatapointBuilder import DatapointBuilder, IDatapointBuilder
 from wrangling.domain import Log
+from wrangling.instrumentation import NullStats
+from wrangling.schema import compact_dataframe
+from wrangling.validation import ValidationReport, validate_log_batch
+
+# Views of the dataset, see DatasetFactory.create_dataframes
+ALL_DATA_FLATTENED = 'all_data_flattened'
+ONLY_READING_DATA_FLATTENED = 'only_reading_data_flattened'
+ONLY_REVISION_DATA_FLATTENED = 'only_revision_data_flattened'
+ALL_DATA_SEQUENCE = 'all_data_sequence'
+ALL_DATA_SEQUENCE_COUNTING_TEXT_INTERACTIONS_AS_CLICKS = 'all_data_sequence_counting_text_interactions_as_clicks'
+SELF_LEARNING = 'self_learning'
+ONLY_READING_DATA_SEQUENCE = 'only_reading_data_sequence'
+ONLY_REVISION_DATA_SEQUENCE = 'only_revision_data_sequence'
+UNLABELED = 'unlabeled'
+VIEWS = [
+    ALL_DATA_FLATTENED,
+    ONLY_READING_DATA_FLATTENED,
+    ONLY_REVISION_DATA_FLATTENED,
+    ALL_DATA_SEQUENCE,
+    ALL_DATA_SEQUENCE_COUNTING_TEXT_INTERACTIONS_AS_CLICKS,
+    SELF_LEARNING,
+    ONLY_READING_DATA_SEQUENCE,
+    ONLY_REVISION_DATA_SEQUENCE,
+    UNLABELED,
+]
 
 class DatasetFactory:
-    def __init__(self, builder_constructor = DatapointBuilder, config = DatasetConfiguration()):
+    def __init__(self, builder_constructor = DatapointBuilder, config = DatasetConfiguration(), stats = None):
+        """
+        stats: optional wrangling.instrumentation.PipelineStats collecting stage
+        timings and counters (logs rejected by reason, outliers dropped, ...).
+        """
         self.__logs : List[Log] = []
+        # Builders grouped from the logs per builder configuration, reused by every view until logs are added
         self.cache = {}
         self.builder_constructor = builder_constructor
         self.config = config
+        self.stats = stats if stats is not None else NullStats()
+        self.validation_report = ValidationReport()
 
     def add_logs(self, logs : List[dict]):
-        for log in logs:
-            should_add = True
-            if self.config.users is not None:
-                should_add = log['user'] in self.config.users
-            if should_add:
-                try:
-                    log = Log.from_dictionary(log)
-                    self.__logs.append(log)
-                except Exception as e:
-                    debug(e)
+        """
+        Adds the valid logs. Why the others were rejected is accumulated in
+        self.validation_report (see wrangling.validation).
+        """
+        logs = logs if isinstance(logs, list) else list(logs)
+        with self.stats.stage('validate_logs'):
+            report = validate_log_batch(logs)
+        self.validation_report = self.validation_report.merge(report)
+
+        n_before = len(self.__logs)
+        with self.stats.stage('add_logs'):
+            for log in compress(logs, report.keep):
+                if self.config.users is None or log['user'] in self.config.users:
+                    self.__logs.append(Log.from_dictionary(log))
+                else:
+                    self.stats.count('logs_skipped_user')
+        self.stats.count('logs_accepted', len(self.__logs) - n_before)
+        if len(self.__logs) != n_before:
+            self.cache.clear()
+        for reason, n in report.counts.items():
+            self.stats.count(f'logs_rejected.{reason}', n)
+        if report.n_rejected:
+            debug(f'Rejected {report.n_rejected} logs: {report.counts}')
         debug(f'Added {len(self.__logs)} logs')
 
     def create_dataframe_with_all_data_flattened(self) -> pandas.DataFrame:
-        return self.__create_dataframe_flattened( lambda builder : builder.view_all_data_flattened())
+        return self.__create_dataframe(ALL_DATA_FLATTENED)
 
     def create_dataframe_with_only_reading_data_flattened(self) -> pandas.DataFrame:
-        return self.__create_dataframe_flattened( lambda builder : builder.view_reading_data_flattened())
+        return self.__create_dataframe(ONLY_READING_DATA_FLATTENED)
 
     def create_dataframe_with_only_revision_data_flattened(self) -> pandas.DataFrame:
-        return self.__create_dataframe_flattened( lambda builder : builder.view_revision_data_flattened())
+        return self.__create_dataframe(ONLY_REVISION_DATA_FLATTENED)
 
     def create_dataframe_with_all_data_sequence(self) -> pandas.DataFrame:
         # This is the one I actually use
-        return self.__create_dataframe_sequence( lambda builder : builder.view_all_data_sequence())
+        return self.__create_dataframe(ALL_DATA_SEQUENCE)
 
     def create_dataframe_with_all_data_sequence_counting_text_interactions_as_clicks(self) -> pandas.DataFrame:
-        return self.__create_dataframe_sequence( lambda builder : builder.view_all_data_sequence_counting_text_interactions_as_clicks())
+        return self.__create_dataframe(ALL_DATA_SEQUENCE_COUNTING_TEXT_INTERACTIONS_AS_CLICKS)
 
     def create_dataframe_for_self_learning(self) -> pandas.DataFrame:
-        return self.__create_dataframe_sequence( lambda builder : builder.view_all_data_sequence_with_event_labels_counting_text_interactions_as_clicks() )
+        return self.__create_dataframe(SELF_LEARNING)
 
     def create_dataframe_with_only_reading_data_sequence(self) -> pandas.DataFrame:
-        return self.__create_dataframe_sequence( lambda builder : builder.view_reading_data_sequence())
+        return self.__create_dataframe(ONLY_READING_DATA_SEQUENCE)
 
     def create_dataframe_with_only_revision_data_sequence(self) -> pandas.DataFrame:
-        return self.__create_dataframe_sequence( lambda builder : builder.view_revision_data_sequence())
+        return self.__create_dataframe(ONLY_REVISION_DATA_SEQUENCE)
 
     def create_unlabeled_dataframe(self, interval_between_points=24*60*60) -> pandas.DataFrame:
-        return self.__create_dataframe_sequence(
-            lambda builder : builder.view_all_data_sequence_for_plotting(
-                interval_between_points=interval_between_points,
-                return_timesteps=False,
-            )
-            )
+        return self.__create_dataframe(UNLABELED, interval_between_points=interval_between_points)
 
-    def __create_dataframe_flattened(self, method_call :Callable[[DatapointBuilder], dict]):
-        builders = self.__builders()
-        data = []
-        for builder in builders:
-            try:
-                data.append(method_call(builder))
-            except Exception as e:
-                debug(e)
-        return pandas.DataFrame(data)
+    def create_dataframes(self, views : List[str], interval_between_points=24*60*60) -> Dict[str, pandas.DataFrame]:
+        """
+        Several views of the dataset in a single traversal of the builders.
+        Input: names of the views (see VIEWS), and the interval between the
+        points of the UNLABELED view.
+        Output: dictionary of view name to the DataFrame the corresponding
+        create_* method returns.
+        """
+        view_calls = self.__view_calls(interval_between_points)
+        unknown = [view for view in views if view not in view_calls]
+        if unknown:
+            raise ValueError(f'Unknown views {unknown}, expected some of {list(VIEWS)}')
 
+        builders = self.__builders()
+        self.__compute_kernel_states(builders)
+        data = {view: [] for view in views}
+        with self.stats.stage('views'):
+            for builder in builders:
+                for view in data:
+                    flattened, method_call = view_calls[view]
+                    try:
+                        if flattened:
+                            data[view].append(method_call(builder))
+                        else:
+                            data[view] += method_call(builder)
+                    except Exception as e:
+                        # Can throw an error if not enough data to build a datapoint
+                        self.stats.count(f'view_failures.{type(e).__name__}')
+        return {view: self.__to_dataframe(view_data) for view, view_data in data.items()}
 
-    def __create_dataframe_sequence(self, method_call :Callable[[DatapointBuilder], dict]):
+    def iter_dataframes_with_all_data_sequence(self, builders_per_chunk=1000):
+        """
+        Same rows as create_dataframe_with_all_data_sequence, yielded as one
+        DataFrame per `builders_per_chunk` items.
+        """
         builders = self.__builders()
-        data = []
-        for builder in builders:
-            try:
-                data += method_call(builder)
-            except Exception as e:
-                debug(e)
-        return pandas.DataFrame(data)
+        for i in range(0, len(builders), builders_per_chunk):
+            self.__compute_kernel_states(builders[i:i+builders_per_chunk])
+            data = []
+            with self.stats.stage('views'):
+                for builder in builders[i:i+builders_per_chunk]:
+                    try:
+                        data += builder.view_all_data_sequence(sample_period=self.config.sample_period, alpha=self.config.alpha)
+                    except Exception as e:
+                        self.stats.count(f'view_failures.{type(e).__name__}')
+            if data:
+                yield self.__to_dataframe(data)
+
+    def __compute_kernel_states(self, builders):
+        if not self.config.compiled_kernels:
+            return
+        if not kernels.COMPILED:
+            debug('numba is not installed, the kernels run as Python')
+        with self.stats.stage('kernels'):
+            self.builder_constructor.compute_kernel_states(builders)
+
+    def __create_dataframe(self, view, **kwargs):
+        return self.create_dataframes([view], **kwargs)[view]
+
+    def __view_calls(self, interval_between_points) -> Dict[str, tuple]:
+        # View name to (whether the view is one dictionary per builder, method call).
+        # Only ALL_DATA_SEQUENCE takes the sample_period and alpha of the
+        # configuration: DatapointBuilder doesn't implement the other
+        # sequence views, which are left for other IDatapointBuilder classes
+        # (they are counted as view_failures.AttributeError otherwise), and
+        # UNLABELED samples the default inference every interval_between_points.
+        return {
+            ALL_DATA_FLATTENED: (True, lambda builder : builder.view_all_data_flattened()),
+            ONLY_READING_DATA_FLATTENED: (True, lambda builder : builder.view_reading_data_flattened()),
+            ONLY_REVISION_DATA_FLATTENED: (True, lambda builder : builder.view_revision_data_flattened()),
+            ALL_DATA_SEQUENCE: (False, lambda builder : builder.view_all_data_sequence(
+                sample_period=self.config.sample_period, alpha=self.config.alpha)),
+            ALL_DATA_SEQUENCE_COUNTING_TEXT_INTERACTIONS_AS_CLICKS: (False,
+                lambda builder : builder.view_all_data_sequence_counting_text_interactions_as_clicks()),
+            SELF_LEARNING: (False,
+                lambda builder : builder.view_all_data_sequence_with_event_labels_counting_text_interactions_as_clicks()),
+            ONLY_READING_DATA_SEQUENCE: (False, lambda builder : builder.view_reading_data_sequence()),
+            ONLY_REVISION_DATA_SEQUENCE: (False, lambda builder : builder.view_revision_data_sequence()),
+            UNLABELED: (False, lambda builder : builder.view_all_data_sequence_for_plotting(
+                interval_between_points=interval_between_points,
+                return_timesteps=False,
+            )),
+        }
+
+    def __to_dataframe(self, data):
+        with self.stats.stage('dataframe'):
+            df = pandas.DataFrame(data)
+            if self.config.compact:
+                df = compact_dataframe(df, never=self.config.never)
+        self.stats.count('rows_emitted', len(df))
+        return df
+
+    def create_asof_index(self, checkpoint_interval=32) -> AsOfIndex:
+        """
+        Point-in-time index over the items of the dataset (see wrangling.asof).
+        """
+        return AsOfIndex.from_builders(self.__builders(), checkpoint_interval, never=self.config.never)
 
     def create_sequence_for_rnn(self):
         builders = self.__builders()
@@ -92,7 +211,7 @@ class DatasetFactory:
         for builder in builders:
             try:
                 # First, get the sequence
-                sequence = builder.view_all_data_sequence()
+                sequence = builder.view_all_data_sequence(sample_period=self.config.sample_period, alpha=self.config.alpha)
 
                 # Then, create subsequences
                 subsequences = []
@@ -107,31 +226,43 @@ class DatasetFactory:
             except Exception as e:
                 # Can throw an error if not enough data to build a datapoint,
                 # but there is no need to handle.
-                debug(e)
+                self.stats.count(f'view_failures.{type(e).__name__}')
             # Now we have to convert the data array into a 3rd order tensor.
 
         return data
 
     def __builders(self) -> List[DatapointBuilder]:
-        builders = self.__make_builders()
-        return self.__filter_outliers(builders)
+        # The builders depend on never and compiled_kernels, the outliers on
+        # the outliers coefficient of the configuration, which can change between calls
+        builders_key = ('builders', self.config.never, self.config.compiled_kernels)
+        key = builders_key + (self.config.outliers_coefficient,)
+        if key not in self.cache:
+            if builders_key not in self.cache:
+                self.cache[builders_key] = self.make_builders()
+            self.cache[key] = self.__filter_outliers(self.cache[builders_key])
+        return list(self.cache[key])
     
-    def __make_builders(self) -> List[IDatapointBuilder]:
-
+    def make_builders(self) -> List[IDatapointBuilder]:
+        """
+        Groups the logs into one new builder per item, without the cache
+        and the outlier filter of the views.
+        Output: list of builders
+        """
         # Pre-conditions
         if len(self.__logs) <= 1:
             raise Exception("Need at least two logs to produce a datapoint!")
 
         builders : Dict[str, DatapointBuilder] = {}
-        for log in self.__logs:
-            if log.id() in builders:
-                builders[log.id()].add_log(log)
-            else:
-                try:
-                    builders[log.id()] = self.builder_constructor.from_log(log)
-                except Exception as e:
-                    debug(e)
-                    
+        with self.stats.stage('make_builders'):
+            for log in self.__logs:
+                if log.id() in builders:
+                    builders[log.id()].add_log(log)
+                else:
+                    try:
+                        builders[log.id()] = self.builder_constructor.from_log(log, self.config)
+                    except Exception as e:
+                        self.stats.count(f'builders_failed.{type(e).__name__}')
+        self.stats.count('builders_created', len(builders))
         return list(builders.values())
 
     def create_sequence_of_messages_for_rnns(self):
@@ -160,10 +291,13 @@ class DatasetFactory:
         if len(builders) == 1:
             return builders
 
-        lengths = list(map(len, builders))
-        mean    = statistics.mean(lengths)
-        std_dev = statistics.stdev(lengths)
-        lower_bound = mean - OUTLIERS_COEFFICIENT*std_dev
-        upper_bound = mean + OUTLIERS_COEFFICIENT*std_dev
-        return list(filter(lambda builder : lower_bound < len(builder) and len(builder) < upper_bound, builders))
+        with self.stats.stage('filter_outliers'):
+            lengths = list(map(len, builders))
+            mean    = statistics.mean(lengths)
+            std_dev = statistics.stdev(lengths)
+            lower_bound = mean - self.config.outliers_coefficient*std_dev
+            upper_bound = mean + self.config.outliers_coefficient*std_dev
+            kept = list(filter(lambda builder : lower_bound < len(builder) and len(builder) < upper_bound, builders))
+        self.stats.count('outliers_dropped', len(builders) - len(kept))
+        return kept
 
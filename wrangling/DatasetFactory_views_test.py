@@ -0,0 +1,49 @@
+import pytest
+
+from synthetic_test import make_logs
+from types_ import DatasetConfiguration
+from wrangling.DatasetFactory import *
+from wrangling.instrumentation import PipelineStats
+
+
+def test_create_dataframes_matches_the_single_view_methods():
+    logs = make_logs()
+    factory = DatasetFactory()
+    factory.add_logs(logs)
+    views = [ALL_DATA_SEQUENCE, ALL_DATA_FLATTENED, ONLY_REVISION_DATA_FLATTENED, UNLABELED]
+    dataframes = factory.create_dataframes(views, interval_between_points=12*60*60)
+
+    expected = DatasetFactory()
+    expected.add_logs(logs)
+    assert dataframes[ALL_DATA_SEQUENCE].equals(expected.create_dataframe_with_all_data_sequence())
+    assert dataframes[ALL_DATA_FLATTENED].equals(expected.create_dataframe_with_all_data_flattened())
+    assert dataframes[ONLY_REVISION_DATA_FLATTENED].equals(expected.create_dataframe_with_only_revision_data_flattened())
+    assert dataframes[UNLABELED].equals(expected.create_unlabeled_dataframe(interval_between_points=12*60*60))
+
+    with pytest.raises(ValueError, match='Unknown views'):
+        factory.create_dataframes(['not_a_view'])
+
+
+def test_builders_are_reused_until_logs_are_added():
+    logs = make_logs()
+    stats = PipelineStats()
+    factory = DatasetFactory(stats=stats)
+    factory.add_logs(logs[:2000])
+    first = factory.create_dataframe_with_all_data_sequence()
+    assert factory.create_dataframe_with_all_data_sequence().equals(first)
+    factory.create_dataframe_with_all_data_flattened()
+    assert stats.to_dict()['stages']['make_builders']['calls'] == 1
+
+    factory.add_logs(logs[2000:])
+    assert len(factory.create_dataframe_with_all_data_sequence()) > len(first)
+    assert stats.to_dict()['stages']['make_builders']['calls'] == 2
+
+
+def test_rnn_sequences_follow_the_configured_sample_period():
+    logs = make_logs()
+    lengths = []
+    for sample_period in [24*60*60, 4*24*60*60]:
+        factory = DatasetFactory(config=DatasetConfiguration(sample_period=sample_period))
+        factory.add_logs(logs)
+        lengths.append(len(factory.create_sequence_for_rnn()))
+    assert lengths[0] > lengths[1]
@@ -0,0 +1,125 @@
+"""
+Point-in-time ("as of") lookup of Datapoint features.
+
+AsOfIndex keeps, for every item, its event timestamps sorted by time and a
+checkpoint of the Datapoint state every `checkpoint_interval` events. The
+features of an item as of time T are found by binary search for the
+number of events up to T, a copy of the checkpoint before them and a replay
+of the (fewer than checkpoint_interval) events after it. The state is then
+advanced to T, so the *_seconds features are the time elapsed as of T.
+
+Timestamps are unix timestamps (Log.original_timestamp); the state is built
+from timestamps relative to the first event of the item, as in
+DatapointBuilder.
+"""
+from copy import deepcopy
+
+import numpy as np
+import pandas as pd
+
+from config import NEVER
+from wrangling.Datapoint import Datapoint
+from wrangling.DatapointBuilder import RelativeLog
+
+
+class _Item:
+
+    def __init__(self, logs, checkpoint_interval, never):
+        logs = sorted(logs, key=lambda log: log.original_timestamp)
+        self.first_timestamp = logs[0].original_timestamp
+        self.timestamps = np.array([log.original_timestamp for log in logs], dtype=np.int64)
+        self.logs = [
+            RelativeLog(log.original_timestamp - self.first_timestamp, log.message, log.user, log.lemma, log.original_timestamp)
+            for log in logs
+        ]
+        # checkpoints[j] is the state after the first j * checkpoint_interval events
+        self.checkpoints = [Datapoint(never)]
+        datapoint = Datapoint(never)
+        for i, log in enumerate(self.logs, start=1):
+            datapoint.update_from_log_counting_text_interactions_as_clicks(log)
+            if i % checkpoint_interval == 0:
+                self.checkpoints.append(deepcopy(datapoint))
+
+
+class AsOfIndex:
+
+    def __init__(self, logs_by_id, checkpoint_interval=32, never=NEVER):
+        """
+        Input: dictionary of item id to its logs, the number of events
+        between checkpoints (memory / query time trade-off) and the never
+        value of the Datapoints.
+        """
+        self.checkpoint_interval = checkpoint_interval
+        self.items = {id: _Item(logs, checkpoint_interval, never) for id, logs in logs_by_id.items() if logs}
+
+    @classmethod
+    def from_builders(cls, builders, checkpoint_interval=32, never=NEVER):
+        return cls({builder._id: builder._logs for builder in builders}, checkpoint_interval, never)
+
+    def __contains__(self, id):
+        return id in self.items
+
+    def features(self, id, timestamp):
+        """
+        Input: item id and unix timestamp.
+        Output: dictionary of the item's features as of that time (the
+        events at exactly `timestamp` included), None if the item had no
+        events yet or is not in the index.
+        """
+        item = self.items.get(id)
+        if item is None:
+            return None
+        n_events = int(np.searchsorted(item.timestamps, timestamp, side='right'))
+        if n_events == 0:
+            return None
+        datapoint = self.__replay(item, n_events)
+        return self.__view(item, datapoint, timestamp)
+
+    def features_many(self, ids, timestamps):
+        """
+        Batched features: the queries of one item are binary searched
+        together and answered in time order, replaying from the previous
+        query's state when no checkpoint is closer.
+        Input: equally long sequences of item ids and unix timestamps.
+        Output: DataFrame with one row per query, in the order of the
+        queries (all missing for items without events yet and for items
+        not in the index).
+        """
+        ids = np.asarray(ids, dtype=object)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        codes, unique_ids = pd.factorize(ids)
+        order = np.lexsort((timestamps, codes))
+        boundaries = np.flatnonzero(np.diff(codes[order])) + 1
+
+        rows = [None] * len(ids)
+        for queries in np.split(order, boundaries) if len(order) else []:
+            item = self.items.get(unique_ids[codes[queries[0]]])
+            if item is None:
+                continue
+            all_n_events = np.searchsorted(item.timestamps, timestamps[queries], side='right')
+            datapoint, n_replayed = None, 0
+            for query, n_events in zip(queries.tolist(), all_n_events.tolist()):
+                if n_events == 0:
+                    continue
+                checkpoint = n_events // self.checkpoint_interval
+                if datapoint is None or n_replayed < checkpoint * self.checkpoint_interval:
+                    datapoint, n_replayed = self.__replay(item, n_events), n_events
+                else:
+                    for log in item.logs[n_replayed:n_events]:
+                        datapoint.update_from_log_counting_text_interactions_as_clicks(log)
+                    n_replayed = n_events
+                rows[query] = self.__view(item, datapoint, int(timestamps[query]))
+        return pd.DataFrame([row if row is not None else {} for row in rows])
+
+    def __replay(self, item, n_events):
+        checkpoint = n_events // self.checkpoint_interval
+        datapoint = deepcopy(item.checkpoints[checkpoint])
+        for log in item.logs[checkpoint * self.checkpoint_interval:n_events]:
+            datapoint.update_from_log_counting_text_interactions_as_clicks(log)
+        return datapoint
+
+    def __view(self, item, datapoint, timestamp):
+        # Advancing the time changes the state, so it is done on a copy
+        datapoint = deepcopy(datapoint)
+        datapoint.update_timestamp(timestamp - item.first_timestamp)
+        return datapoint.view_all_data()
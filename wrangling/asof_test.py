@@ -0,0 +1,75 @@
+import numpy as np
+
+from synthetic_test import make_logs
+from wrangling.Datapoint import Datapoint
+from wrangling.DatasetFactory import DatasetFactory
+
+
+def make_index():
+    factory = DatasetFactory()
+    factory.add_logs(make_logs(2000, n_lemmas=50))
+    return factory.create_asof_index(checkpoint_interval=4)
+
+
+def naive_features(item, timestamp):
+    # Replays every event up to timestamp from scratch
+    datapoint = Datapoint()
+    first_timestamp = item.logs[0].original_timestamp
+    n_events = 0
+    for log in item.logs:
+        if log.original_timestamp > timestamp:
+            break
+        datapoint.update_from_log_counting_text_interactions_as_clicks(log)
+        n_events += 1
+    if n_events == 0:
+        return None
+    datapoint.update_timestamp(timestamp - first_timestamp)
+    return datapoint.view_all_data()
+
+
+def make_queries(index, n=300, seed=0):
+    random = np.random.default_rng(seed)
+    ids = list(index.items)
+    queries = []
+    for _ in range(n):
+        id = ids[random.integers(len(ids))]
+        timestamps = index.items[id].timestamps
+        kind = random.integers(3)
+        if kind == 0:
+            timestamp = int(timestamps[random.integers(len(timestamps))])
+        else:
+            timestamp = int(random.integers(timestamps[0] - 10**6, timestamps[-1] + 10**6))
+        queries.append((id, timestamp))
+    return queries
+
+
+def test_features_match_a_full_replay():
+    index = make_index()
+    for id, timestamp in make_queries(index):
+        assert index.features(id, timestamp) == naive_features(index.items[id], timestamp)
+
+
+def test_features_many_matches_single_queries():
+    index = make_index()
+    queries = make_queries(index, seed=1)
+    df = index.features_many([id for id, _ in queries], [timestamp for _, timestamp in queries])
+
+    assert len(df) == len(queries)
+    for (id, timestamp), (_, row) in zip(queries, df.iterrows()):
+        expected = index.features(id, timestamp)
+        if expected is None:
+            assert row.isna().all()
+        else:
+            assert {key: row[key] for key in expected} == expected
+
+
+def test_unknown_ids_have_no_features():
+    index = make_index()
+    id = next(iter(index.items))
+    timestamp = int(index.items[id].timestamps[-1])
+    assert 'unknown' not in index
+    assert index.features('unknown', timestamp) is None
+
+    df = index.features_many(['unknown', id], [timestamp, timestamp])
+    assert df.iloc[0].isna().all()
+    assert df.iloc[1]['ALL_amount'] == index.features(id, timestamp)['ALL_amount']
@@ -24,6 +24,9 @@ VALID_LOG_MESSAGES = [
                         BOOK_DRILL_CLICK
                     ]
 
+# Messages as their index in VALID_LOG_MESSAGES, for the columnar formats and kernels.
+MESSAGE_CODES = {message: code for code, message in enumerate(VALID_LOG_MESSAGES)}
+
 
 @enforce_types
 @dataclass
@@ -0,0 +1,72 @@
+"""
+Lightweight instrumentation for the featurization pipeline.
+
+PipelineStats records the wall time of each stage and aggregated counters
+(e.g. logs rejected by reason), exportable as a dictionary or JSON.
+NullStats has the same interface and does nothing, so instrumented code
+costs next to nothing when stats are disabled.
+"""
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+
+class PipelineStats:
+    enabled = True
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Context manager adding the wall time of its body to stage `name`.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+            self.calls[name] += 1
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def reset(self):
+        self.seconds.clear()
+        self.calls.clear()
+        self.counters.clear()
+
+    def to_dict(self):
+        return {
+            'stages': {name: {'seconds': seconds, 'calls': self.calls[name]} for name, seconds in self.seconds.items()},
+            'counters': dict(self.counters),
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+class NullStats:
+    enabled = False
+
+    def stage(self, name):
+        return _NULL_CONTEXT
+
+    def count(self, name, n=1):
+        pass
+
+    def reset(self):
+        pass
+
+    def to_dict(self):
+        return {'stages': {}, 'counters': {}}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+_NULL_CONTEXT = nullcontext()
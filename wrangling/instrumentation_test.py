@@ -0,0 +1,51 @@
+import json
+
+from synthetic_test import make_logs
+from wrangling.DatasetFactory import DatasetFactory
+from wrangling.instrumentation import NullStats, PipelineStats
+
+
+def test_stage_accumulates_time_and_calls():
+    stats = PipelineStats()
+    for _ in range(3):
+        with stats.stage('work'):
+            sum(range(1000))
+    stats.count('things', 2)
+    stats.count('things')
+
+    result = json.loads(stats.to_json())
+    assert result['stages']['work']['calls'] == 3
+    assert result['stages']['work']['seconds'] > 0
+    assert result['counters'] == {'things': 3}
+
+
+def test_null_stats_records_nothing():
+    stats = NullStats()
+    with stats.stage('work'):
+        stats.count('things')
+    assert stats.to_dict() == {'stages': {}, 'counters': {}}
+
+
+def test_dataset_factory_reports_stages_and_counters():
+    logs = make_logs(2000, n_lemmas=50)
+    invalid = [
+        {**logs[0], 'message': 'NOT_A_MESSAGE'},
+        {**logs[0], 'timestamp': 'yesterday'},
+        {'user': logs[0]['user']},
+    ]
+    stats = PipelineStats()
+    factory = DatasetFactory(stats=stats)
+    factory.add_logs(logs + invalid)
+    df = factory.create_dataframe_with_all_data_sequence()
+
+    counters = stats.to_dict()['counters']
+    assert counters['logs_accepted'] == len(logs)
+    assert sum(n for name, n in counters.items() if name.startswith('logs_rejected.')) == len(invalid)
+    assert counters['rows_emitted'] == len(df)
+    assert counters['builders_created'] >= counters['outliers_dropped']
+    assert set(stats.to_dict()['stages']) == {'validate_logs', 'add_logs', 'make_builders', 'filter_outliers', 'views', 'dataframe'}
+
+    # Instrumentation does not change the output
+    factory = DatasetFactory()
+    factory.add_logs(logs + invalid)
+    assert factory.create_dataframe_with_all_data_sequence().equals(df)
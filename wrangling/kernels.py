@@ -0,0 +1,291 @@
+"""
+Compiled kernels for the per-event state machines of Datapoint which don't
+vectorize: the leading recall/failure streaks of AllDatapointPartition and
+the intervals of RevisionDatapointPartition.
+
+The kernels run over integer coded messages and timestamps, one segment of
+events per item (events of item k are offsets[k]:offsets[k+1], in time
+order), and return the public fields of the partition after every event.
+compute_states runs them once over the logs of many items, which is how
+DatapointBuilder.compute_kernel_states uses them for a whole dataset.
+
+They are used when DatasetConfiguration.compiled_kernels is set, and are
+compiled with numba when it is installed (COMPILED); otherwise they run as
+plain Python functions, which is also how their equivalence with the
+partitions is tested.
+
+numba freezes globals into the compiled code and its cache is only keyed on
+this file, so the message codes of wrangling.domain and the never value of
+the Datapoint are passed to the kernels as arguments.
+
+    datapoint = Datapoint()
+    use_compiled_partitions(datapoint, compute_states([logs], datapoint.never)[0])
+    for log in logs:
+        datapoint.update_from_log_counting_text_interactions_as_clicks(log)
+"""
+from dataclasses import fields
+
+import numpy as np
+
+from wrangling.Datapoint import AllDatapointPartition, RevisionDatapointPartition
+from wrangling.domain import *
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+COMPILED = njit is not None
+
+_UNKNOWN = -1
+# Codes of the messages the state machines distinguish, in the order the kernels take them
+KERNEL_CODES = np.array([MESSAGE_CODES[message] for message in [
+    REVISION__CLICKED, REVISION__NOT_CLICKED, TEXT__WORD_HIGHLIGHTED, TEXT__SENTENCE_CLICK, TEXT__SENTENCE_READ,
+]], dtype=np.int64)
+
+# Public fields of the partitions, in the order of their to_dict()
+REVISION_COLUMNS = [field.name for field in fields(RevisionDatapointPartition) if not field.name.startswith('_')]
+ALL_COLUMNS = [field.name for field in fields(AllDatapointPartition) if not field.name.startswith('_')]
+_INTERVAL_RATIO = REVISION_COLUMNS.index('REVISION_interval_ratio')
+
+
+def _compile(function):
+    return njit(cache=True)(function) if njit is not None else function
+
+
+def revision_states(codes, timestamps, offsets, never, kernel_codes):
+    """
+    Input: int message codes, int64 timestamps, the segment offsets, the
+    never value and KERNEL_CODES.
+    Output: int64 matrix of the REVISION_COLUMNS after every event (the
+    interval ratio column holds 1), the float interval ratios and whether
+    each ratio is a quotient (the partition stores the int 1 otherwise).
+    """
+    clicked_code, not_clicked_code = kernel_codes[0], kernel_codes[1]
+    n = len(codes)
+    states = np.zeros((n, 9), dtype=np.int64)
+    ratios = np.ones(n, dtype=np.float64)
+    quotients = np.zeros(n, dtype=np.bool_)
+    for k in range(len(offsets) - 1):
+        clicked_amount = not_clicked_amount = all_amount = 0
+        clicked_seconds = not_clicked_seconds = all_seconds = never
+        ratio, quotient = 1., False
+        last_interval, previous_interval = never, 0
+        clicked_last = not_clicked_last = all_last = 0
+        previous_message = _UNKNOWN
+        for i in range(offsets[k], offsets[k + 1]):
+            message, timestamp = codes[i], timestamps[i]
+            # Base case: first log
+            if all_last == 0:
+                clicked_last = timestamp
+                all_last = timestamp
+
+            clicked_seconds = timestamp - clicked_last
+            not_clicked_seconds = timestamp - not_clicked_last if not_clicked_last else never
+            all_seconds = min(clicked_seconds, not_clicked_seconds)
+
+            if message == clicked_code or message == not_clicked_code:
+                previous_interval = last_interval
+                last_interval = timestamp - all_last
+                if previous_interval != 0:
+                    ratio, quotient = last_interval / previous_interval, True
+                else:
+                    ratio, quotient = 1., False
+
+                if message == clicked_code:
+                    clicked_last = timestamp
+                else:
+                    not_clicked_last = timestamp
+                all_last = timestamp
+
+                if previous_message == clicked_code:
+                    clicked_amount += 1
+                elif previous_message == not_clicked_code:
+                    not_clicked_amount += 1
+                all_amount = clicked_amount + not_clicked_amount
+                previous_message = message
+
+            states[i, 0] = clicked_amount
+            states[i, 1] = not_clicked_amount
+            states[i, 2] = all_amount
+            states[i, 3] = clicked_seconds
+            states[i, 4] = not_clicked_seconds
+            states[i, 5] = all_seconds
+            states[i, 6] = 1
+            states[i, 7] = last_interval
+            states[i, 8] = previous_interval
+            ratios[i] = ratio
+            quotients[i] = quotient
+    return states, ratios, quotients
+
+
+@_compile
+def all_states(codes, timestamps, offsets, never, kernel_codes):
+    """
+    Input: int message codes, int64 timestamps, the segment offsets, the
+    never value and KERNEL_CODES.
+    Output: int64 matrix of the ALL_COLUMNS after every event. As in the
+    partition, an event only enters the streaks with the next event.
+    """
+    clicked_code, not_clicked_code = kernel_codes[0], kernel_codes[1]
+    highlighted_code, sentence_click_code, sentence_read_code = kernel_codes[2], kernel_codes[3], kernel_codes[4]
+    n = len(codes)
+    states = np.zeros((n, 7), dtype=np.int64)
+    for k in range(len(offsets) - 1):
+        amount, seconds = 0, never
+        failures_amount = failures_seconds = recalls_amount = recalls_seconds = longest_recalls_seconds = 0
+        last_timestamp, last_message = 0, _UNKNOWN
+        first_recall = first_failure = 0
+        for i in range(offsets[k], offsets[k + 1]):
+            message, timestamp = codes[i], timestamps[i]
+            seconds = timestamp - last_timestamp
+
+            # Which streak the previous event updates, if any.
+            # TEXT__SENTENCE_CLICK continues a streak but doesn't start one.
+            failure = recall = False
+            if last_message == clicked_code or last_message == highlighted_code:
+                if first_failure == 0:
+                    first_failure = last_timestamp
+                failure = True
+            elif last_message == not_clicked_code or last_message == sentence_read_code:
+                if first_recall == 0:
+                    first_recall = last_timestamp
+                recall = True
+            elif last_message == sentence_click_code:
+                if first_recall != 0:
+                    recall = True
+                elif first_failure != 0:
+                    failure = True
+
+            if failure:
+                failures_amount += 1
+                failures_seconds = last_timestamp - first_failure
+                recalls_amount = recalls_seconds = first_recall = 0
+            if recall:
+                recalls_amount += 1
+                recalls_seconds = last_timestamp - first_recall
+                if longest_recalls_seconds < recalls_seconds:
+                    longest_recalls_seconds = recalls_seconds
+                failures_amount = failures_seconds = first_failure = 0
+
+            amount += 1
+            last_timestamp, last_message = timestamp, message
+
+            states[i, 0] = amount
+            states[i, 1] = seconds
+            states[i, 2] = failures_amount
+            states[i, 3] = failures_seconds
+            states[i, 4] = recalls_amount
+            states[i, 5] = recalls_seconds
+            states[i, 6] = longest_recalls_seconds
+    return states
+
+
+def encode(segments):
+    """
+    Input: list of segments, the logs of one item in time order each.
+    Output: the message codes, timestamps and offsets of the segments.
+    """
+    lengths = np.fromiter((len(logs) for logs in segments), dtype=np.int64, count=len(segments))
+    n = int(lengths.sum())
+    codes = np.fromiter((MESSAGE_CODES[log.message] for logs in segments for log in logs), dtype=np.int64, count=n)
+    timestamps = np.fromiter((log.timestamp for logs in segments for log in logs), dtype=np.int64, count=n)
+    return codes, timestamps, np.concatenate([[0], np.cumsum(lengths)])
+
+
+class KernelStates:
+    """
+    The partition fields the kernels computed after every log of a segment.
+    Rows stay in numpy until a partition is serialized.
+    """
+
+    def __init__(self, logs, revision, ratios, quotients, all):
+        self.logs = logs
+        self.revision = revision
+        self.ratios = ratios
+        self.quotients = quotients
+        self.all = all
+
+    def revision_row(self, i):
+        row = self.revision[i].tolist()
+        if self.quotients[i]:
+            row[_INTERVAL_RATIO] = float(self.ratios[i])
+        return row
+
+    def all_row(self, i):
+        return self.all[i].tolist()
+
+
+def compute_states(segments, never):
+    """
+    Runs the kernels once over all the segments.
+    Input: list of segments (logs of one item in time order, with relative
+    timestamps) and the never value of their Datapoints.
+    Output: one KernelStates per segment.
+    """
+    codes, timestamps, offsets = encode(segments)
+    revision, ratios, quotients = revision_states(codes, timestamps, offsets, never, KERNEL_CODES)
+    all = all_states(codes, timestamps, offsets, never, KERNEL_CODES)
+    return [
+        KernelStates(logs, revision[start:end], ratios[start:end], quotients[start:end], all[start:end])
+        for logs, start, end in zip(segments, offsets[:-1], offsets[1:])
+    ]
+
+
+class _PrecomputedPartition:
+    """
+    Stands in for a partition of a Datapoint: every update_from_log moves to
+    the state the kernel computed after the next log, which must be the log
+    the kernel was given. The other updates need the private state of the
+    partition, so they replay the logs so far into `partition` and hand
+    every later call over to it.
+    """
+
+    def __init__(self, partition, logs, columns, row):
+        self.__partition = partition
+        self.__logs = logs
+        self.__columns = columns
+        self.__row = row
+        self.__i = -1
+        self.__replayed = False
+
+    def update_from_log(self, log):
+        if self.__replayed:
+            self.__partition.update_from_log(log)
+            return
+        self.__i += 1
+        if self.__i >= len(self.__logs):
+            raise ValueError(f'Only {len(self.__logs)} logs were precomputed, received {log}')
+        expected = self.__logs[self.__i]
+        if log.timestamp != expected.timestamp or log.message != expected.message:
+            raise ValueError(f'Log {self.__i} was precomputed as {expected}, received {log}')
+
+    def update_timestamp(self, timestamp):
+        self.__replay().update_timestamp(timestamp)
+
+    def update_seconds_elapsed(self, timestamp):
+        self.__replay().update_seconds_elapsed(timestamp)
+
+    def to_dict(self):
+        if self.__replayed or self.__i < 0:
+            return self.__partition.to_dict()
+        return dict(zip(self.__columns, self.__row(self.__i)))
+
+    def __replay(self):
+        if not self.__replayed:
+            for log in self.__logs[:self.__i + 1]:
+                self.__partition.update_from_log(log)
+            self.__replayed = True
+        return self.__partition
+
+
+def use_compiled_partitions(datapoint, states):
+    """
+    Replaces the revision and all partitions of a new Datapoint by the
+    KernelStates of a segment (see compute_states), whose logs must then be
+    given to the datapoint's update methods in the same order.
+    Input: Datapoint, KernelStates
+    Output: None
+    """
+    datapoint.revision = _PrecomputedPartition(datapoint.revision, states.logs, REVISION_COLUMNS, states.revision_row)
+    datapoint.all = _PrecomputedPartition(datapoint.all, states.logs, ALL_COLUMNS, states.all_row)
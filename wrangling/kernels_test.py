@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from config import NEVER
+from synthetic_test import make_logs
+from types_ import DatasetConfiguration
+from wrangling import kernels
+from wrangling.Datapoint import Datapoint
+from wrangling.DatapointBuilder import DatapointBuilder, RelativeLog
+from wrangling.DatasetFactory import DatasetFactory
+from wrangling.domain import Log
+
+
+def make_logs_by_id():
+    logs_by_id = {}
+    for log_dict in make_logs(3000, n_lemmas=50):
+        log = Log.from_dictionary(log_dict)
+        logs_by_id.setdefault(log.id(), []).append(log)
+    return logs_by_id
+
+
+def relative(logs):
+    logs = sorted(logs, key=lambda log: log.timestamp)
+    return [RelativeLog(log.timestamp - logs[0].timestamp, log.message, log.user, log.lemma, log.original_timestamp)
+            for log in logs]
+
+
+def assert_same_views(compiled, expected):
+    # Same keys in the same order, same values and types
+    assert list(compiled.view_all_data().items()) == list(expected.view_all_data().items())
+    assert [type(value) for value in compiled.view_all_data().values()] == \
+        [type(value) for value in expected.view_all_data().values()]
+
+
+def test_kernels_match_the_partitions_after_every_event(never=NEVER):
+    segments = [relative(logs) for logs in make_logs_by_id().values()]
+    for logs, states in zip(segments, kernels.compute_states(segments, never)):
+        expected, compiled = Datapoint(never), Datapoint(never)
+        kernels.use_compiled_partitions(compiled, states)
+        assert_same_views(compiled, expected)
+        for log in logs:
+            expected.update_from_log_counting_text_interactions_as_clicks(log)
+            compiled.update_from_log_counting_text_interactions_as_clicks(log)
+            assert_same_views(compiled, expected)
+
+
+def test_kernels_follow_the_never_of_the_datapoint():
+    test_kernels_match_the_partitions_after_every_event(never=NEVER // 20)
+
+
+def test_kernels_run_over_several_segments():
+    segments = [relative(logs) for logs in make_logs_by_id().values()]
+    codes, timestamps, offsets = kernels.encode(segments)
+    revision, ratios, _ = kernels.revision_states(codes, timestamps, offsets, NEVER, kernels.KERNEL_CODES)
+    streaks = kernels.all_states(codes, timestamps, offsets, NEVER, kernels.KERNEL_CODES)
+    for logs, start, end in zip(segments, offsets[:-1], offsets[1:]):
+        codes, timestamps, segment_offsets = kernels.encode([logs])
+        np.testing.assert_array_equal(revision[start:end], kernels.revision_states(codes, timestamps, segment_offsets, NEVER, kernels.KERNEL_CODES)[0])
+        np.testing.assert_array_equal(ratios[start:end], kernels.revision_states(codes, timestamps, segment_offsets, NEVER, kernels.KERNEL_CODES)[1])
+        np.testing.assert_array_equal(streaks[start:end], kernels.all_states(codes, timestamps, segment_offsets, NEVER, kernels.KERNEL_CODES))
+
+
+def test_precomputed_partitions_only_accept_the_precomputed_logs():
+    logs = relative(next(iter(make_logs_by_id().values())))
+    datapoint = Datapoint()
+    kernels.use_compiled_partitions(datapoint, kernels.compute_states([logs[:-1]], NEVER)[0])
+    for log in logs[:-1]:
+        datapoint.update_from_log(log)
+    with pytest.raises(ValueError):
+        datapoint.update_from_log(logs[-1])
+
+    datapoint = Datapoint()
+    kernels.use_compiled_partitions(datapoint, kernels.compute_states([logs], NEVER)[0])
+    with pytest.raises(ValueError):
+        datapoint.update_from_log(logs[1])
+
+
+def test_precomputed_partitions_support_update_timestamp():
+    logs = relative(next(iter(make_logs_by_id().values())))
+    expected, compiled = Datapoint(), Datapoint()
+    kernels.use_compiled_partitions(compiled, kernels.compute_states([logs], NEVER)[0])
+    half = len(logs) // 2
+    for datapoint in [expected, compiled]:
+        for log in logs[:half]:
+            datapoint.update_from_log(log)
+        datapoint.update_timestamp(logs[half - 1].timestamp + 60 * 60)
+    assert_same_views(compiled, expected)
+    for log in logs[half:]:
+        expected.update_from_log(log)
+        compiled.update_from_log(log)
+        assert_same_views(compiled, expected)
+
+
+def test_datasets_are_identical_with_and_without_kernels():
+    dataframes = []
+    for compiled_kernels in [False, True]:
+        factory = DatasetFactory(config=DatasetConfiguration(compiled_kernels=compiled_kernels))
+        factory.add_logs(make_logs(3000, n_lemmas=50))
+        dataframes.append(factory.create_dataframes(['all_data_sequence', 'all_data_flattened']))
+    for view in dataframes[0]:
+        assert dataframes[0][view].equals(dataframes[1][view])
+
+
+def test_builders_compute_their_own_kernel_states():
+    for logs in list(make_logs_by_id().values())[:20]:
+        views = []
+        for compiled_kernels in [False, True]:
+            builder = DatapointBuilder.from_log(logs[0], DatasetConfiguration(compiled_kernels=compiled_kernels))
+            for log in logs[1:]:
+                builder.add_log(log)
+            views.append((builder.view_all_data_sequence(), builder.view_all_data_flattened()))
+        assert views[0] == views[1]
@@ -0,0 +1,79 @@
+"""
+Compact output schema for the feature DataFrame.
+
+compact_dataframe narrows the columns DatasetFactory produces: integers to
+int32 and floats to float32 where the values fit, the user to a category,
+and the columns of Datapoint.NEVER_COLUMNS to nullable Int32 columns,
+missing (instead of config.NEVER) when the event has not happened yet.
+
+Estimators consume the nullable columns through expand_missing, which turns
+each of them into its values (0 where missing) and a `<column>_never`
+indicator, so "never" no longer stretches the MinMaxScaler ranges.
+"""
+import numpy as np
+import pandas as pd
+
+from config import NEVER
+from wrangling.Datapoint import NEVER_COLUMNS
+
+NEVER_INDICATOR_SUFFIX = '_never'
+
+_INT32 = np.iinfo(np.int32)
+
+
+def compact_dataframe(df, never=NEVER):
+    """
+    Input: a feature DataFrame and the NEVER value it was built with.
+    Output: a new DataFrame with the compact schema.
+    """
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        if column == 'user':
+            values = values.astype('category')
+        elif column in NEVER_COLUMNS:
+            values = values.mask(values == never)
+            values = values.astype('Int32' if _fits_int32(values) else 'Int64')
+        elif pd.api.types.is_bool_dtype(values):
+            pass
+        elif pd.api.types.is_integer_dtype(values):
+            if _fits_int32(values):
+                values = values.astype(np.int32)
+        elif pd.api.types.is_float_dtype(values):
+            values = values.astype(np.float32)
+        columns[column] = values
+    return pd.DataFrame(columns, index=df.index)
+
+
+def expand_missing(X):
+    """
+    Input: feature DataFrame.
+    Output: X with every nullable numeric column replaced by its values
+    (float, 0 where missing) followed by a float `<column>_never` indicator
+    of the missing values. X itself if it has no nullable columns.
+    The expanded columns only depend on the dtypes, so chunks with and
+    without missing values get the same design matrix.
+    """
+    nullable = [column for column in X.columns if _is_nullable_numeric(X[column].dtype)]
+    if not nullable:
+        return X
+    columns = {}
+    for column in X.columns:
+        values = X[column]
+        if column in nullable:
+            columns[column] = values.to_numpy(dtype=np.float64, na_value=0.)
+            columns[column + NEVER_INDICATOR_SUFFIX] = values.isna().to_numpy(dtype=np.float64)
+        else:
+            columns[column] = values
+    return pd.DataFrame(columns, index=X.index)
+
+
+def _fits_int32(values):
+    if not len(values) or values.isna().all():
+        return True
+    return _INT32.min <= values.min() and values.max() <= _INT32.max
+
+
+def _is_nullable_numeric(dtype):
+    return pd.api.types.is_extension_array_dtype(dtype) and pd.api.types.is_numeric_dtype(dtype) \
+        and not isinstance(dtype, pd.CategoricalDtype)
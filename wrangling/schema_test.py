@@ -0,0 +1,52 @@
+import numpy as np
+
+from config import NEVER
+from estimators.linear import LinearRegressionEstimator
+from estimators.mtr import SWPMTREstimator
+from synthetic_test import make_logs
+from types_ import DatasetConfiguration
+from util import split_features_and_targets
+from wrangling.Datapoint import NEVER_COLUMNS
+from wrangling.DatasetFactory import DatasetFactory
+from wrangling.schema import *
+
+
+def make_dataframes():
+    logs = make_logs()
+    dataframes = []
+    for compact in [False, True]:
+        factory = DatasetFactory(config=DatasetConfiguration(compact=compact))
+        factory.add_logs(logs)
+        dataframes.append(factory.create_dataframe_with_all_data_sequence())
+    return dataframes
+
+
+def test_compact_dataframe_keeps_the_values():
+    df, compact = make_dataframes()
+
+    assert compact['user'].dtype == 'category'
+    assert compact.memory_usage(deep=True).sum() < 0.6 * df.memory_usage(deep=True).sum()
+    for column in df.columns:
+        if column in NEVER_COLUMNS:
+            assert compact[column].dtype == 'Int32'
+            assert (compact[column].isna() == (df[column] == NEVER)).all()
+            assert (compact[column].dropna() == df[column][df[column] != NEVER]).all()
+        elif column != 'user':
+            assert compact[column].dtype.itemsize <= 4 or compact[column].dtype == bool
+            np.testing.assert_allclose(compact[column].astype(float), df[column].astype(float), rtol=1e-6)
+
+
+def test_estimators_consume_missing_values():
+    _, compact = make_dataframes()
+    X, y, _ = split_features_and_targets(compact)
+
+    expanded = expand_missing(X)
+    for column in NEVER_COLUMNS:
+        assert (expanded[column + NEVER_INDICATOR_SUFFIX] == X[column].isna()).all()
+        assert not expanded[column].isna().any()
+    assert expand_missing(expanded) is expanded
+
+    for estimator in [SWPMTREstimator(), LinearRegressionEstimator()]:
+        estimator.fit(X, y, X['delta'])
+        y_pred = estimator.predict(X, X['delta'])
+        assert np.all(np.isfinite(y_pred))
@@ -0,0 +1,116 @@
+"""
+Batch validation of log dictionaries.
+
+Checks a whole batch column by column instead of constructing a Log inside
+try/except for every record, and reports why records were rejected.
+Every record rejected here would also be rejected by Log.from_dictionary,
+and every record kept is accepted by it.
+"""
+from dataclasses import dataclass, field
+from itertools import repeat
+from operator import is_not
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from wrangling.domain import VALID_LOG_MESSAGES
+
+REQUIRED_KEYS = ['timestamp', 'message', 'user', 'lemma']
+
+MISSING_KEY = 'missing_key'
+INVALID_TIMESTAMP = 'invalid_timestamp'
+INVALID_MESSAGE = 'invalid_message'
+INVALID_USER = 'invalid_user'
+INVALID_LEMMA = 'invalid_lemma'
+
+_MISSING = object()
+_VALID_LOG_MESSAGES = frozenset(VALID_LOG_MESSAGES)
+
+
+@dataclass
+class ValidationReport:
+    # Number of records validated
+    n_records: int = 0
+    # Reason to number of records rejected for it. A record is only
+    # counted for the first reason that applies, in the order above.
+    counts: Dict[str, int] = field(default_factory=dict)
+    # Reason to the first few records rejected for it
+    samples: Dict[str, List[dict]] = field(default_factory=dict)
+    # keep[i] is True if the i-th record of the batch is valid. Only the
+    # report of a single batch has it: merged reports only add up counts.
+    keep: Optional[np.ndarray] = None
+
+    @property
+    def n_rejected(self):
+        return sum(self.counts.values())
+
+    @property
+    def n_kept(self):
+        return self.n_records - self.n_rejected
+
+    def merge(self, other, n_samples=5):
+        """
+        Output: the report of this batch followed by other, without keep.
+        """
+        counts = dict(self.counts)
+        samples = {reason: list(records) for reason, records in self.samples.items()}
+        for reason, n in other.counts.items():
+            counts[reason] = counts.get(reason, 0) + n
+            samples[reason] = (samples.get(reason, []) + other.samples[reason])[:n_samples]
+        return ValidationReport(self.n_records + other.n_records, counts, samples)
+
+
+def validate_log_batch(log_dicts, n_samples=5) -> ValidationReport:
+    """
+    Input: list of log dictionaries and the number of sample records to keep
+    per rejection reason.
+    Output: ValidationReport with the keep-mask, counts and samples.
+    """
+    log_dicts = log_dicts if isinstance(log_dicts, list) else list(log_dicts)
+    n = len(log_dicts)
+    columns = {key: [log_dict.get(key, _MISSING) for log_dict in log_dicts] for key in REQUIRED_KEYS}
+
+    has_keys = np.ones(n, dtype=bool)
+    for values in columns.values():
+        has_keys &= _mask(map(is_not, values, repeat(_MISSING)), n)
+
+    checks = [
+        (MISSING_KEY, has_keys),
+        # Log is type checked with isinstance, so bool passes as int
+        (INVALID_TIMESTAMP, _instances(columns['timestamp'], int, n)),
+        (INVALID_MESSAGE, _valid_messages(columns['message'], n)),
+        (INVALID_USER, _instances(columns['user'], str, n)),
+        (INVALID_LEMMA, _instances(columns['lemma'], str, n)),
+    ]
+
+    keep = np.ones(n, dtype=bool)
+    report = ValidationReport(n, keep=keep)
+    for reason, valid in checks:
+        rejected = np.flatnonzero(keep & ~valid)
+        if len(rejected):
+            report.counts[reason] = len(rejected)
+            report.samples[reason] = [log_dicts[i] for i in rejected[:n_samples]]
+        keep &= valid
+    return report
+
+
+def _mask(values, n):
+    return np.fromiter(values, dtype=bool, count=n)
+
+
+def _instances(values, cls, n):
+    # Columns usually hold a single type, which is checked once
+    types = set(map(type, values))
+    if all(issubclass(type_, cls) for type_ in types):
+        return np.ones(n, dtype=bool)
+    return _mask(map(isinstance, values, repeat(cls)), n)
+
+
+def _valid_messages(messages, n):
+    if set(map(type, messages)) <= {str}:
+        return _mask(map(_VALID_LOG_MESSAGES.__contains__, messages), n)
+    return _mask(map(_is_valid_message, messages), n)
+
+
+def _is_valid_message(message):
+    return isinstance(message, str) and message in _VALID_LOG_MESSAGES
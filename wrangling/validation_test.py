@@ -0,0 +1,50 @@
+import numpy as np
+
+from wrangling.domain import Log, VIDEO__WAS_SEEN
+from wrangling.validation import *
+
+
+def valid_log(**kwargs):
+    return {'user': 'user', 'lemma': 'lemma', 'timestamp': 1000, 'message': VIDEO__WAS_SEEN, **kwargs}
+
+
+def test_rejects_records_for_the_first_failing_reason():
+    logs = [
+        valid_log(),
+        {'user': 'user', 'lemma': 'lemma', 'timestamp': 1000},
+        valid_log(timestamp=np.int64(1000)),
+        valid_log(timestamp='1000', message='NOT_A_MESSAGE'),
+        valid_log(message='NOT_A_MESSAGE'),
+        valid_log(message=['unhashable']),
+        valid_log(user=None),
+        valid_log(lemma=3),
+        valid_log(timestamp=True),
+    ]
+    report = validate_log_batch(logs)
+
+    assert report.keep.tolist() == [True, False, False, False, False, False, False, False, True]
+    assert report.counts == {MISSING_KEY: 1, INVALID_TIMESTAMP: 2, INVALID_MESSAGE: 2, INVALID_USER: 1, INVALID_LEMMA: 1}
+    assert report.samples[INVALID_TIMESTAMP] == [logs[2], logs[3]]
+    assert report.n_rejected == 7
+
+
+def test_agrees_with_log_construction():
+    logs = [valid_log(), valid_log(timestamp=1.5), valid_log(user=3), valid_log(message='x'), {}]
+    report = validate_log_batch(logs)
+    for log, keep in zip(logs, report.keep):
+        try:
+            Log.from_dictionary(log)
+            accepted = True
+        except Exception:
+            accepted = False
+        assert keep == accepted
+
+
+def test_merge_only_adds_up_counts_and_caps_samples():
+    bad = [valid_log(user=None)] * 4
+    report = validate_log_batch(bad + [valid_log()], n_samples=3).merge(validate_log_batch(bad), n_samples=3)
+    assert report.keep is None
+    assert report.n_records == 9
+    assert report.n_kept == 1
+    assert report.counts == {INVALID_USER: 8}
+    assert len(report.samples[INVALID_USER]) == 3